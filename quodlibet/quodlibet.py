@@ -11,9 +11,19 @@
 # published by the Free Software Foundation.
 
 import sys
+import time
 
 import os
 
+if "--profile-startup" in sys.argv:
+    # as early as possible, so it sees most imports
+    _start = time.time()
+    from quodlibet.util.importprofile import ImportProfiler
+    _profiler = ImportProfiler(_start)
+    _profiler.install()
+else:
+    _profiler = None
+
 from quodlibet.cli import process_arguments, exit_
 from quodlibet.util.dprint import print_d, print_
 from quodlibet.util import set_win32_unicode_argv
@@ -161,6 +171,14 @@ def main():
     from quodlibet.qltk import session
     session.init("quodlibet")
 
+    if _profiler is not None:
+        def print_startup_report():
+            _profiler.uninstall()
+            for line in _profiler.get_report():
+                print_(line)
+
+        GLib.idle_add(print_startup_report, priority=GLib.PRIORITY_LOW)
+
     quodlibet.enable_periodic_save(save_library=True)
 
     if "start-playing" in startup_actions:
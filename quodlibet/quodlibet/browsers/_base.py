@@ -6,8 +6,6 @@
 # it under the terms of the GNU General Public License version 2 as
 # published by the Free Software Foundation
 
-import random
-
 from gi.repository import GObject
 
 from quodlibet import app
@@ -105,19 +103,17 @@ class Filter(object):
     def filter_random(self, key):
         """Select one random value for the given key"""
         if key == "album" and self.can_filter_albums():
-            albums = self.list_albums()
+            albums = util.random_sample(self.list_albums(), 1)
             if albums:
-                self.filter_albums([random.choice(albums)])
+                self.filter_albums(albums)
         elif self.can_filter_tag(key):
-            values = self.list(key)
+            values = util.random_sample(self.list(key), 1)
             if values:
-                value = random.choice(values)
-                self.filter(key, [value])
+                self.filter(key, values)
         elif self.can_filter_text():
-            values = self.list(key)
+            values = util.random_sample(self.list(key), 1)
             if values:
-                value = random.choice(values)
-                query = util.build_filter_query(key, [value])
+                query = util.build_filter_query(key, values)
                 self.filter_text(query)
 
 
@@ -130,6 +126,7 @@ class Browser(Filter):
     __gsignals__ = {
         'songs-selected':
         (GObject.SignalFlags.RUN_LAST, None, (object, object)),
+        'songs-added': (GObject.SignalFlags.RUN_LAST, None, (object,)),
         'songs-activated': (GObject.SignalFlags.RUN_LAST, None, ()),
     }
 
@@ -158,6 +155,15 @@ class Browser(Filter):
 
         self.emit("songs-selected", songs, is_sorted)
 
+    def songs_added(self, songs):
+        """Emits the songs-added signal.
+
+        Adds songs to the ones passed to songs_selected() before, for
+        browsers which find their songs bit by bit.
+        """
+
+        self.emit("songs-added", songs)
+
     def songs_activated(self):
         """Call after calling songs_selected() to activate the songs
         (start playing, enqueue etc..)
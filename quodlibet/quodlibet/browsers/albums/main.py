@@ -35,7 +35,7 @@ from quodlibet.qltk.x import SymbolicIconImage
 from quodlibet.qltk.searchbar import SearchBarBox
 from quodlibet.qltk.menubutton import MenuButton
 from quodlibet.util import copool, connect_destroy
-from quodlibet.util.library import background_filter
+from quodlibet.util.library import background_filter, ChunkedFilter
 from quodlibet.util import connect_obj, DeferredSignal
 from quodlibet.util.collection import Album
 from quodlibet.qltk.cover import get_no_cover_pixbuf
@@ -422,6 +422,13 @@ class AlbumList(Browser, Gtk.VBox, util.InstanceTracker, VisibleUpdate):
 
         self.__bg_filter = background_filter()
         self.__filter = None
+        self.__query = None
+        # albums which matched self.__query the last time they got checked
+        self.__matched = set()
+        # while refiltering after a search: the albums which got searched
+        # and the ones of them which matched
+        self.__results = None
+        self.__album_filter = ChunkedFilter()
         model_filter.set_visible_func(self.__parse_query)
 
         render = Gtk.CellRendererPixbuf()
@@ -508,7 +515,7 @@ class AlbumList(Browser, Gtk.VBox, util.InstanceTracker, VisibleUpdate):
         self.accelerators = Gtk.AccelGroup()
         search = SearchBarBox(completion=AlbumTagCompletion(),
                               accel_group=self.accelerators)
-        search.connect('query-changed', self.__update_filter)
+        search.connect('query-changed', self.__query_changed)
         connect_obj(search, 'focus-out', lambda w: w.grab_focus(), view)
         self.__search = search
 
@@ -564,6 +571,7 @@ class AlbumList(Browser, Gtk.VBox, util.InstanceTracker, VisibleUpdate):
 
     def __destroy(self, browser):
         self._cover_cancel.cancel()
+        self.__album_filter.cancel()
         self.disable_row_update()
 
         self.view.set_model(None)
@@ -572,13 +580,41 @@ class AlbumList(Browser, Gtk.VBox, util.InstanceTracker, VisibleUpdate):
         if not klass.instances():
             klass._destroy_model()
 
-    def __update_filter(self, entry, text, scroll_up=True, restore=False):
+    def __query_changed(self, entry, text):
+        self.__update_filter(entry, text, chunked=True)
+
+    def __update_filter(self, entry, text, scroll_up=True, restore=False,
+                        chunked=False):
+        if Query.match_all(text):
+            self.__album_filter.cancel()
+            self.__set_filter(None, None, scroll_up, restore)
+            return
+
+        query = Query(text, star=["~people", "album"])
+        albums = set(a for a in self.__model.itervalues() if a is not None)
+        # while typing, only check the albums matching the previous search
+        candidates = albums
+        if query.narrows(self.__query):
+            candidates = self.__matched & albums
+
+        found = []
+
+        def callback(matches, done):
+            found.extend(matches)
+            if done:
+                self.__set_filter(
+                    query, (albums, set(found)), scroll_up, restore)
+
+        self.__album_filter.run(query.search, candidates, callback, chunked)
+
+    def __set_filter(self, query, results, scroll_up, restore):
         model = self.view.get_model()
 
-        self.__filter = None
-        if not Query.match_all(text):
-            self.__filter = Query(text, star=["~people", "album"]).search
+        self.__query = query
+        self.__filter = query.search if query is not None else None
         self.__bg_filter = background_filter()
+        self.__matched = set()
+        self.__results = results
 
         self.__inhibit()
 
@@ -592,6 +628,7 @@ class AlbumList(Browser, Gtk.VBox, util.InstanceTracker, VisibleUpdate):
         # don't filter on restore if there is nothing to filter
         if not restore or self.__filter or self.__bg_filter:
             model.refilter()
+        self.__results = None
 
         self.__uninhibit()
 
@@ -604,12 +641,17 @@ class AlbumList(Browser, Gtk.VBox, util.InstanceTracker, VisibleUpdate):
             album = model.get_album(iter_)
             if album is None:
                 return True
-            elif b is None:
-                return f(album)
-            elif f is None:
-                return b(album)
-            else:
-                return b(album) and f(album)
+            elif f is not None:
+                results = self.__results
+                if results is not None and album in results[0]:
+                    matches = album in results[1]
+                else:
+                    matches = f(album)
+                if not matches:
+                    self.__matched.discard(album)
+                    return False
+                self.__matched.add(album)
+            return b is None or b(album)
 
     def __search_func(self, model, column, key, iter_, data):
         album = model.get_album(iter_)
@@ -7,6 +7,7 @@
 
 import cPickle as pickle
 import os
+import Queue
 import sys
 import threading
 import time
@@ -34,6 +35,9 @@ from quodlibet.qltk.x import ScrolledWindow, Align, Button
 FEEDS = os.path.join(const.USERDIR, "feeds")
 DND_URI_LIST, DND_MOZ_URL = range(2)
 
+MAX_FETCHES = 4
+"""Number of feeds getting downloaded at the same time"""
+
 # Migration path for pickle
 sys.modules["browsers.audiofeeds"] = sys.modules[__name__]
 
@@ -43,6 +47,19 @@ class InvalidFeed(ValueError):
 
 
 class Feed(list):
+
+    CHECK_INTERVAL = 2 * 60 * 60
+    """Seconds between checks for new episodes"""
+
+    MAX_BACKOFF = 5
+    """Failed checks after which the check interval stops growing"""
+
+    # not in pickles of older versions
+    __etag = None
+    __modified = None
+    __failures = 0
+    __lasttry = 0
+
     def __init__(self, uri):
         self.name = _("Unknown")
         self.uri = uri
@@ -53,6 +70,16 @@ class Feed(list):
     def get_age(self):
         return time.time() - self.__lastgot
 
+    def needs_update(self):
+        """If it's time to check the feed for new episodes, waiting twice
+        as long after each failed check"""
+
+        if self.get_age() < self.CHECK_INTERVAL:
+            return False
+        failures = min(self.__failures, self.MAX_BACKOFF)
+        interval = self.CHECK_INTERVAL * 2 ** failures
+        return time.time() - self.__lasttry >= interval
+
     @staticmethod
     def __fill_af(feed, af):
         try:
@@ -129,27 +156,65 @@ class Feed(list):
                 if value and value not in af.list("genre"):
                     af.add("genre", value)
 
-    def parse(self):
+    def fetch(self):
+        """Downloads and parses the feed. Sends the validators of the last
+        download, so the server can tell us if nothing has changed.
+
+        Returns the feedparser result or None on error. Doesn't change the
+        feed, so it can be called from another thread.
+        """
+
         try:
-            doc = feedparser.parse(self.uri)
+            return feedparser.parse(
+                self.uri, etag=self.__etag, modified=self.__modified)
         except:
+            return None
+
+    def update(self, doc):
+        """Merges the episodes of a fetch() result into the feed.
+
+        Returns True if there are new episodes.
+        """
+
+        self.__lasttry = time.time()
+        if doc is not None and doc.get("status") == 304:
+            self.__failures = 0
+            self.__lastgot = time.time()
             return False
 
         try:
-            album = doc.channel.title
-        except AttributeError:
+            if doc is None:
+                raise InvalidFeed
+            new = self.__merge(doc)
+        except InvalidFeed:
+            self.__failures += 1
             return False
 
-        if album:
-            self.name = album
-        else:
-            self.name = _("Unknown")
+        self.__failures = 0
+        self.__etag = doc.get("etag")
+        self.__modified = doc.get("modified")
+        self.__lastgot = time.time()
+        return new
+
+    def parse(self):
+        return self.update(self.fetch())
+
+    def __merge(self, doc):
+        try:
+            album = doc.channel.title
+        except AttributeError:
+            raise InvalidFeed
 
         defaults = AudioFile({"feed": self.uri})
         try:
             self.__fill_af(doc.channel, defaults)
         except:
-            return False
+            raise InvalidFeed
+
+        if album:
+            self.name = album
+        else:
+            self.name = _("Unknown")
 
         entries = []
         uris = set()
@@ -193,10 +258,50 @@ class Feed(list):
                     pass
                 else:
                     self.insert(0, song)
-        self.__lastgot = time.time()
         return bool(uris)
 
 
+def update_feeds(feeds, callback, max_fetches=MAX_FETCHES):
+    """Downloads the feeds in worker threads, at most `max_fetches` at
+    the same time, and merges the results in the main loop.
+
+    Once all feeds are updated, calls callback(changed) with the feeds
+    that have new episodes.
+    """
+
+    feeds = list(feeds)
+    if not feeds:
+        callback([])
+        return
+
+    pending = Queue.Queue()
+    for feed in feeds:
+        pending.put(feed)
+    changed = []
+    remaining = [len(feeds)]
+
+    def merge(feed, doc):
+        if feed.update(doc):
+            changed.append(feed)
+        remaining[0] -= 1
+        if not remaining[0]:
+            callback(changed)
+        return False
+
+    def fetch():
+        while True:
+            try:
+                feed = pending.get_nowait()
+            except Queue.Empty:
+                break
+            GLib.idle_add(merge, feed, feed.fetch())
+
+    for i in xrange(min(max_fetches, len(feeds))):
+        thread = threading.Thread(target=fetch)
+        thread.setDaemon(True)
+        thread.start()
+
+
 class AddFeedDialog(GetStringDialog):
     def __init__(self, parent):
         super(AddFeedDialog, self).__init__(
@@ -274,20 +379,16 @@ class AudioFeeds(Browser, Gtk.VBox):
 
     @classmethod
     def __do_check(klass):
-        thread = threading.Thread(target=klass.__check, args=())
-        thread.setDaemon(True)
-        thread.start()
+        feeds = [row[0] for row in klass.__feeds if row[0].needs_update()]
+        update_feeds(
+            feeds, lambda changed: klass.__check_done(feeds, changed))
 
     @classmethod
-    def __check(klass):
-        for row in klass.__feeds:
-            feed = row[0]
-            if feed.get_age() < 2 * 60 * 60:
-                continue
-            elif feed.parse():
-                feed.changed = True
-                row[0] = feed
-        klass.write()
+    def __check_done(klass, checked, changed):
+        # validators and backoff of all checked feeds have to be saved,
+        # not only of the ones with new episodes
+        if checked:
+            klass.changed(changed)
         GLib.timeout_add(60 * 60 * 1000, klass.__do_check)
 
     def Menu(self, songs, library, items):
@@ -453,8 +554,7 @@ class AudioFeeds(Browser, Gtk.VBox):
         AudioFeeds.write()
 
     def __refresh(self, feeds):
-        changed = filter(Feed.parse, feeds)
-        AudioFeeds.changed(changed)
+        update_feeds(feeds, AudioFeeds.changed)
 
     def activate(self):
         self.__changed(self.__view.get_selection())
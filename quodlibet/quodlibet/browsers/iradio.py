@@ -8,11 +8,13 @@
 import os
 import sys
 import bz2
+import httplib
+import threading
 import urllib2
 import urllib
 import itertools
 
-from gi.repository import Gtk, GLib, Pango
+from gi.repository import Gtk, GLib, Pango, Gio
 
 from quodlibet import const
 from quodlibet import qltk
@@ -27,7 +29,7 @@ from quodlibet.query import Query
 from quodlibet.qltk.getstring import GetStringDialog
 from quodlibet.qltk.songsmenu import SongsMenu
 from quodlibet.qltk.notif import Task
-from quodlibet.util import copool, connect_destroy, sanitize_tags, connect_obj
+from quodlibet.util import connect_destroy, sanitize_tags, connect_obj
 from quodlibet.util.string import decode, encode
 from quodlibet.util.uri import URI
 from quodlibet.qltk.views import AllTreeView
@@ -42,8 +44,7 @@ STATION_LIST_URL = \
 STATIONS_FAV = os.path.join(const.USERDIR, "stations")
 STATIONS_ALL = os.path.join(const.USERDIR, "stations_all")
 
-# TODO: - Do the update in a thread
-#       - Ranking: reduce duplicate stations (max 3 URLs per station)
+# TODO: - Ranking: reduce duplicate stations (max 3 URLs per station)
 #                  prefer stations that match a genre?
 
 # Migration path for pickle
@@ -228,60 +229,102 @@ def add_station(uri):
     return irfs
 
 
-def download_taglist(callback, cofuncid, step=1024 * 10):
-    """Generator for loading the bz2 compressed tag list.
+def download_taglist(callback, done_callback, cancellable,
+                     station_filter=None, step=1024 * 10, batch_size=500,
+                     finished_callback=None):
+    """Downloads and parses the bz2 compressed tag list in a thread.
 
-    Calls callback with the decompressed data or None in case of
-    an error."""
+    In the main loop, callback gets called with lists of IRFiles for which
+    station_filter returns True, and done_callback with True once all are
+    passed or False in case of an error. Once cancellable is cancelled
+    none of them get called anymore.
 
-    with Task(_("Internet Radio"), _("Downloading station list")) as task:
-        if cofuncid:
-            task.copool(cofuncid)
+    finished_callback gets called in the main loop once the thread is
+    done, even if it got cancelled or failed unexpectedly.
+    """
 
-        try:
-            response = urllib2.urlopen(STATION_LIST_URL)
-        except urllib2.URLError:
-            GLib.idle_add(callback, None)
-            return
+    task = Task(_("Internet Radio"), _("Downloading station list"),
+                stop=cancellable.cancel)
 
-        try:
-            size = int(response.info().get("content-length", 0))
-        except ValueError:
-            size = 0
+    def idle_call(func, *args):
+        def call():
+            if not cancellable.is_cancelled():
+                func(*args)
+        GLib.idle_add(call)
 
-        decomp = bz2.BZ2Decompressor()
+    def progress(read, size):
+        if size:
+            GLib.idle_add(task.update, float(read) / size)
+        else:
+            GLib.idle_add(task.pulse)
 
-        data = ""
-        temp = ""
-        read = 0
-        while temp or not data:
-            read += len(temp)
+    def run():
+        try:
+            response = urllib2.urlopen(STATION_LIST_URL)
+            try:
+                try:
+                    size = int(response.info().get("content-length", 0))
+                except ValueError:
+                    size = 0
+
+                batch = []
+                lines = iter_bz2_lines(
+                    response, step, lambda read: progress(read, size))
+                for station in iter_taglist(lines):
+                    if cancellable.is_cancelled():
+                        return
+                    if station_filter is None or station_filter(station):
+                        batch.append(station)
+                    if len(batch) >= batch_size:
+                        idle_call(callback, batch)
+                        batch = []
+                if batch:
+                    idle_call(callback, batch)
+            finally:
+                response.close()
+        except (EnvironmentError, EOFError, httplib.HTTPException) as e:
+            print_w("Downloading station list failed: %r" % e)
+            idle_call(done_callback, False)
+        else:
+            idle_call(done_callback, True)
+        finally:
+            GLib.idle_add(task.finish)
+            if finished_callback is not None:
+                GLib.idle_add(finished_callback)
 
-            if size:
-                task.update(float(read) / size)
-            else:
-                task.pulse()
-            yield True
+    thread = threading.Thread(target=run)
+    thread.setDaemon(True)
+    thread.start()
 
-            try:
-                data += decomp.decompress(temp)
-                temp = response.read(step)
-            except (IOError, EOFError):
-                data = None
-                break
-        response.close()
 
-        yield True
+def iter_bz2_lines(fileobj, step=1024 * 10, progress=None):
+    """Yields the lines of the bz2 compressed data read from fileobj.
 
-        stations = None
-        if data:
-            stations = parse_taglist(data)
+    progress gets called with the number of bytes read so far after each
+    read. Raises EnvironmentError and EOFError.
+    """
 
-        GLib.idle_add(callback, stations)
+    decomp = bz2.BZ2Decompressor()
+    read = 0
+    rest = ""
+    while True:
+        data = fileobj.read(step)
+        if not data:
+            break
+        read += len(data)
+        if progress is not None:
+            progress(read)
+        lines = (rest + decomp.decompress(data)).split("\n")
+        rest = lines.pop()
+        for line in lines:
+            yield line
 
+    if rest:
+        yield rest
 
-def parse_taglist(data):
-    """Parses a dump file like list of tags and returns a list of IRFiles
+
+def iter_taglist(lines):
+    """Parses a dump file like list of tags and yields IRFiles
 
     uri=http://...
     tag=value1
@@ -292,15 +335,16 @@ def parse_taglist(data):
 
     """
 
-    stations = []
     station = None
 
-    for l in data.split("\n"):
-        key = l.split("=")[0]
-        value = l.split("=", 1)[1]
+    for l in lines:
+        try:
+            key, value = l.split("=", 1)
+        except ValueError:
+            continue
         if key == "uri":
             if station:
-                stations.append(station)
+                yield station
             station = IRFile(value)
             continue
 
@@ -322,9 +366,15 @@ def parse_taglist(data):
             station[key] = value
 
     if station:
-        stations.append(station)
+        yield station
+
+
+def parse_taglist(data):
+    """Parses a dump file like list of tags and returns a list of IRFiles,
+    see iter_taglist()
+    """
 
-    return stations
+    return list(iter_taglist(data.split("\n")))
 
 
 class AddNewStation(GetStringDialog):
@@ -475,6 +525,8 @@ class InternetRadio(Gtk.VBox, Browser, util.InstanceTracker):
     __stations = None
     __fav_stations = None
     __librarian = None
+    # Gio.Cancellable of the running station list download
+    __download = None
 
     __filter = None
 
@@ -503,6 +555,10 @@ class InternetRadio(Gtk.VBox, Browser, util.InstanceTracker):
 
     @classmethod
     def _destroy(klass):
+        if klass.__download is not None:
+            klass.__download.cancel()
+            klass.__download = None
+
         if klass.__stations.dirty:
             klass.__stations.save()
         klass.__stations.destroy()
@@ -662,14 +718,15 @@ class InternetRadio(Gtk.VBox, Browser, util.InstanceTracker):
 
     def __update(self, *args):
         self.qbar.hide()
-        copool.add(download_taglist, self.__update_done,
-                   cofuncid="radio-load", funcid="radio-load")
-
-    def __update_done(self, stations):
-        if not stations:
-            print_w("Loading remote station list failed.")
+        download = self.__download
+        if download is not None and not download.is_cancelled():
             return
 
+        # only keep the ones in at least one category
+        all_ = [self.filters.query(k) for k in self.filters.keys()]
+        assert all_
+        anycat_filter = reduce(lambda x, y: x | y, all_)
+
         # filter stations based on quality, listenercount
         def filter_stations(station):
             peak = station.get("~#listenerpeak", 0)
@@ -679,8 +736,30 @@ class InternetRadio(Gtk.VBox, Browser, util.InstanceTracker):
             bitrate = station("~#bitrate", 50)
             if (aac and bitrate < 40) or (not aac and bitrate < 60):
                 return False
-            return True
-        stations = filter(filter_stations, stations)
+            return anycat_filter.search(station)
+
+        stations = []
+        cancellable = Gio.Cancellable()
+        type(self).__download = cancellable
+        download_taglist(
+            stations.extend,
+            lambda ok: self.__update_done(stations if ok else None),
+            cancellable, filter_stations,
+            finished_callback=lambda: self.__download_finished(cancellable))
+
+    @classmethod
+    def __download_finished(klass, cancellable):
+        # the stop button or an error ends the download without calling
+        # __update_done(), allow updating again
+        if klass.__download is cancellable:
+            klass.__download = None
+        return False
+
+    def __update_done(self, stations):
+        type(self).__download = None
+        if not stations:
+            print_w("Loading remote station list failed.")
+            return
 
         # group them based on the title
         groups = {}
@@ -694,12 +773,6 @@ class InternetRadio(Gtk.VBox, Browser, util.InstanceTracker):
             sub.sort(key=lambda s: s.get("~#listenerpeak", 0), reverse=True)
             stations.extend(sub[:2])
 
-        # only keep the ones in at least one category
-        all_ = [self.filters.query(k) for k in self.filters.keys()]
-        assert all_
-        anycat_filter = reduce(lambda x, y: x | y, all_)
-        stations = filter(anycat_filter.search, stations)
-
         # remove listenerpeak
         for s in stations:
             s.pop("~#listenerpeak", None)
@@ -732,6 +805,9 @@ class InternetRadio(Gtk.VBox, Browser, util.InstanceTracker):
         self.__stations.changed(to_change)
         self.__stations.add(to_add)
 
+        # in case we don't get shut down properly
+        self.__stations.save_async()
+
     def __filter_changed(self, bar, text, restore=False):
         self.__filter = Query(text, self.STAR)
 
@@ -21,7 +21,7 @@ from quodlibet.qltk.songlist import SongList
 from quodlibet.qltk.completion import LibraryTagCompletion
 from quodlibet.qltk.searchbar import SearchBarBox
 from quodlibet.qltk.x import ScrolledWindow, Align
-from quodlibet.util.library import background_filter
+from quodlibet.util.library import background_filter, ChunkedFilter
 from quodlibet.util import connect_destroy
 
 from .prefs import PreferencesButton
@@ -69,6 +69,11 @@ class PanedBrowser(Gtk.VBox, Browser, util.InstanceTracker):
 
         self._filter = None
         self._library = library
+        # the last query and the songs matching it, as long as the
+        # library didn't change
+        self._results = None
+        self._found = None
+        self._search = ChunkedFilter()
 
         self.set_spacing(6)
 
@@ -108,6 +113,8 @@ class PanedBrowser(Gtk.VBox, Browser, util.InstanceTracker):
             child.show_all()
 
     def __destroy(self, *args):
+        self._search.cancel()
+        self._results = self._found = None
         del self._sb_box
 
     def set_wide_mode(self, do_wide):
@@ -132,7 +139,7 @@ class PanedBrowser(Gtk.VBox, Browser, util.InstanceTracker):
         qltk.get_top_parent(widget).songlist.grab_focus()
 
     def __text_parse(self, bar, text):
-        self.activate()
+        self.__update(chunked=True)
 
     def filter_text(self, text):
         self._set_text(text)
@@ -146,12 +153,14 @@ class PanedBrowser(Gtk.VBox, Browser, util.InstanceTracker):
         self._panes[-1].get_selection().emit('changed')
 
     def __added(self, library, songs):
+        self._results = self._found = None
         songs = filter(self._filter, songs)
         for pane in self._panes:
             pane.add(songs)
             songs = filter(pane.matches, songs)
 
     def __removed(self, library, songs, remove_if_empty=True):
+        self._results = self._found = None
         songs = filter(self._filter, songs)
         for pane in self._panes:
             pane.remove(songs, remove_if_empty)
@@ -174,16 +183,40 @@ class PanedBrowser(Gtk.VBox, Browser, util.InstanceTracker):
         return True
 
     def activate(self):
+        self.__update(chunked=False)
+
+    def __update(self, chunked):
         text = self._get_text()
-        if Query.is_parsable(text):
-            star = dict.fromkeys(SongList.star)
-            star.update(self.__star)
-            self._filter = Query(text, star.keys()).search
-            songs = filter(self._filter, self._library)
-            bg = background_filter()
-            if bg:
-                songs = filter(bg, songs)
-            self._panes[0].fill(songs)
+        if not Query.is_parsable(text):
+            return
+
+        star = dict.fromkeys(SongList.star)
+        star.update(self.__star)
+        query = Query(text, star.keys())
+
+        # while typing, only search the results of the previous search
+        songs = self._library
+        if self._results is not None and query.narrows(self._results[0]):
+            songs = self._results[1]
+
+        found = []
+        self._found = found
+        self._search.run(query.search, query.prefilter(songs),
+                         lambda *args: self.__found(query, found, *args),
+                         chunked)
+
+    def __found(self, query, found, songs, done):
+        found.extend(songs)
+        if not done:
+            return
+
+        if self._found is found:
+            self._results = (query, found)
+        self._filter = query.search
+        bg = background_filter()
+        if bg:
+            found = filter(bg, found)
+        self._panes[0].fill(found)
 
     def scroll(self, song):
         for pane in self._panes:
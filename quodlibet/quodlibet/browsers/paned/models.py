@@ -114,6 +114,7 @@ class PaneModel(ObjectStore):
         super(PaneModel, self).__init__()
         self.__sort_cache = {}
         self.__key_cache = {}
+        self.__emptied = set()
         self.config = pattern_config
 
     def get_format_keys(self, song):
@@ -160,26 +161,47 @@ class PaneModel(ObjectStore):
         """Remove all songs from the entries.
 
         If remove_if_empty == True, entries with no songs will be removed.
+        Only entries containing one of the songs get updated.
         """
 
         songs = set(songs)
 
+        # the cached keys are the ones of the entries the songs got added to
+        affected = set()
+        key_cache = self.__key_cache
         for song in songs:
-            if song in self.__key_cache:
-                del self.__key_cache[song]
+            keys = key_cache.pop(song, None)
+            if keys is None:
+                # never added
+                continue
+            if keys:
+                affected.update(keys)
+            else:
+                affected.add("")
+
+        if not affected and not (remove_if_empty and self.__emptied):
+            return
 
         to_remove = []
         for iter_, entry in self.iterrows():
             if isinstance(entry, AllEntry):
                 continue
-            entry.songs -= songs
-            entry.finalize()
-            self.row_changed(self.get_path(iter_), iter_)
+            if entry.key in affected:
+                count = len(entry.songs)
+                entry.songs -= songs
+                if len(entry.songs) != count:
+                    entry.finalize()
+                    self.row_changed(self.get_path(iter_), iter_)
+            elif entry.key not in self.__emptied:
+                continue
             if not entry.songs:
                 to_remove.append(iter_)
 
         if not remove_if_empty:
+            # remember them for the next removal
+            self.__emptied.update(self.get_value(i).key for i in to_remove)
             return
+        self.__emptied.clear()
 
         # remove from cache and the model
         for iter_ in to_remove:
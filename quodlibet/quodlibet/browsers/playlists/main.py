@@ -98,6 +98,7 @@ class PlaylistsBrowser(Gtk.VBox, Browser):
         for playlist in klass.playlists():
             for song in songs:
                 if song in playlist.songs:
+                    playlist.finalize()
                     PlaylistsBrowser.changed(playlist, refresh=False)
                     break
 
@@ -20,6 +20,8 @@ from quodlibet.qltk.menubutton import MenuButton
 from quodlibet.qltk.songlist import SongList
 from quodlibet.qltk.searchbar import LimitSearchBarBox
 from quodlibet.qltk.x import Align, SymbolicIconImage
+from quodlibet.util import connect_destroy
+from quodlibet.util.library import ChunkedFilter
 
 
 class PreferencesButton(Gtk.HBox):
@@ -67,6 +69,15 @@ class SearchBar(Gtk.VBox, Browser):
 
         self._query = None
         self._library = library
+        # the last finished query and the songs matching it, as long as
+        # the library didn't change
+        self._results = None
+        # songs found by the current search so far
+        self._found = None
+        self._selected = False
+        self._search = ChunkedFilter()
+        for sig in ["added", "changed", "removed"]:
+            connect_destroy(library, sig, self.__library_changed)
 
         completion = LibraryTagCompletion(library.librarian)
         self.accelerators = Gtk.AccelGroup()
@@ -95,25 +106,52 @@ class SearchBar(Gtk.VBox, Browser):
         self._sb_box.set_text(text)
 
     def __destroy(self, *args):
+        self._search.cancel()
         self._sb_box = None
+        self._results = self._found = None
+
+    def __library_changed(self, *args):
+        self._results = self._found = None
 
     def __focus(self, widget, *args):
         qltk.get_top_parent(widget).songlist.grab_focus()
 
-    def _get_songs(self):
+    def activate(self):
         text = self._get_text()
         try:
-            self._query = Query(text, star=SongList.star)
+            query = Query(text, star=SongList.star)
         except Query.error:
-            pass
-        else:
-            return self._query.filter(self._library)
+            return
 
-    def activate(self):
-        songs = self._get_songs()
-        if songs is not None:
-            songs = self._sb_box.limit(songs)
-            GLib.idle_add(self.songs_selected, songs)
+        # while typing, only search the results of the previous search
+        songs = self._library
+        if self._results is not None and query.narrows(self._results[0]):
+            songs = self._results[1]
+        self._query = query
+
+        found = []
+        self._found = found
+        self._selected = False
+        self._search.run(query.search, query.prefilter(songs),
+                         lambda *args: self.__found(query, found, *args))
+
+    def __found(self, query, found, songs, done):
+        found.extend(songs)
+        if done and self._found is found:
+            self._results = (query, found)
+
+        # show what we have so far, unless only a part of all results
+        # should be shown
+        if self._sb_box.limited:
+            if done:
+                GLib.idle_add(self.songs_selected, self._sb_box.limit(found))
+        elif not self._selected:
+            self._selected = True
+            GLib.idle_add(self.songs_selected, list(found))
+        else:
+            songs = [s for s in songs if s in self._library]
+            if songs:
+                self.songs_added(songs)
 
     def __text_parse(self, bar, text):
         self.activate()
@@ -105,6 +105,8 @@ def process_arguments():
         ("print-playlist", _("Print the current playlist")),
         ("print-queue", _("Print the contents of the queue")),
         ("no-plugins", _("Start without plugins")),
+        ("profile-startup",
+            _("Print which imports made starting up slow")),
         ("run", _("Start Quod Libet if it isn't running")),
         ("quit", _("Exit Quod Libet")),
             ]:
@@ -445,7 +445,10 @@ def _print_query(app, query):
     """
 
     songs = app.library.query(query)
-    return "\n".join([song("~filename") for song in songs]) + "\n"
+    if not songs:
+        return "\n"
+    # gets streamed by the control socket
+    return (song("~filename") + "\n" for song in songs)
 
 
 @registry.register("print-playing", optional=1)
@@ -34,6 +34,13 @@ INITIAL = {
     "library": {
         "exclude": "",
         "refresh_on_start": "true",
+        # "pickle" or "columnar", see library.init()
+        "format": "pickle",
+        # threads loading files during a scan, 0 for twice the CPU count
+        "scan_threads": "0",
+        # only check songs in directories which changed since the last
+        # rescan, misses files changed in place by other programs
+        "quick_rebuild": "false",
     },
     # State about the player, to restore on startup
     "memory": {
@@ -61,6 +61,7 @@ except IOError:
     pass
 
 CONTROL = os.path.join(USERDIR, "control")
+CONTROL_SOCKET = os.path.join(USERDIR, "control.socket")
 CONFIG = os.path.join(USERDIR, "config")
 CURRENT = os.path.join(USERDIR, "current")
 LIBRARY = os.path.join(USERDIR, "songs")
@@ -58,6 +58,7 @@ class LibraryEvent(ProcessEvent):
             self._being_created.remove(event.path)
         else:
             print_d("Ignoring modification on %s" % path)
+            GLib.idle_add(self.modified, event)
 
     def process_IN_MOVED_TO(self, event):
         print_d('Triggered for "%s"' % event.name)
@@ -95,6 +96,14 @@ class LibraryEvent(ProcessEvent):
             lib.add_filename(path)
         return False
 
+    def modified(self, event):
+        """Files changed in place don't change their directory, make sure
+        the next quick rebuild checks the songs in it"""
+        manifest = getattr(self._library, "scan_manifest", None)
+        if manifest is not None:
+            manifest.invalidate(os.path.realpath(event.path))
+        return False
+
     def update(self, event):
         """Update a library / file. Typically this means deleting it"""
         lib = self._library
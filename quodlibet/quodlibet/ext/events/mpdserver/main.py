@@ -5,12 +5,18 @@
 # it under the terms of version 2 of the GNU General Public License as
 # published by the Free Software Foundation.
 
+import collections
+import os
 import re
 import shlex
 
-from gi.repository import GObject
+from gi.repository import GObject, GLib
 
 from quodlibet import const
+from quodlibet import util
+from quodlibet.query import Query
+from quodlibet.util import re_escape
+from quodlibet.util.path import fsdecode, fsnative
 from .tcpserver import BaseTCPServer, BaseTCPConnection
 
 
@@ -74,6 +80,35 @@ def format_tags(song):
     return u"\n".join(lines)
 
 
+def format_song(song):
+    """Gives the file and tag list message for a song"""
+
+    lines = [u"file: %s" % fsdecode(song("~filename"))]
+    tags = format_tags(song)
+    if tags:
+        lines.append(tags)
+    return u"\n".join(lines)
+
+
+def get_tag_key(mpd_tag):
+    """Returns the Quod Libet key for a MPD tag type which can be used
+    for searching or raises MPDRequestError.
+    """
+
+    mpd_tag = mpd_tag.lower()
+    if mpd_tag == u"file":
+        return "~filename"
+
+    for mpd_key, ql_key in TAG_MAPPING:
+        if mpd_key.lower() == mpd_tag and ql_key:
+            if ql_key.startswith("~#"):
+                break
+            return ql_key
+
+    raise MPDRequestError(
+        u"Unsupported tag type \"%s\"" % mpd_tag, AckError.ARG)
+
+
 class ParseError(Exception):
     pass
 
@@ -172,16 +207,163 @@ class PlayerOptions(GObject.Object):
         self._repeat.set_active(value)
 
 
+class PlaylistTracker(object):
+    """Provides the MPD play queue, which is the queue followed by the song
+    list, and remembers the playlist version in which each position
+    changed last.
+
+    changed_callback gets called in case the version increases.
+    """
+
+    def __init__(self, playlist, library, changed_callback):
+        self._models = [playlist.q, playlist.pl]
+        self._changed_callback = changed_callback
+        self.version = 0
+        self._songs = []
+        self._versions = []
+        self._changed = set()
+        self._dirty = True
+        self._blocked = False
+        self._idle_id = None
+
+        self._model_sigs = []
+        for model in self._models:
+            for sig in ["row-inserted", "row-deleted", "rows-reordered"]:
+                id_ = model.connect(sig, self.__model_changed)
+                self._model_sigs.append((model, id_))
+
+        self._library = library
+        self._lib_id = library.connect("changed", self.__songs_changed)
+
+        self.update()
+
+    def destroy(self):
+        self.__unblock()
+        for model, id_ in self._model_sigs:
+            model.disconnect(id_)
+        self._library.disconnect(self._lib_id)
+        if self._idle_id is not None:
+            GLib.source_remove(self._idle_id)
+            self._idle_id = None
+        del self._models
+        del self._library
+
+    def __unblock(self):
+        if self._blocked:
+            for model, id_ in self._model_sigs:
+                model.handler_unblock(id_)
+            self._blocked = False
+
+    def __model_changed(self, *args):
+        # setting a song list inserts every row, one change is enough
+        # until we looked at it
+        for model, id_ in self._model_sigs:
+            model.handler_block(id_)
+        self._blocked = True
+        self.__mark_dirty()
+
+    def __songs_changed(self, library, songs):
+        self._changed.update(id(s) for s in songs)
+        self.__mark_dirty()
+
+    def __mark_dirty(self):
+        self._dirty = True
+        if self._idle_id is None:
+            self._idle_id = GLib.idle_add(self.__idle_update)
+
+    def __idle_update(self):
+        self._idle_id = None
+        if self.update():
+            self._changed_callback()
+        return False
+
+    def update(self):
+        """Compares the current play queue to the last known one, returns
+        True if something changed
+        """
+
+        if not self._dirty:
+            return False
+        self._dirty = False
+        self.__unblock()
+
+        songs = []
+        for model in self._models:
+            songs.extend(model.itervalues())
+        old_songs = self._songs
+        versions = self._versions
+        changed = self._changed
+        self._changed = set()
+
+        version = self.version + 1
+        modified = len(songs) != len(old_songs)
+        del versions[len(songs):]
+        for pos, song in enumerate(songs):
+            if pos >= len(versions):
+                versions.append(version)
+            elif song is not old_songs[pos] or id(song) in changed:
+                versions[pos] = version
+            else:
+                continue
+            modified = True
+
+        self._songs = songs
+        if modified:
+            self.version = version
+        return modified
+
+    def __len__(self):
+        self.update()
+        return len(self._songs)
+
+    def get_entries(self, start=0, end=None):
+        """A list of (position, song) tuples"""
+
+        self.update()
+        end = len(self._songs) if end is None else end
+        return zip(xrange(start, end), self._songs[start:end])
+
+    def get_changes(self, version):
+        """A list of (position, song) tuples for all positions which
+        changed after the given playlist version
+        """
+
+        self.update()
+        if version > self.version:
+            # from a different session, everything is new to the client
+            version = -1
+        return [(pos, self._songs[pos])
+                for pos, v in enumerate(self._versions) if v > version]
+
+    def get_current_position(self):
+        """The position of the current song or None"""
+
+        self.update()
+        queue, songlist = self._models
+        if queue.current is not None:
+            return queue.current_path.get_indices()[0]
+        elif songlist.current is not None:
+            return len(queue) + songlist.current_path.get_indices()[0]
+
+
 class MPDService(object):
     """This is the actual shared MPD service which the clients talk to"""
 
     version = (0, 17, 0)
 
+    SEARCH_CHUNK = 500
+    """Number of songs iter_songs() looks at before yielding None"""
+
     def __init__(self, app):
         self._app = app
         self._connections = set()
         self._idle_subscriptions = {}
-        self._pl_ver = 0
+
+        def playlist_changed():
+            self.emit_changed("playlist")
+
+        self._playlist = PlaylistTracker(
+            app.window.playlist, app.library, playlist_changed)
 
         self._options = PlayerOptions(app)
 
@@ -209,12 +391,7 @@ class MPDService(object):
         self._player_sigs.append(id_)
         id_ = app.player.connect("seek", player_changed)
         self._player_sigs.append(id_)
-
-        def playlist_changed(*args):
-            self._pl_ver += 1
-            self.emit_changed("playlist")
-
-        id_ = app.player.connect("song-started", playlist_changed)
+        id_ = app.player.connect("song-started", player_changed)
         self._player_sigs.append(id_)
 
     def _get_id(self, info):
@@ -227,8 +404,10 @@ class MPDService(object):
         for id_ in self._player_sigs:
             self._app.player.disconnect(id_)
         self._options.destroy()
+        self._playlist.destroy()
         del self._app
         del self._options
+        del self._playlist
 
     def add_connection(self, connection):
         self._connections.add(connection)
@@ -342,8 +521,8 @@ class MPDService(object):
             ("random", int(self._options.get_random())),
             ("single", int(self._options.get_single())),
             ("consume", 0),
-            ("playlist", self._pl_ver),
-            ("playlistlength", int(bool(app.player.info))),
+            ("playlist", self._playlist.version),
+            ("playlistlength", len(self._playlist)),
             ("mixrampdb", 0.0),
             ("state", state),
         ]
@@ -353,7 +532,7 @@ class MPDService(object):
             elapsed_time = int(app.player.get_position() / 1000)
             elapsed_exact = "%1.3f" % (app.player.get_position() / 1000.0)
             status.extend([
-                ("song", 0),
+                ("song", self._playlist.get_current_position() or 0),
                 ("songid", self._get_id(info)),
             ])
 
@@ -371,35 +550,127 @@ class MPDService(object):
         if info is None:
             return None
 
+        pos = self._playlist.get_current_position() or 0
+        return self.format_entry(pos, info)
+
+    def format_entry(self, pos, song):
+        """Gives the message for a play queue entry"""
+
         parts = []
-        parts.append(u"file: %s" % info("~filename"))
-        parts.append(format_tags(info))
-        parts.append(u"Pos: %d" % 0)
-        parts.append(u"Id: %d" % self._get_id(info))
+        parts.append(format_song(song))
+        parts.append(u"Pos: %d" % pos)
+        parts.append(u"Id: %d" % self._get_id(song))
 
         return u"\n".join(parts)
 
+    def format_entry_id(self, pos, song):
+        """Gives the short message for a play queue entry"""
+
+        return u"cpos: %d\nId: %d" % (pos, self._get_id(song))
+
     def playlistinfo(self, start=None, end=None):
-        if start is not None and start > 1:
-            return None
+        """A list of (position, song) tuples"""
 
-        return self.currentsong()
+        return self._playlist.get_entries(start or 0, end)
 
     def playlistid(self, songid=None):
-        return self.currentsong()
+        """A list of (position, song) tuples"""
+
+        entries = self._playlist.get_entries()
+        if songid is None:
+            return entries
+        return [(p, s) for (p, s) in entries if self._get_id(s) == songid]
 
     def plchanges(self, version):
-        if version != self._pl_ver:
-            return self.currentsong()
+        """A list of (position, song) tuples of all positions changed
+        since the playlist version"""
 
-    def plchangesposid(self, version):
-        info = self._app.player.info
-        if version != self._pl_ver and info:
-            parts = []
-            parts.append(u"file: %s" % info("~filename"))
-            parts.append(u"Pos: %d" % 0)
-            parts.append(u"Id: %d" % self._get_id(info))
-            return u"\n".join(parts)
+        return self._playlist.get_changes(version)
+
+    def filter_query(self, filters, exact):
+        """Returns a Query for a list of MPD (tag type, value) filters.
+
+        Exact filters compare whole values case sensitively, the others
+        search for case insensitive substrings.
+        """
+
+        parts = []
+        for mpd_tag, value in filters:
+            if mpd_tag.lower() == u"any":
+                keys = [get_tag_key(k) for k, v in TAG_MAPPING
+                        if v and not v.startswith("~#")]
+                keys = sorted(set(keys))
+            else:
+                keys = [get_tag_key(mpd_tag)]
+            pattern = re_escape(value)
+            if exact:
+                pattern = u"/^%s$/c" % pattern
+            else:
+                pattern = u"/%s/" % pattern
+            parts.append(u"%s=%s" % (u",".join(keys), pattern))
+        return Query(u"&(%s)" % u", ".join(parts))
+
+    def iter_songs(self, query=None, uri=None):
+        """Yields all library songs matching the query and located in the
+        directory or file given by uri, sorted by filename.
+
+        Yields None in between, so callers don't block for long while
+        looking for the next match.
+        """
+
+        items = self._app.library.iteritems()
+        if uri and uri != u"/":
+            path = fsnative(uri).rstrip(os.sep)
+            prefix = path + os.sep
+            items = [(k, s) for (k, s) in items
+                     if k == path or k.startswith(prefix)]
+        songs = [s for (k, s) in sorted(items)]
+
+        search = query.search if query is not None else None
+        for i in xrange(0, len(songs), self.SEARCH_CHUNK):
+            chunk = songs[i:i + self.SEARCH_CHUNK]
+            if search is not None:
+                chunk = filter(search, chunk)
+            for song in chunk:
+                yield song
+            yield None
+
+    def count(self, query):
+        """Yields None while counting, and finally (songs, playtime)"""
+
+        count = playtime = 0
+        for song in self.iter_songs(query):
+            if song is None:
+                yield None
+                continue
+            count += 1
+            playtime += song("~#length", 0)
+        yield count, playtime
+
+    def list_values(self, key, query=None):
+        """Yields None while collecting, and finally a sorted list of all
+        values of the songs matching the query"""
+
+        if query is None:
+            values = self._app.library.tag_values(key)
+        else:
+            values = set()
+            for song in self.iter_songs(query):
+                if song is None:
+                    yield None
+                    continue
+                values.update(song.list(key))
+        if key == "~filename":
+            values = map(fsdecode, values)
+        yield sorted(values)
+
+    def add(self, uri):
+        """Enqueues the song or all songs in the directory given by uri"""
+
+        songs = [s for s in self.iter_songs(uri=uri) if s is not None]
+        if not songs:
+            raise MPDRequestError(u"No such song", AckError.NO_EXIST)
+        self._app.window.playlist.enqueue(songs)
 
 
 class MPDServer(BaseTCPServer):
@@ -450,13 +721,44 @@ class MPDConnection(BaseTCPConnection):
         self._command = None
         # end - command processing state
 
+        # iterators of lines waiting to be written, see write_lines()
+        self._pending = collections.deque()
+
         self.start_write()
         self.start_read()
 
     def handle_read(self, data):
         self._feed_data(data)
+        self._process_lines()
+
+    def handle_write(self):
+        self._fill_buffer()
+        data = self._buf[:]
+        del self._buf[:]
+        return data
+
+    def can_write(self):
+        return bool(self._buf or self._pending)
+
+    def handle_close(self):
+        self.log("connection closed")
+        self.service.remove_connection(self)
+        del self.service
 
-        while 1:
+    #  ------------ rest ------------
+
+    WRITE_SIZE = 2 ** 16
+    """Amount of data collected per handle_write() call"""
+
+    WRITE_STEPS = 1000
+    """Maximum number of lines pulled from pending iterators per
+    handle_write() call. A None from an iterator ends the call early,
+    it means the iterator did a larger amount of work."""
+
+    def _process_lines(self):
+        # a command has to wait until the response of the previous one
+        # is written completely
+        while not self._pending and not self._closed:
             line = self._get_next_line()
             if line is None:
                 break
@@ -476,20 +778,30 @@ class MPDConnection(BaseTCPConnection):
                 self._use_command_list = False
                 del self._command_list[:]
 
-    def handle_write(self):
-        data = self._buf[:]
-        del self._buf[:]
-        return data
-
-    def can_write(self):
-        return bool(self._buf)
-
-    def handle_close(self):
-        self.log("connection closed")
-        self.service.remove_connection(self)
-        del self.service
+    def _fill_buffer(self):
+        """Moves lines from the pending iterators to the write buffer until
+        there is enough data or it's time to give the main loop a chance,
+        which is also the case after each None"""
 
-    #  ------------ rest ------------
+        pending = self._pending
+        for i in xrange(self.WRITE_STEPS):
+            if not pending or len(self._buf) >= self.WRITE_SIZE:
+                break
+            try:
+                line = next(pending[0])
+            except StopIteration:
+                pending.popleft()
+                if not pending:
+                    self._process_lines()
+                continue
+            except Exception:
+                # too late for an error response
+                util.print_exc()
+                pending.popleft()
+                continue
+            if line is None:
+                break
+            self._buf.extend(line.encode("utf-8", errors="replace") + "\n")
 
     def log(self, msg):
         if const.DEBUG:
@@ -517,7 +829,20 @@ class MPDConnection(BaseTCPConnection):
 
         assert isinstance(line, unicode)
 
-        self._buf.extend(line.encode("utf-8", errors="replace") + "\n")
+        if self._pending:
+            self._pending.append(iter([line]))
+        else:
+            self._buf.extend(line.encode("utf-8", errors="replace") + "\n")
+
+    def write_lines(self, lines):
+        """Writes the lines of an iterable to the client, pulling them
+        only as fast as the client reads them.
+
+        The iterable can also yield None, which doesn't write anything
+        but lets the main loop run in between.
+        """
+
+        self._pending.append(iter(lines))
 
     def ok(self):
         self.write_line(u"OK")
@@ -528,7 +853,7 @@ class MPDConnection(BaseTCPConnection):
         if index is not None:
             error.append(u"@%d" % index)
         assert self._command is not None
-        error.append("u] {%s}" % self._command)
+        error.append(u"] {%s}" % self._command)
         if msg is not None:
             error.append(u" %s" % msg)
         self.write_line(u"".join(error))
@@ -751,10 +1076,102 @@ def _cmd_currentsong(conn, service, args):
         conn.write_line(stats)
 
 
+def _parse_filters(args):
+    if not args or len(args) % 2:
+        raise MPDRequestError("Wrong arg count")
+    return zip(args[::2], args[1::2])
+
+
+def _split_window(args):
+    """Returns the arguments without a trailing 'window START:END' and the
+    range, or None"""
+
+    if len(args) >= 2 and args[-2] == u"window":
+        return args[:-2], _parse_range(args[-1])
+    return args, None
+
+
+def _iter_song_lines(songs, window=None):
+    start, end = window or (0, None)
+    index = 0
+    for song in songs:
+        if song is None:
+            yield None
+            continue
+        if end is not None and index >= end:
+            break
+        if index >= start:
+            yield format_song(song)
+        index += 1
+
+
+def _find(conn, service, args, exact):
+    args, window = _split_window(args)
+    query = service.filter_query(_parse_filters(args), exact)
+    conn.write_lines(_iter_song_lines(service.iter_songs(query), window))
+
+
+@MPDConnection.Command("find")
+def _cmd_find(conn, service, args):
+    _find(conn, service, args, True)
+
+
+@MPDConnection.Command("search")
+def _cmd_search(conn, service, args):
+    _find(conn, service, args, False)
+
+
 @MPDConnection.Command("count")
 def _cmd_count(conn, service, args):
-    conn.write_line(u"songs: 0")
-    conn.write_line(u"playtime: 0")
+    query = service.filter_query(_parse_filters(args), True)
+
+    def iter_lines():
+        for result in service.count(query):
+            if result is None:
+                yield None
+            else:
+                yield u"songs: %d" % result[0]
+                yield u"playtime: %d" % result[1]
+
+    conn.write_lines(iter_lines())
+
+
+@MPDConnection.Command("list")
+def _cmd_list(conn, service, args):
+    _verify_length(args, 1)
+    mpd_tag = args[0]
+    key = get_tag_key(mpd_tag)
+    filters = args[1:]
+    if len(filters) == 1:
+        # old protocol: "list album ARTIST"
+        if key != "album":
+            raise MPDRequestError(u"should be \"Album\" for 3 arguments")
+        filters = [u"artist", filters[0]]
+
+    query = None
+    if filters:
+        query = service.filter_query(_parse_filters(filters), True)
+
+    if key == "~filename":
+        mpd_tag = u"file"
+    else:
+        mpd_tag = dict((k.lower(), k) for k, v in TAG_MAPPING)[mpd_tag.lower()]
+
+    def iter_lines():
+        for values in service.list_values(key, query):
+            if values is None:
+                yield None
+            else:
+                for value in values:
+                    yield u"%s: %s" % (mpd_tag, value)
+
+    conn.write_lines(iter_lines())
+
+
+@MPDConnection.Command("add")
+def _cmd_add(conn, service, args):
+    _verify_length(args, 1)
+    service.add(args[0])
 
 
 @MPDConnection.Command("plchanges")
@@ -762,22 +1179,21 @@ def _cmd_plchanges(conn, service, args):
     _verify_length(args, 1)
     version = _parse_int(args[0])
     changes = service.plchanges(version)
-    if changes is not None:
-        conn.write_line(changes)
+    conn.write_lines(service.format_entry(p, s) for (p, s) in changes)
 
 
 @MPDConnection.Command("plchangesposid")
 def _cmd_plchangesposid(conn, service, args):
     _verify_length(args, 1)
     version = _parse_int(args[0])
-    changes = service.plchangesposid(version)
-    if changes is not None:
-        conn.write_line(changes)
+    changes = service.plchanges(version)
+    conn.write_lines(service.format_entry_id(p, s) for (p, s) in changes)
 
 
 @MPDConnection.Command("listallinfo")
-def _cmd_listallinfo(*args):
-    _cmd_currentsong(*args)
+def _cmd_listallinfo(conn, service, args):
+    uri = args[0] if args else None
+    conn.write_lines(_iter_song_lines(service.iter_songs(uri=uri)))
 
 
 @MPDConnection.Command("seek")
@@ -846,8 +1262,7 @@ def _cmd_playlistinfo(conn, service, args):
         result = service.playlistinfo(start, end)
     else:
         result = service.playlistinfo()
-    if result is not None:
-        conn.write_line(result)
+    conn.write_lines(service.format_entry(p, s) for (p, s) in result)
 
 
 @MPDConnection.Command("playlistid")
@@ -857,5 +1272,4 @@ def _cmd_playlistid(conn, service, args):
     else:
         songid = None
     result = service.playlistid(songid)
-    if result is not None:
-        conn.write_line(result)
+    conn.write_lines(service.format_entry(p, s) for (p, s) in result)
@@ -197,9 +197,17 @@ class BaseTCPConnection(object):
                 return False
 
             if flags & GLib.IOCondition.OUT:
-                if self.can_write():
+                # only ask for more once everything got sent, so slow
+                # clients don't make the buffer grow
+                if not write_buffer and self.can_write():
                     write_buffer.extend(self.handle_write())
+                    # the implementation could close in handle_write()
+                    if self._closed:
+                        return False
                 if not write_buffer:
+                    if self.can_write():
+                        # nothing ready yet, but there will be
+                        return True
                     self._out_id = None
                     return False
 
@@ -259,7 +267,11 @@ class BaseTCPConnection(object):
         raise NotImplementedError
 
     def handle_write(self):
-        """Called if new data can be written, should return the data"""
+        """Called if new data can be written, should return the data.
+
+        Can return nothing if can_write() is still True, it will get
+        called again.
+        """
 
         raise NotImplementedError
 
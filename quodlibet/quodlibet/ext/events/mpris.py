@@ -686,6 +686,7 @@ value="false"/>
                 return filter(can, schemes)
             elif name == "SupportedMimeTypes":
                 from quodlibet import formats
+                formats.init()
                 return formats.mimes
         elif interface == self.PLAYER_IFACE:
             if name == "PlaybackStatus":
@@ -6,8 +6,6 @@
 # it under the terms of the GNU General Public License version 2 as
 # published by the Free Software Foundation
 
-import random
-
 from gi.repository import Gtk, GLib
 
 from quodlibet import app
@@ -175,16 +173,19 @@ class RandomAlbum(EventPlugin):
                 keys = set(browser.list("album"))
                 values = [a for a in albumlib if a("album") in keys]
 
+            if not values:
+                return
+
             if self.use_weights:
                 # Select 3% of albums, or at least 3 albums
                 nr_albums = int(min(len(values), max(0.03 * len(values), 3)))
-                chosen_albums = random.sample(values, nr_albums)
+                chosen_albums = util.random_sample(values, nr_albums)
                 album_scores = sorted(self._score(chosen_albums))
                 for score, album in album_scores:
                     print_d("%0.2f scored by %s" % (score, album("album")))
                 album = max(album_scores)[1]
             else:
-                album = random.choice(values)
+                album = util.random_sample(values, 1)[0]
 
             if album is not None:
                 self.schedule_change(album)
@@ -6,72 +6,152 @@
 # it under the terms of the GNU General Public License version 2 as
 # published by the Free Software Foundation
 
-import os
 import sys
+import importlib
+import threading
 
-from quodlibet.util.importhelper import load_dir_modules
 from quodlibet import util
 from quodlibet import const
 from quodlibet.util.dprint import print_w
 from quodlibet.const import MinVersions
 
+
+MODULE_EXTENSIONS = {
+    "aac": [".aac", ".adif", ".adts"],
+    "midi": [".mid"],
+    "mod": [".669", ".amf", ".ams", ".dsm", ".far", ".it", ".med", ".mod",
+            ".mt2", ".mtm", ".okt", ".s3m", ".stm", ".ult", ".gdm", ".xm"],
+    "monkeysaudio": [".ape"],
+    "mp3": [".mp3", ".mp2"],
+    "mp4": [".mp4", ".m4a", ".m4v"],
+    "mpc": [".mpc", ".mp+"],
+    "remote": [],
+    "spc": [".spc"],
+    "trueaudio": [".tta"],
+    "vgm": [".vgm"],
+    "wav": [".wav"],
+    "wavpack": [".wv"],
+    "wma": [".wma"],
+    "xiph": [".ogg", ".oga", ".flac", ".oggflac", ".spx", ".ogv", ".opus"],
+}
+"""All format modules and the file extensions they might support.
+
+The modules only get imported once a file with one of the extensions
+shows up, so this has to be kept in sync with their `extensions`.
+"""
+
 mimes = set()
 _infos = {}
-modules = []
+_loaded = {}
+# files get loaded in multiple threads while scanning
+_load_lock = threading.Lock()
+modules = sorted(n for n, e in MODULE_EXTENSIONS.items() if e)
 names = []
 types = []
 
+_ext_modules = {}
+for _name, _exts in MODULE_EXTENSIONS.items():
+    for _ext in _exts:
+        _ext_modules[_ext] = _name
 
-def init():
-    global mimes, _infos, modules, names
 
+def _check_mutagen():
     import mutagen
     if mutagen.version < MinVersions.MUTAGEN:
         raise ImportError(
             "Mutagen %s required. %s found." %
             (MinVersions.MUTAGEN, mutagen.version_string))
 
-    base = os.path.dirname(__file__)
-    load_pyc = os.name == 'nt'
-    formats = load_dir_modules(base,
-                               package=__package__,
-                               load_compiled=load_pyc)
+_check_mutagen()
+
+
+def _load_module(name):
+    """Imports and registers a format module, returns None in case it
+    failed to import.
+    """
+
+    if name in _loaded:
+        return _loaded[name]
 
-    for format in formats:
-        name = format.__name__
+    with _load_lock:
+        if name in _loaded:
+            return _loaded[name]
 
-        for ext in format.extensions:
-            _infos[ext] = format.info
+        try:
+            format = importlib.import_module("." + name, __package__)
+        except Exception:
+            util.print_exc()
+            format = None
 
-        types.extend(format.types)
+        if format is not None:
+            print_d("Loaded format module %r" % name)
+            _register(format)
+        # only once everything is registered, other threads don't wait
+        # for the lock after this
+        _loaded[name] = format
+        _update_extensions()
 
-        if format.extensions:
-            for type_ in format.types:
-                mimes.update(type_.mimes)
-                names.append(type_.format)
-            modules.append(name.split(".")[-1])
+    return format
 
-        # Migrate pre-0.16 library, which was using an undocumented "feature".
-        sys.modules[name.replace(".", "/")] = format
-        # Migrate old layout
-        if name.startswith("quodlibet."):
-            sys.modules[name.split(".", 1)[1]] = format
 
-    modules.sort()
-    names.sort()
+def _register(format):
+    full_name = format.__name__
+
+    for ext in format.extensions:
+        _infos[ext] = format.info
+
+    types.extend(format.types)
+
+    if format.extensions:
+        for type_ in format.types:
+            mimes.update(type_.mimes)
+            names.append(type_.format)
+        names.sort()
+
+    # Migrate pre-0.16 library, which was using an undocumented "feature".
+    sys.modules[full_name.replace(".", "/")] = format
+    # Migrate old layout
+    if full_name.startswith("quodlibet."):
+        sys.modules[full_name.split(".", 1)[1]] = format
+
+
+def init():
+    """Imports all format modules.
+
+    Needed before using `types`, `names`, `mimes` or old library files,
+    which only know about the modules imported so far.
+    """
+
+    for name in sorted(MODULE_EXTENSIONS):
+        _load_module(name)
+
+    if not _infos:
+        raise SystemExit("No formats found!")
 
     # This can be used for the quodlibet.desktop file
     desktop_mime_types = "MimeType=" + \
         ";".join(sorted(set([m.split(";")[0] for m in mimes]))) + ";"
     print_d(desktop_mime_types)
 
-    if not _infos:
-        raise SystemExit("No formats found!")
 
-init()
+def _update_extensions():
+    global _extensions
+
+    # extensions of modules not imported yet and the ones which turned
+    # out to be supported
+    exts = set(_infos)
+    for ext, name in _ext_modules.iteritems():
+        if name not in _loaded:
+            exts.add(ext)
+    _extensions = tuple(exts)
 
+_update_extensions()
 
-_extensions = tuple(_infos.keys())
+
+def _get_info(ext):
+    if ext not in _infos:
+        _load_module(_ext_modules[ext])
+    return _infos.get(ext)
 
 
 def MusicFile(filename):
@@ -80,8 +160,12 @@ def MusicFile(filename):
     lower = filename.lower()
     for ext in _extensions:
         if lower.endswith(ext):
+            info = _get_info(ext)
+            if info is None:
+                print_w("Unsupported file extension %r" % filename)
+                return
             try:
-                return _infos[ext](filename)
+                return info(filename)
             except:
                 print_w("Error loading %r" % filename)
                 if const.DEBUG:
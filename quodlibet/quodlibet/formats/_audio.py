@@ -54,6 +54,9 @@ PEOPLE_SORT = [TAG_TO_SORT.get(k, k) for k in PEOPLE]
 VARIOUS_ARTISTS_VALUES = 'V.A.', 'various artists', 'Various Artists'
 """Values for ~people representing lots of people, most important last"""
 
+VOLATILE_TAGS = ["~playlists", "~lyrics"]
+"""Values can change without the song changing, don't cache sort keys"""
+
 
 class AudioFile(dict, ImageContainer):
     """An audio file. It looks like a dict, but implements synthetic
@@ -97,13 +100,26 @@ class AudioFile(dict, ImageContainer):
     def sort_key(self):
         return [self.album_key, self.__song_key()]
 
+    @util.cached_property
+    def _sort_cache(self):
+        return {}
+
     @staticmethod
     def sort_by_func(tag):
         """Returns a fast sort function for a specific tag (or pattern).
-        Some keys are already in the sort cache, so we can use them."""
+        Some keys are already in the sort cache, so we can use them.
+        Text keys get cached per song until the song changes."""
         def artist_sort(song):
             return song.sort_key[1][2]
 
+        def cached_sort(song):
+            cache = song._sort_cache
+            try:
+                return cache[tag]
+            except KeyError:
+                value = cache[tag] = human(song(tag))
+                return value
+
         if callable(tag):
             return lambda song: human(tag(song))
         elif tag == "artistsort":
@@ -112,7 +128,9 @@ class AudioFile(dict, ImageContainer):
             return lambda song: fsdecode(song(tag), note=False)
         elif tag.startswith("~#") and "~" not in tag[2:]:
             return lambda song: song(tag)
-        return lambda song: human(song(tag))
+        elif [t for t in VOLATILE_TAGS if t in tag]:
+            return lambda song: human(song(tag))
+        return cached_sort
 
     def __getstate__(self):
         """Don't pickle anything from __dict__"""
@@ -129,6 +147,7 @@ class AudioFile(dict, ImageContainer):
         pop = self.__dict__.pop
         pop("album_key", None)
         pop("sort_key", None)
+        pop("_sort_cache", None)
 
     def __delitem__(self, key):
         dict.__delitem__(self, key)
@@ -137,6 +156,7 @@ class AudioFile(dict, ImageContainer):
         pop = self.__dict__.pop
         pop("album_key", None)
         pop("sort_key", None)
+        pop("_sort_cache", None)
 
     @property
     def key(self):
@@ -14,37 +14,49 @@ also be queried in various ways.
 """
 
 import time
-import threading
 
 from quodlibet import print_d
+from quodlibet import config
 import quodlibet.formats as formats
 from quodlibet.const import LIBRARY_SAVE_PERIOD_SECONDS
 
 from quodlibet.library.libraries import SongFileLibrary, SongLibrary
 from quodlibet.library.librarians import SongLibrarian
-from quodlibet.util.path import mtime
+from quodlibet.util import copool
 
 
-def init(cache_fn=None):
+def init(cache_fn=None, columnar=None):
     """Set up the library and return the main one.
 
     Return a main library, and set a librarian for
     all future SongLibraries.
+
+    If `columnar` is True the library gets stored in the columnar format
+    and only decoded when needed. If None, the library/format config
+    option decides.
     """
     s = ", ".join(formats.modules)
     print_d("Supported formats: %s" % s)
     SongFileLibrary.librarian = SongLibrary.librarian = SongLibrarian()
     library = SongFileLibrary("main")
+    library.scan_threads = config.getint("library", "scan_threads", 0)
+    library.quick_rebuild = config.getboolean(
+        "library", "quick_rebuild", False)
     if cache_fn:
-        library.load(cache_fn)
+        if columnar is None:
+            columnar = config.get("library", "format") == "columnar"
+        library.load(cache_fn, columnar=columnar)
+        if columnar:
+            copool.add(library.materialize, funcid="library-materialize")
     return library
 
 
 def save(force=False):
     """Save all registered libraries that have a filename and are marked dirty.
 
-    If force = True save all of them blocking, else save non-blocking and
-    only if they were last saved more than LIBRARY_SAVE_PERIOD_SECONDS ago.
+    If force = True save all of them blocking, else save in the background
+    (see PicklingMixin.save_async) and only if they were last saved more
+    than LIBRARY_SAVE_PERIOD_SECONDS ago.
     """
 
     print_d("Saving all libraries...")
@@ -61,5 +73,5 @@ def save(force=False):
             except EnvironmentError:
                 pass
             lib.destroy()
-        elif time.time() - mtime(filename) > LIBRARY_SAVE_PERIOD_SECONDS:
-            threading.Thread(target=lib.save).run()
+        elif time.time() - lib.last_save > LIBRARY_SAVE_PERIOD_SECONDS:
+            lib.save_async()
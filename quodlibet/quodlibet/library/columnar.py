@@ -0,0 +1,476 @@
+# -*- coding: utf-8 -*-
+# Copyright 2016 Quod Libet contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as
+# published by the Free Software Foundation
+
+"""A columnar, memory mapped library format.
+
+In contrast to a pickled list every distinct key and value is stored only
+once in a value table and every key has its own column of
+(item index, value index) pairs. Values of the same type are stored next to
+each other, so each type can be decoded with a few calls instead of one
+per value, and decoded values are shared between all items.
+
+With `load_columns(..., lazy=True)` the returned items are empty
+placeholders which only know their key and mount point and get filled the
+first time they are accessed, or by running `materialize` in the
+background.
+"""
+
+import gc
+import os
+import sys
+import mmap
+import shutil
+import struct
+import cPickle as pickle
+from array import array
+from bisect import bisect_left
+from itertools import izip, repeat
+
+from quodlibet import util
+from quodlibet import const
+from quodlibet.util.dprint import print_d, print_w
+from quodlibet.util.path import mkdir
+
+
+MAGIC = b"QLCOLS\x00\x01"
+"""All files in this format start with this"""
+
+MATERIALIZE_CHUNK = 2000
+"""Number of items to decode in materialize() before yielding"""
+
+_HEADER = struct.Struct("<I")
+
+
+assert array("I").itemsize == 4 and array("H").itemsize == 2
+
+
+def is_columnar(filename):
+    """If the file exists and is in the columnar format"""
+
+    try:
+        with open(filename, "rb") as fileobj:
+            return fileobj.read(len(MAGIC)) == MAGIC
+    except EnvironmentError:
+        return False
+
+
+_SEGMENTS = "usifp"
+"""Value types in file order: unicode, str, int, float, pickle"""
+
+
+def _value_type(value):
+    # order matters, bool is an int subclass
+    if isinstance(value, unicode):
+        return "u" if u"\x00" not in value else "p"
+    elif isinstance(value, str):
+        return "s" if "\x00" not in value else "p"
+    elif isinstance(value, bool):
+        return "p"
+    elif isinstance(value, (int, long)):
+        return "i"
+    elif isinstance(value, float):
+        return "f"
+    return "p"
+
+
+def _encode_segment(type_, values):
+    if type_ == "u":
+        return u"\x00".join(values).encode("utf-8")
+    elif type_ == "s":
+        return "\x00".join(values)
+    elif type_ == "i":
+        return "\x00".join(map(str, values))
+    elif type_ == "f":
+        return "\x00".join(map(repr, values))
+    return pickle.dumps(values, 2)
+
+
+def _decode_segment(type_, data, count):
+    if not count:
+        return []
+    elif type_ == "u":
+        return data.decode("utf-8").split(u"\x00")
+    elif type_ == "s":
+        return data.split("\x00")
+    elif type_ == "i":
+        return map(int, data.split("\x00"))
+    elif type_ == "f":
+        return map(float, data.split("\x00"))
+    return pickle.loads(data)
+
+
+def dump_columns(filename, items):
+    """Write items (dict subclasses) in the columnar format.
+
+    Doesn't handle exceptions.
+    """
+
+    value_ids = {}
+    values = []
+    class_ids = {}
+    classes = []
+    item_classes = array("H")
+    columns = {}
+
+    def intern_value(value):
+        # 1 == 1.0 == True, so include the type
+        id_key = (type(value), value)
+        if id_key not in value_ids:
+            value_ids[id_key] = len(values)
+            values.append(value)
+        return value_ids[id_key]
+
+    for row, item in enumerate(items):
+        pairs = item.items()
+        cls = type(item)
+        if cls not in class_ids:
+            class_ids[cls] = len(classes)
+            classes.append((cls.__module__, cls.__name__))
+        item_classes.append(class_ids[cls])
+
+        for key, value in pairs:
+            try:
+                rows, vals = columns[(type(key), key)]
+            except KeyError:
+                rows, vals = columns[(type(key), key)] = \
+                    (array("I"), array("I"))
+                intern_value(key)
+            rows.append(row)
+
+            # inlined intern_value(), this is the hot path
+            id_key = (type(value), value)
+            try:
+                vals.append(value_ids[id_key])
+            except KeyError:
+                vals.append(intern_value(value))
+
+    # group the values by type and remap the ids
+    segments = dict((t, []) for t in _SEGMENTS)
+    for value in values:
+        segments[_value_type(value)].append(value)
+
+    remap = array("I", [0]) * len(values)
+    new_id = 0
+    for type_ in _SEGMENTS:
+        for value in segments[type_]:
+            remap[value_ids[(type(value), value)]] = new_id
+            new_id += 1
+    remap = remap.__getitem__
+    keys = sorted(columns, key=repr)
+
+    segment_data = [_encode_segment(t, segments[t]) for t in _SEGMENTS]
+    header = {
+        "byteorder": sys.byteorder,
+        "count": len(item_classes),
+        "classes": classes,
+        "segments": [(t, len(segments[t]), len(d))
+                     for t, d in zip(_SEGMENTS, segment_data)],
+        "columns": [(remap(value_ids[k]), len(columns[k][0])) for k in keys],
+    }
+    header_data = pickle.dumps(header, 2)
+
+    mkdir(os.path.dirname(filename))
+    with util.atomic_save(filename, ".tmp", "wb") as fileobj:
+        fileobj.write(MAGIC)
+        fileobj.write(_HEADER.pack(len(header_data)))
+        fileobj.write(header_data)
+        item_classes.tofile(fileobj)
+        for data in segment_data:
+            fileobj.write(data)
+        for id_key in keys:
+            rows, vals = columns[id_key]
+            rows.tofile(fileobj)
+            array("I", map(remap, vals)).tofile(fileobj)
+
+
+class _LazyItem(object):
+    """Mixed into the item class while the content isn't decoded.
+
+    Everything except `key` and `mountpoint` decodes the content first and
+    switches the instance to the real class, so materialized items don't
+    have any overhead.
+    """
+
+    __slots__ = ()
+
+    @property
+    def key(self):
+        return self._cached(2, "key")
+
+    @property
+    def mountpoint(self):
+        return self._cached(3, "mountpoint")
+
+    def _cached(self, index, name):
+        value = self.__dict__["_columns"][index]
+        if value is None:
+            self._materialize()
+            return getattr(self, name)
+        return value
+
+    def _materialize(self):
+        store, row = self.__dict__["_columns"][:2]
+        store.fill(row)
+
+
+def _lazy_method(name):
+    def method(self, *args, **kwargs):
+        # bound methods taken before materializing still end up here
+        if isinstance(self, _LazyItem):
+            self._materialize()
+        return getattr(type(self), name)(self, *args, **kwargs)
+    method.__name__ = name
+    return method
+
+
+for _name in ["__getitem__", "__setitem__", "__delitem__", "__contains__",
+              "__iter__", "__len__", "__repr__", "__call__", "__reduce__",
+              "__reduce_ex__", "get", "has_key", "keys", "values", "items",
+              "iterkeys", "itervalues", "iteritems", "copy", "update", "pop",
+              "popitem", "setdefault", "clear"]:
+    setattr(_LazyItem, _name, _lazy_method(_name))
+del _name
+
+
+class ColumnStore(object):
+    """Gives access to the content of a columnar file.
+
+    The file gets mapped, all values and columns get copied out of it and
+    the items get created and filled by `load` or `load_lazy`.
+
+    Can raise EnvironmentError, or ValueError etc. if the file is broken.
+    """
+
+    def __init__(self, filename):
+        with open(filename, "rb") as fileobj:
+            data = mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            self._read_tables(data)
+        finally:
+            data.close()
+
+        # fill targets for each row, items which shouldn't be touched
+        # (anymore) get replaced by a throwaway dict
+        self._sink = {}
+        self._targets = []
+
+    def _read_tables(self, data):
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError("not a columnar file")
+
+        offset = len(MAGIC)
+        size, = _HEADER.unpack_from(data, offset)
+        offset += _HEADER.size
+        header = pickle.loads(data[offset:offset + size])
+        self._offset = offset + size
+
+        swap = header["byteorder"] != sys.byteorder
+
+        def read(size):
+            start = self._offset
+            self._offset += size
+            if self._offset > len(data):
+                raise ValueError("columnar file is truncated")
+            return data[start:self._offset]
+
+        def read_array(typecode, count):
+            array_ = array(typecode)
+            array_.fromstring(read(count * array_.itemsize))
+            if swap:
+                array_.byteswap()
+            return array_
+
+        self.count = header["count"]
+        self._item_classes = read_array("H", self.count)
+
+        self._values = values = []
+        for type_, count, size in header["segments"]:
+            values.extend(_decode_segment(type_, read(size), count))
+
+        self._columns = []
+        for kid, length in header["columns"]:
+            rows = read_array("I", length)
+            vals = read_array("I", length)
+            self._columns.append((values[kid], rows, vals))
+
+        if self._offset != len(data):
+            raise ValueError("columnar file has the wrong size")
+
+        self._classes = [_find_class(*c) for c in header["classes"]]
+
+    def _column(self, key):
+        for column_key, rows, vals in self._columns:
+            if column_key == key:
+                return rows, vals
+        return array("I"), array("I")
+
+    def load(self):
+        """Returns a list of all items, fully decoded"""
+
+        items = self._create(lazy=False)
+        self._targets = [self._sink if i is None else i for i in items]
+        self._fill_range(0, self.count)
+        self._targets = []
+        return [i for i in items if i is not None]
+
+    def load_lazy(self):
+        """Returns a list of empty items which get filled on first access"""
+
+        self._items = items = self._create(lazy=True)
+        self._targets = [self._sink if i is None else i for i in items]
+        self._pending = bytearray(b"\x01") * self.count
+
+        for index, tag in [(2, "~filename"), (3, "~mountpoint")]:
+            rows, vals = self._column(tag)
+            values = map(self._values.__getitem__, vals)
+            for row, value in izip(rows, values):
+                item = items[row]
+                if item is not None:
+                    item.__dict__["_columns"][index] = value
+
+        return [i for i in items if i is not None]
+
+    def _create(self, lazy):
+        # creating lots of objects triggers many useless collections
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return self._create_items(lazy)
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+
+    def _create_items(self, lazy):
+        lazy_classes = {}
+        items = []
+        append = items.append
+        new = dict.__new__
+        for row, cid in enumerate(self._item_classes):
+            cls = self._classes[cid]
+            if cls is None:
+                append(None)
+            elif lazy:
+                if cls not in lazy_classes:
+                    lazy_classes[cls] = type(
+                        "Lazy" + cls.__name__, (_LazyItem, cls), {})
+                item = new(lazy_classes[cls])
+                item.__dict__["_columns"] = [self, row, None, None]
+                append(item)
+            else:
+                append(new(cls))
+        return items
+
+    def _fill_range(self, start, end):
+        """Fill all targets in [start, end)"""
+
+        setitem = dict.__setitem__
+        get_target = self._targets.__getitem__
+        get_value = self._values.__getitem__
+        for key, rows, vals in self._columns:
+            lo = bisect_left(rows, start)
+            hi = bisect_left(rows, end, lo)
+            if lo == hi:
+                continue
+            targets = map(get_target, rows[lo:hi])
+            values = map(get_value, vals[lo:hi])
+            map(setitem, targets, repeat(key, hi - lo), values)
+
+    def _finish(self, row):
+        item = self._items[row]
+        self._pending[row] = 0
+        self._targets[row] = self._sink
+        if item is not None:
+            del item.__dict__["_columns"]
+            item.__class__ = type(item).__mro__[2]
+
+    def fill(self, row):
+        """Decode the content of a lazy item"""
+
+        if self._pending[row]:
+            self._fill_range(row, row + 1)
+            self._finish(row)
+
+    def materialize(self, chunk_size=MATERIALIZE_CHUNK):
+        """Generator which decodes all remaining lazy items, chunk by chunk
+        """
+
+        pending = self._pending
+        for start in xrange(0, self.count, chunk_size):
+            end = min(start + chunk_size, self.count)
+            if pending.find(b"\x01", start, end) == -1:
+                continue
+            self._fill_range(start, end)
+            for row in xrange(start, end):
+                if pending[row]:
+                    self._finish(row)
+            yield True
+
+        self._sink.clear()
+
+
+def _find_class(module, name):
+    try:
+        __import__(module)
+        return getattr(sys.modules[module], name)
+    except (ImportError, AttributeError):
+        print_w("Skipping items of unknown class %s.%s" % (module, name))
+        return None
+
+
+def load_columns(filename, default=None, lazy=False):
+    """Load items from a columnar file.
+
+    If lazy is True the items are only decoded on first access or by
+    iterating `materialize`. In case of an error returns default or
+    an empty list.
+    """
+
+    if default is None:
+        default = []
+
+    try:
+        store = ColumnStore(filename)
+    except EnvironmentError:
+        if const.DEBUG or os.path.exists(filename):
+            print_w("Couldn't load library from: %r" % filename)
+        return default
+    except Exception:
+        util.print_exc()
+        try:
+            shutil.copy(filename, filename + ".not-valid")
+        except EnvironmentError:
+            util.print_exc()
+        return default
+
+    if lazy:
+        print_d("Loaded %d items lazily from %r." % (store.count, filename))
+        return store.load_lazy()
+
+    return store.load()
+
+
+def decode(item):
+    """Makes sure a single item isn't lazy anymore"""
+
+    if isinstance(item, _LazyItem):
+        item._materialize()
+
+
+def materialize(items):
+    """Generator decoding all lazy items created by the same loads as any
+    item in `items`"""
+
+    stores = set()
+    for item in items:
+        state = getattr(item, "__dict__", {}).get("_columns")
+        if state is not None:
+            stores.add(state[0])
+
+    for store in stores:
+        for value in store.materialize():
+            yield value
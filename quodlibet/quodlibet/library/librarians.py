@@ -146,6 +146,13 @@ class SongLibrarian(Librarian):
             tags.update(library.tag_values(tag))
         return list(tags)
 
+    def tag_names(self):
+        """Return a list of all tag names used by the songs."""
+        tags = set()
+        for library in self.libraries.itervalues():
+            tags.update(library.tag_names())
+        return list(tags)
+
     def rename(self, song, newname, changed=None):
         """Rename the song in all libraries it belongs to.
 
@@ -166,6 +173,7 @@ class SongLibrarian(Librarian):
                 pass
             else:
                 re_add.append(library)
+                library._journal_keys([song.key])
         song.rename(newname)
         for library in re_add:
             library._contents[song.key] = song
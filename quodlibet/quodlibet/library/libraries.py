@@ -16,19 +16,27 @@ least useful but most content-agnostic.
 from pickle import Unpickler
 from cStringIO import StringIO
 import cPickle as pickle
+import copy
+import multiprocessing
 import os
 import shutil
 import threading
 import time
+from multiprocessing import TimeoutError
+from multiprocessing.pool import ThreadPool
 
-from gi.repository import GObject
+from gi.repository import GObject, GLib
 
 from quodlibet.formats import MusicFile
-from quodlibet.query import Query
+from quodlibet.query import Query, TagIndex
 from quodlibet.qltk.notif import Task
 from quodlibet.util.collection import Album
+from quodlibet.library import columnar
+from quodlibet.library.manifest import ScanManifest
+from quodlibet.library.tagvalues import TagValueIndex
 from quodlibet.util.collections import DictMixin
 from quodlibet import util
+from quodlibet.util import copool
 from quodlibet import const
 from quodlibet import formats
 from quodlibet.util.dprint import print_d, print_w
@@ -221,6 +229,23 @@ def dump_items(filename, items):
         pickle.dump(items, fileobj, 1)
 
 
+def copy_item(item):
+    """Returns a shallow copy of a library item which can be pickled
+    in another thread while the original gets changed"""
+
+    columnar.decode(item)
+    if not isinstance(item, dict):
+        return copy.copy(item)
+
+    cls = type(item)
+    new = cls.__new__(cls)
+    dict.update(new, item)
+    state = getattr(item, "__dict__", None)
+    if state:
+        new.__dict__.update(state)
+    return new
+
+
 def unpickle_save(data, default, type_=dict):
     """Unpickle a list of `type_` subclasses and skip items for which the
     class is missing.
@@ -234,6 +259,13 @@ def unpickle_save(data, default, type_=dict):
     class SaveUnpickler(Unpickler):
 
         def find_class(self, module, name):
+            try:
+                return Unpickler.find_class(self, module, name)
+            except (ImportError, AttributeError):
+                pass
+
+            # old names of format modules only exist once they are imported
+            formats.init()
             try:
                 return Unpickler.find_class(self, module, name)
             except (ImportError, AttributeError):
@@ -294,24 +326,263 @@ def load_items(filename, default=None):
     return items
 
 
+class LibraryJournal(object):
+    """An append-only change log next to a pickled library snapshot.
+
+    The snapshot at `filename` is a normal pickled item list as written by
+    `dump_items`. Every journal record holds the items that were added or
+    changed and the keys that were removed since the last record, so
+    saving costs O(changes) instead of O(library).
+
+    The snapshot can either be a pickle or in the columnar format (see
+    `quodlibet.library.columnar`), which one is read gets detected, `columnar`
+    decides which one gets written.
+
+    Once the journal grows past a fraction of the snapshot it gets merged
+    into a new snapshot in a background thread. For that the journal is
+    first moved out of the way, so new records can be appended while the
+    merge is running. Replaying records is idempotent, so an interrupted
+    merge only means the moved journal gets replayed again on next load.
+    """
+
+    COMPACT_MIN_SIZE = 1024 * 1024
+    """Don't compact journals smaller than this (in bytes)"""
+
+    COMPACT_RATIO = 0.25
+    """Compact if the journal gets larger than the snapshot times this"""
+
+    def __init__(self, filename, columnar=False):
+        self.filename = filename
+        self.columnar = columnar
+        self.journal_filename = filename + ".journal"
+        self._merge_filename = filename + ".journal.old"
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _journals(self):
+        return [self._merge_filename, self.journal_filename]
+
+    def exists(self):
+        """If a snapshot exists we can append to"""
+
+        return os.path.exists(self.filename)
+
+    def load_snapshot(self, default=None, lazy=False):
+        """Returns the snapshot items or default in case of an error.
+
+        If lazy, items of a columnar snapshot get decoded on first access.
+        """
+
+        if columnar.is_columnar(self.filename):
+            return columnar.load_columns(self.filename, default, lazy)
+        return load_items(self.filename, default)
+
+    def dump_snapshot(self, items, filename=None):
+        """Write a new snapshot in the configured format.
+
+        Can raise EnvironmentError.
+        """
+
+        if filename is None:
+            filename = self.filename
+
+        if self.columnar:
+            columnar.dump_columns(filename, items)
+        else:
+            dump_items(filename, items)
+
+    def load(self, lazy=False):
+        """Returns the snapshot items with all journal records applied"""
+
+        items = self.load_snapshot(lazy=lazy)
+        journals = [f for f in self._journals() if os.path.exists(f)]
+        if not journals:
+            return items
+
+        contents = dict((item.key, item) for item in items)
+        for filename in journals:
+            self._replay(filename, contents)
+        return contents.values()
+
+    def _replay(self, filename, contents):
+        try:
+            with open(filename, "rb") as fileobj:
+                data = fileobj.read()
+        except EnvironmentError:
+            print_w("Couldn't read library journal: %r" % filename)
+            return
+
+        buf = StringIO(data)
+        unpickler = pickle.Unpickler(buf)
+        count = 0
+        end = 0
+        while True:
+            try:
+                changed, removed = unpickler.load()
+            except EOFError:
+                break
+            except Exception:
+                # a record got cut off by a crash or references a class
+                # which is gone, nothing after it can be trusted
+                util.print_exc()
+                break
+
+            for key in removed:
+                contents.pop(key, None)
+            for item in changed:
+                contents[item.key] = item
+            count += 1
+            end = buf.tell()
+
+        print_d("Replayed %d journal records from %r." % (count, filename))
+
+        if end != len(data):
+            # otherwise new records would get appended after the broken
+            # one and lost on the next load
+            print_w("Truncating library journal %r to %d bytes." % (
+                filename, end))
+            try:
+                with self._lock:
+                    with open(filename, "r+b") as fileobj:
+                        fileobj.truncate(end)
+                        fileobj.flush()
+                        os.fsync(fileobj.fileno())
+            except EnvironmentError:
+                print_w("Couldn't truncate library journal: %r" % filename)
+
+    def append(self, changed, removed):
+        """Append a record of changed items and removed keys.
+
+        Can raise EnvironmentError.
+        """
+
+        with self._lock:
+            with open(self.journal_filename, "ab") as fileobj:
+                # see dump_items() for why protocol 1
+                pickle.dump((changed, removed), fileobj, 1)
+                fileobj.flush()
+                os.fsync(fileobj.fileno())
+
+        if self.needs_compaction():
+            self.compact_async()
+
+    def needs_compaction(self):
+        try:
+            size = sum(os.path.getsize(f) for f in self._journals()
+                       if os.path.exists(f))
+            limit = os.path.getsize(self.filename) * self.COMPACT_RATIO
+        except EnvironmentError:
+            return False
+        return size > max(self.COMPACT_MIN_SIZE, limit)
+
+    def compact_async(self):
+        """Merge the journal into the snapshot in a background thread"""
+
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self.compact)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def wait(self):
+        """Block until a running background compaction is done"""
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def compact(self):
+        """Merge the journal into the snapshot"""
+
+        print_d("Compacting library journal for %r." % self.filename)
+
+        with self._lock:
+            if os.path.exists(self.journal_filename):
+                if not os.path.exists(self._merge_filename):
+                    os.rename(self.journal_filename, self._merge_filename)
+                else:
+                    # left over from an interrupted compaction
+                    with open(self._merge_filename, "ab") as dest:
+                        with open(self.journal_filename, "rb") as src:
+                            shutil.copyfileobj(src, dest)
+                    os.remove(self.journal_filename)
+
+        if not os.path.exists(self._merge_filename):
+            return
+
+        failed = []
+        items = self.load_snapshot(failed)
+        if items is failed:
+            return
+
+        contents = dict((item.key, item) for item in items)
+        self._replay(self._merge_filename, contents)
+        items = sorted(contents.values(), key=lambda item: item.key)
+
+        try:
+            self.dump_snapshot(items)
+            os.remove(self._merge_filename)
+        except EnvironmentError:
+            print_w("Couldn't compact library journal: %r" % self.filename)
+        else:
+            print_d("Done compacting library journal for %r." % self.filename)
+
+    def clear(self):
+        """Remove all journal records, e.g. after the snapshot was replaced
+        by a complete one"""
+
+        self.wait()
+        with self._lock:
+            for filename in self._journals():
+                try:
+                    os.remove(filename)
+                except EnvironmentError:
+                    pass
+
+
 class PicklingMixin(object):
-    """A mixin to provide persistence of a library by pickling to disk"""
+    """A mixin to provide persistence of a library by pickling to disk
+
+    If the library reports changes through `_journal_items` and
+    `_journal_keys` only those get appended to a `LibraryJournal` on save,
+    otherwise the whole content gets pickled each time.
+    """
 
     filename = None
 
+    last_save = 0
+    """Time of the last successful save"""
+
+    SAVE_CHUNK_SIZE = 1000
+    """Number of items save_async() copies per main loop iteration"""
+
     def __init__(self):
         self._save_lock = threading.Lock()
-
-    def load(self, filename):
+        self._journal = None
+        self._journal_pending = None
+        # increased by every blocking save, so an async one which didn't
+        # get to write yet knows it's outdated
+        self._save_generation = 0
+        self._save_running = False
+        self._save_again = False
+        self._save_callbacks = []
+        self._save_touched = None
+
+    def load(self, filename, columnar=False):
         """Load a library from a file, containing a picked list.
 
+        If `columnar` is True, the library gets saved in the columnar format
+        instead and items of an existing columnar file only get decoded on
+        first access (see `materialize`).
+
         Loading does not cause added, changed, or removed signals.
         """
 
         self.filename = filename
         print_d("Loading contents of %r." % filename, self)
 
-        items = load_items(filename)
+        self._journal = LibraryJournal(filename, columnar)
+        items = self._journal.load(lazy=columnar)
 
         # this loads all items without checking their validity, but makes
         # sure that non-mounted items are masked
@@ -319,6 +590,48 @@ class PicklingMixin(object):
 
         print_d("Done loading contents of %r." % filename, self)
 
+    def materialize(self):
+        """Generator which decodes all lazily loaded items in chunks"""
+
+        return columnar.materialize(self.get_content())
+
+    def _journal_items(self, items):
+        """Mark items as added/changed/removed since the last save"""
+
+        self._journal_keys(item.key for item in items)
+
+    def _journal_keys(self, keys):
+        """Mark keys as changed since the last save. Needed in case
+        items get stored under a new key (e.g. renaming)."""
+
+        pending = self._journal_pending
+        if pending is not None:
+            touched = self._save_touched
+            if touched is not None:
+                keys = list(keys)
+                touched.update(keys)
+            pending.update(keys)
+
+    def _get_stored(self, key):
+        """Returns the item which gets saved for the key or None"""
+
+        return self._contents.get(key)
+
+    def _get_save_state(self):
+        """Returns data which has to be written together with the items,
+        see `_write_save_state`"""
+
+        return None
+
+    def _write_save_state(self, state):
+        """Writes the result of a `_get_save_state` call made right before
+        the items got saved to the default filename, once they are.
+
+        Can be called from another thread.
+        """
+
+        pass
+
     def save(self, filename=None):
         """Save the library to the given filename, or the default if `None`"""
 
@@ -326,14 +639,206 @@ class PicklingMixin(object):
             filename = self.filename
 
         with self._save_lock:
-            print_d("Saving contents to %r." % filename, self)
+            self._save_generation += 1
+            state = None
+            if filename == self.filename:
+                state = self._get_save_state()
+            if self._can_append(filename):
+                saved = self._save_journal()
+            else:
+                saved = self._save_full(filename)
+            if saved and filename == self.filename:
+                self._write_save_state(state)
+
+    def _can_append(self, filename):
+        journal = self._journal
+        return journal is not None and filename == journal.filename and \
+            self._journal_pending is not None and journal.exists()
+
+    def _get_changes(self, keys):
+        """Returns a list of stored items and a list of removed keys"""
+
+        changed = []
+        removed = []
+        for key in keys:
+            item = self._get_stored(key)
+            if item is None:
+                removed.append(key)
+            else:
+                changed.append(item)
+        return changed, removed
 
-            try:
-                dump_items(filename, self.get_content())
-            except EnvironmentError:
-                print_w("Couldn't save library to path: %r" % filename)
+    def _save_full(self, filename):
+        """Returns True if saving succeeded"""
+
+        print_d("Saving contents to %r." % filename, self)
+
+        own_file = self._journal is not None and \
+            filename == self._journal.filename
+        if own_file:
+            self._journal.wait()
+
+        try:
+            if own_file:
+                self._journal.dump_snapshot(self.get_content())
             else:
-                self.dirty = False
+                dump_items(filename, self.get_content())
+        except EnvironmentError:
+            print_w("Couldn't save library to path: %r" % filename)
+            return False
+        else:
+            if own_file:
+                self._journal.clear()
+                self._journal_pending = set()
+            self.dirty = False
+            self.last_save = time.time()
+            return True
+
+    def _save_journal(self):
+        """Returns True if saving succeeded"""
+
+        keys, self._journal_pending = self._journal_pending, set()
+        if not keys:
+            self.dirty = False
+            self.last_save = time.time()
+            return True
+
+        changed, removed = self._get_changes(keys)
+
+        print_d("Saving %d changed and %d removed items to %r." % (
+            len(changed), len(removed), self._journal.journal_filename), self)
+
+        try:
+            self._journal.append(changed, removed)
+        except EnvironmentError:
+            print_w("Couldn't save library journal: %r" %
+                    self._journal.journal_filename)
+            self._journal_pending.update(keys)
+            return False
+        else:
+            self.dirty = False
+            self.last_save = time.time()
+            return True
+
+    def save_async(self, callback=None):
+        """Save the library to the default filename without blocking.
+
+        The items get copied on the main loop (in chunks if the whole
+        library has to be written) and pickled by a worker thread, so
+        changes made in the meantime can't end up half written.
+        Requests made while saving get coalesced into one more save.
+
+        `callback(library, success)` gets called in the main loop once all
+        changes made before the request are saved or saving them failed.
+        """
+
+        if callback is not None:
+            self._save_callbacks.append(callback)
+
+        if self._save_running:
+            self._save_again = True
+        else:
+            self.__start_save()
+
+    def __start_save(self):
+        self._save_running = True
+        self._save_again = False
+        callbacks, self._save_callbacks = self._save_callbacks, []
+        generation = self._save_generation
+        filename = self.filename
+        journal = self._journal
+        state = self._get_save_state()
+
+        # keys which are pending now and get written by this save, changes
+        # made until it's done are collected in _save_touched
+        written = None
+        if self._journal_pending is not None:
+            written = set(self._journal_pending)
+            self._save_touched = set()
+        self.dirty = False
+
+        def done(error):
+            self.__save_done(callbacks, written, error)
+
+        if self._can_append(filename):
+            changed, removed = self._get_changes(written)
+            changed = map(copy_item, changed)
+
+            def write():
+                if changed or removed:
+                    print_d("Saving %d changed and %d removed items to %r."
+                            % (len(changed), len(removed),
+                               journal.journal_filename), self)
+                    journal.append(changed, removed)
+                self._write_save_state(state)
+
+            self.__write_async(generation, write, done)
+        else:
+            own_file = journal is not None and filename == journal.filename
+
+            def write(items):
+                print_d("Saving contents to %r." % filename, self)
+                if own_file:
+                    journal.wait()
+                    journal.dump_snapshot(items)
+                    journal.clear()
+                else:
+                    dump_items(filename, items)
+                self._write_save_state(state)
+
+            def copied(items):
+                self.__write_async(generation, lambda: write(items), done)
+
+            copool.add(self.__copy_items, self.get_content(), copied,
+                       funcid=("library-save", id(self)))
+
+    def __copy_items(self, items, callback):
+        copies = []
+        size = self.SAVE_CHUNK_SIZE
+        for i in xrange(0, len(items), size):
+            copies.extend(map(copy_item, items[i:i + size]))
+            yield True
+        callback(copies)
+
+    def __write_async(self, generation, write, done):
+        def run():
+            error = None
+            try:
+                with self._save_lock:
+                    # a blocking save in between has written everything
+                    if generation == self._save_generation:
+                        write()
+            except EnvironmentError as e:
+                error = e
+            except Exception as e:
+                util.print_exc()
+                error = e
+            GLib.idle_add(done, error)
+
+        thread = threading.Thread(target=run, name="Library Save")
+        thread.daemon = True
+        thread.start()
+
+    def __save_done(self, callbacks, written, error):
+        touched, self._save_touched = self._save_touched, None
+        self._save_running = False
+
+        if error is None:
+            self.last_save = time.time()
+            if written is not None:
+                # keys changed while saving have to be written again
+                self._journal_pending -= written - touched
+        else:
+            print_w("Couldn't save library to path: %r" % self.filename)
+            self.dirty = True
+
+        for callback in callbacks:
+            callback(self, error is None)
+
+        if self._save_again or self._save_callbacks:
+            self.__start_save()
+
+        return False
 
 
 class PicklingLibrary(Library, PicklingMixin):
@@ -343,6 +848,21 @@ class PicklingLibrary(Library, PicklingMixin):
         PicklingMixin.__init__(self)
         Library.__init__(self, name)
 
+        # track changes for appending them to the journal on save
+        self._journal_pending = set()
+        self._journal_sigs = [
+            self.connect(signal, self.__journal_changes)
+            for signal in ["added", "changed", "removed"]]
+
+    def __journal_changes(self, library, items):
+        self._journal_items(items)
+
+    def destroy(self):
+        for sig in self._journal_sigs:
+            self.disconnect(sig)
+        self._journal_sigs = []
+        super(PicklingLibrary, self).destroy()
+
 
 class AlbumLibrary(Library):
     """An AlbumLibrary listens to a SongLibrary and sorts its songs into
@@ -360,6 +880,8 @@ class AlbumLibrary(Library):
             "AlbumLibrary for %s" % library._name)
 
         self._library = library
+        # id(song) -> album containing the song
+        self._song_albums = {}
         self._asig = library.connect('added', self.__added)
         self._rsig = library.connect('removed', self.__removed)
         self._csig = library.connect('changed', self.__changed)
@@ -383,15 +905,18 @@ class AlbumLibrary(Library):
     def __add(self, items):
         changed = set()
         new = set()
+        albums = self._contents
+        song_albums = self._song_albums
         for song in items:
             key = song.album_key
-            if key in self._contents:
-                changed.add(self._contents[key])
-            else:
-                album = Album(song)
-                self._contents[key] = album
+            album = albums.get(key)
+            if album is None:
+                album = albums[key] = Album(song)
                 new.add(album)
-            self._contents[key].songs.add(song)
+            else:
+                changed.add(album)
+            album.songs.add(song)
+            song_albums[id(song)] = album
 
         changed -= new
         return changed, new
@@ -408,17 +933,26 @@ class AlbumLibrary(Library):
             if changed:
                 self.emit('changed', changed)
 
+    def __discard(self, song):
+        """Removes the song from its album and returns the album
+        or None if the song wasn't in any"""
+
+        album = self._song_albums.pop(id(song), None)
+        if album is not None:
+            album.songs.discard(song)
+        return album
+
     def __removed(self, library, items):
         changed = set()
         removed = set()
         for song in items:
-            key = song.album_key
-            album = self._contents[key]
-            album.songs.remove(song)
+            album = self.__discard(song)
+            if album is None:
+                continue
             changed.add(album)
             if not album.songs:
                 removed.add(album)
-                del self._contents[key]
+                del self._contents[album.key]
 
         changed -= removed
 
@@ -431,27 +965,29 @@ class AlbumLibrary(Library):
             self.emit('changed', changed)
 
     def __changed(self, library, items):
-        """Album keys could change between already existing ones.. so we
-        have to do it the hard way and search by id."""
+        """Album keys could change between already existing ones, so move
+        songs whose key changed from their old album (known through the
+        song to album map) to the new one."""
+
         print_d("Updating affected albums for %d items" % len(items))
         changed = set()
         removed = set()
         to_add = []
+        song_albums = self._song_albums
         for song in items:
+            album = song_albums.get(id(song))
             # in case the key hasn't changed
-            key = song.album_key
-            if key in self._contents and song in self._contents[key].songs:
-                changed.add(self._contents[key])
-            else:  # key changed.. look for it in each album
-                to_add.append(song)
-                for key, album in self._contents.iteritems():
-                    if song in album.songs:
-                        album.songs.remove(song)
-                        if not album.songs:
-                            removed.add(album)
-                        else:
-                            changed.add(album)
-                        break
+            if album is not None and album.key == song.album_key:
+                changed.add(album)
+                continue
+
+            to_add.append(song)
+            album = self.__discard(song)
+            if album is not None:
+                if not album.songs:
+                    removed.add(album)
+                else:
+                    changed.add(album)
 
         # get new albums and changed ones because keys could have changed
         add_changed, new = self.__add(to_add)
@@ -483,6 +1019,8 @@ class SongLibrary(PicklingLibrary):
 
     def __init__(self, *args, **kwargs):
         super(SongLibrary, self).__init__(*args, **kwargs)
+        self.tag_index = TagIndex(self)
+        self.tag_value_index = TagValueIndex(self)
 
     @util.cached_property
     def albums(self):
@@ -490,15 +1028,24 @@ class SongLibrary(PicklingLibrary):
 
     def destroy(self):
         super(SongLibrary, self).destroy()
+        self.tag_index.destroy()
+        self.tag_value_index.destroy()
         if "albums" in self.__dict__:
             self.albums.destroy()
 
+    def _load_init(self, items):
+        # loading doesn't emit signals
+        self.tag_index.clear()
+        self.tag_value_index.clear()
+        super(SongLibrary, self)._load_init(items)
+
     def tag_values(self, tag):
         """Return a list of all values for the given tag."""
-        tags = set()
-        for song in self.itervalues():
-            tags.update(song.list(tag))
-        return list(tags)
+        return self.tag_value_index.values(tag)
+
+    def tag_names(self):
+        """Return a list of all tag names used by the songs."""
+        return self.tag_value_index.names()
 
     def rename(self, song, newname, changed=None):
         """Rename a song.
@@ -514,6 +1061,7 @@ class SongLibrary(PicklingLibrary):
         """
         print_d("Renaming %r to %r" % (song.key, newname), self)
         del(self._contents[song.key])
+        self._journal_keys([song.key])
         song.rename(newname)
         self._contents[song.key] = song
         if changed is not None:
@@ -527,10 +1075,9 @@ class SongLibrary(PicklingLibrary):
         if isinstance(text, str):
             text = text.decode('utf-8')
 
-        songs = self.values()
-        if text != "":
-            songs = filter(Query(text, star).search, songs)
-        return songs
+        if text == "":
+            return self.values()
+        return Query(text, star).filter(self)
 
 
 class FileLibrary(PicklingLibrary):
@@ -540,9 +1087,41 @@ class FileLibrary(PicklingLibrary):
     and have a mountpoint attribute.
     """
 
+    scan_threads = 0
+    """Number of threads loading files in scan(), 0 means twice the number
+    of CPUs. See the library/scan_threads config option."""
+
+    quick_rebuild = False
+    """If True, rebuild() only checks items in directories which changed
+    since the last scan. Misses files changed in place by other programs.
+    See the library/quick_rebuild config option."""
+
     def __init__(self, name=None):
         super(FileLibrary, self).__init__(name)
         self._masked = {}
+        self.scan_manifest = ScanManifest()
+        self._manifest_sig = self.connect('removed', self.__invalidate_dirs)
+
+    def destroy(self):
+        self.disconnect(self._manifest_sig)
+        super(FileLibrary, self).destroy()
+
+    def load(self, filename, *args, **kwargs):
+        super(FileLibrary, self).load(filename, *args, **kwargs)
+        self.scan_manifest = ScanManifest(filename + ".dirs")
+
+    def _get_save_state(self):
+        return self.scan_manifest.get_state()
+
+    def _write_save_state(self, state):
+        self.scan_manifest.write(state)
+
+    def __invalidate_dirs(self, library, items):
+        # scans should find removed items again if the files still exist
+        manifest = self.scan_manifest
+        for item in items:
+            if isinstance(item.key, basestring):
+                manifest.invalidate(os.path.dirname(item.key))
 
     def _load_init(self, items):
         """Add many items to the library, check if the
@@ -673,8 +1252,18 @@ class FileLibrary(PicklingLibrary):
         if cofuncid:
             task.copool(cofuncid)
         changed, removed = set(), set()
+        quick = self.quick_rebuild and not force
+        current = {}
         for i, (key, item) in task.list(enumerate(sorted(self.items()))):
-            if key in self._contents and force or not item.valid():
+            unchanged = False
+            if quick and isinstance(key, basestring):
+                dirname = os.path.dirname(key)
+                if dirname not in current:
+                    current[dirname] = self.scan_manifest.is_current(dirname)
+                unchanged = current[dirname]
+            if unchanged:
+                pass
+            elif key in self._contents and force or not item.valid():
                 self.reload(item, changed, removed)
                 # These numbers are pretty empirical. We should yield more
             # often than we emit signals; that way the main loop stays
@@ -694,7 +1283,7 @@ class FileLibrary(PicklingLibrary):
         if changed:
             self.emit('changed', changed)
 
-        for value in self.scan(paths, exclude, cofuncid):
+        for value in self.scan(paths, exclude, cofuncid, force):
             yield value
 
     def add_filename(self, filename, add=True):
@@ -704,16 +1293,61 @@ class FileLibrary(PicklingLibrary):
         """
         raise NotImplementedError
 
-    def scan(self, paths, exclude=[], cofuncid=None):
+    def _get_scan_threads(self):
+        threads = self.scan_threads
+        if threads <= 0:
+            try:
+                # loading is mostly waiting for (network) file systems
+                threads = multiprocessing.cpu_count() * 2
+            except NotImplementedError:
+                threads = 2
+        return threads
+
+    def _iter_new_files(self, fullpath, exclude, stop, force=False):
+        """Yields (directory, real path) for all supported files below
+        fullpath which aren't in the library. Directories which didn't
+        change since the last scan are skipped unless `force` is True.
+        Stops once the `stop` event is set."""
+
+        seen = set()
+        walk = self.scan_manifest.walk(fullpath, force, stop)
+        for path, fnames in walk:
+            for filename in fnames:
+                if stop.is_set():
+                    return
+                fullfilename = os.path.join(path, filename)
+                if filter(fullfilename.startswith, exclude):
+                    continue
+                if fullfilename not in self._contents:
+                    fullfilename = os.path.realpath(fullfilename)
+                    # skip unknown file extensions
+                    if not formats.filter(fullfilename):
+                        continue
+                    if filter(fullfilename.startswith, exclude):
+                        continue
+                    if fullfilename not in self._contents and \
+                            fullfilename not in seen:
+                        seen.add(fullfilename)
+                        yield path, fullfilename
+
+    def scan(self, paths, exclude=[], cofuncid=None, force=False):
+        """Add all new files below paths to the library.
+
+        Walking the directories and loading the files happens in
+        `scan_threads` worker threads, the loaded items get added in
+        batches while iterating.
+
+        Directories which didn't change since the last complete scan
+        (see `scan_manifest`) get skipped, unless `force` is True.
+        """
+
         added = []
+        failed = set()
         exclude = [expanduser(path) for path in exclude if path]
 
-        def need_yield(last_yield=[0]):
-            current = time.time()
-            if abs(current - last_yield[0]) > 0.015:
-                last_yield[0] = current
-                return True
-            return False
+        manifest = self.scan_manifest
+        manifest.set_exclude(exclude)
+        manifest.discard()
 
         def need_added(last_added=[0]):
             current = time.time()
@@ -722,43 +1356,83 @@ class FileLibrary(PicklingLibrary):
                 return True
             return False
 
-        for fullpath in paths:
-            print_d("Scanning %r." % fullpath, self)
-            desc = _("Scanning %s") % (unexpand(fsdecode(fullpath)))
-            with Task(_("Library"), desc) as task:
-                if cofuncid:
-                    task.copool(cofuncid)
-                fullpath = expanduser(fullpath)
-                if filter(fullpath.startswith, exclude):
-                    continue
-                for path, dnames, fnames in os.walk(fullpath):
-                    for filename in fnames:
-                        fullfilename = os.path.join(path, filename)
-                        if filter(fullfilename.startswith, exclude):
-                            continue
-                        if fullfilename not in self._contents:
-                            fullfilename = os.path.realpath(fullfilename)
-                            # skip unknown file extensions
-                            if not formats.filter(fullfilename):
+        def load(entry):
+            path, filename = entry
+            return path, self.add_filename(filename, False)
+
+        threads = self._get_scan_threads()
+        done = False
+        try:
+            for fullpath in paths:
+                print_d("Scanning %r using %d threads." % (
+                    fullpath, threads), self)
+                desc = _("Scanning %s") % (unexpand(fsdecode(fullpath)))
+                with Task(_("Library"), desc) as task:
+                    if cofuncid:
+                        task.copool(cofuncid)
+                    fullpath = expanduser(fullpath)
+                    if filter(fullpath.startswith, exclude):
+                        continue
+
+                    stop = threading.Event()
+                    pool = ThreadPool(threads)
+                    try:
+                        # the pool walks the directories in its task thread
+                        files = self._iter_new_files(
+                            fullpath, exclude, stop, force)
+                        results = pool.imap_unordered(load, files)
+                        while True:
+                            try:
+                                path, item = results.next(0.015)
+                            except TimeoutError:
+                                if added and need_added():
+                                    self.add(added)
+                                    added = []
+                                task.pulse()
+                                yield
                                 continue
-                            if filter(fullfilename.startswith, exclude):
+                            except StopIteration:
+                                break
+
+                            if item is None:
+                                # try again next time, the manifest uses
+                                # real paths as keys
+                                failed.add(os.path.realpath(path))
                                 continue
-                            if fullfilename not in self._contents:
-                                item = self.add_filename(fullfilename, False)
-                                if item is not None:
-                                    added.append(item)
-                                    if len(added) > 100 or need_added():
-                                        self.add(added)
-                                        added = []
-                                        task.pulse()
-                                        yield
-                                if added and need_yield():
-                                    yield
-                if added:
-                    self.add(added)
-                    added = []
-                    task.pulse()
-                    yield True
+
+                            added.append(item)
+                            if len(added) > 100 or need_added():
+                                self.add(added)
+                                added = []
+                                task.pulse()
+                                yield
+                    finally:
+                        stop.set()
+                        pool.terminate()
+
+                    if added:
+                        self.add(added)
+                        added = []
+                        task.pulse()
+                        yield True
+            done = True
+        finally:
+            if done:
+                # gets written together with the library, so make sure
+                # the library gets saved even if no item changed
+                manifest.commit(failed)
+                if manifest.dirty:
+                    self.dirty = True
+            else:
+                manifest.discard()
+
+    def _get_stored(self, key):
+        item = self._contents.get(key)
+        if item is None:
+            for items in self._masked.itervalues():
+                if key in items:
+                    return items[key]
+        return item
 
     def get_content(self):
         """Return visible and masked items"""
@@ -817,7 +1491,8 @@ class FileLibrary(PicklingLibrary):
     def remove_masked(self, mount_point):
         """Remove all songs for a masked point"""
 
-        self._masked.pop(mount_point, {})
+        items = self._masked.pop(mount_point, {})
+        self._journal_keys(items.keys())
 
 
 class SongFileLibrary(SongLibrary, FileLibrary):
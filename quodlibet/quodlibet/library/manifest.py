@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+# Copyright 2016 Quod Libet contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as
+# published by the Free Software Foundation
+
+"""Remembers the state of scanned directories between library scans.
+
+A directory's modification time changes whenever an entry gets added,
+removed or renamed in it, so if it's still the same as during the last
+scan there can't be any new files in it and its list of sub directories
+is still valid. Scans can then check such a directory with a single stat
+call instead of listing it and looking at each entry.
+
+Files changed in place (e.g. tags written by another program) don't
+change the directory. Code noticing such changes can `invalidate` the
+directory.
+"""
+
+import os
+import threading
+import time
+import cPickle as pickle
+
+from quodlibet import util
+from quodlibet.util.dprint import print_d, print_w
+from quodlibet.util.path import mkdir
+
+
+VERSION = 1
+
+RACY_SECONDS = 2
+"""Directories changed less than this number of seconds before a scan don't
+get remembered, files added right after listing them might not change the
+modification time on file systems with a coarse timestamp resolution"""
+
+
+def _get_stamp(path):
+    """Returns something which changes when entries of the directory change
+    or the directory gets replaced. Raises OSError."""
+
+    stat = os.stat(path)
+    return (stat.st_mtime, stat.st_ino, stat.st_dev)
+
+
+class ScanManifest(object):
+    """Directory stamps and sub directories of the last scan.
+
+    Directories are stored by their real path (see os.path.realpath), like
+    library item keys, no matter the path they were walked through.
+
+    `walk` can run in a different thread than the rest, results of a walk
+    are only remembered once `commit` gets called.
+
+    Written by the library together with its items (see `get_state` and
+    `write`), so directories never count as scanned on disk while the
+    songs found in them aren't saved.
+    """
+
+    def __init__(self, filename=None):
+        self.filename = filename
+        self._dirs = {}
+        self._exclude = []
+        self._pending = {}
+        self._invalidated = set()
+        self._lock = threading.Lock()
+        self._loaded = False
+        # increased on each change, to know if a write is still current
+        self._version = 0
+        self._saved_version = 0
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        self._loaded = True
+
+        if self.filename is None or not os.path.exists(self.filename):
+            return
+
+        try:
+            with open(self.filename, "rb") as fileobj:
+                data = pickle.load(fileobj)
+            if data["version"] != VERSION:
+                raise ValueError("unknown version")
+            self._dirs = data["dirs"]
+            self._exclude = data["exclude"]
+        except Exception:
+            print_w("Couldn't load scan manifest %r" % self.filename)
+            util.print_exc()
+            self._dirs = {}
+            self._exclude = []
+
+    @property
+    def dirty(self):
+        """If there are changes which aren't written yet"""
+
+        return self._version != self._saved_version
+
+    def get_state(self):
+        """Returns a copy of the current state for `write`, or None if
+        there is nothing to write"""
+
+        if self.filename is None or not self.dirty:
+            return
+
+        self._ensure_loaded()
+        with self._lock:
+            data = {
+                "version": VERSION,
+                "dirs": dict(self._dirs),
+                "exclude": list(self._exclude),
+            }
+            return self._version, data
+
+    def write(self, state):
+        """Write a state returned by `get_state` to disk, doesn't raise.
+
+        Can be called from another thread.
+        """
+
+        if state is None:
+            return
+        version, data = state
+
+        print_d("Saving %d directories to %r." % (
+            len(data["dirs"]), self.filename))
+
+        try:
+            mkdir(os.path.dirname(self.filename))
+            with util.atomic_save(self.filename, ".tmp", "wb") as fileobj:
+                pickle.dump(data, fileobj, 2)
+        except EnvironmentError:
+            print_w("Couldn't save scan manifest %r" % self.filename)
+        else:
+            with self._lock:
+                self._saved_version = max(self._saved_version, version)
+
+    def save(self):
+        """Write the manifest to disk if it changed, doesn't raise"""
+
+        self.write(self.get_state())
+
+    def __len__(self):
+        self._ensure_loaded()
+        return len(self._dirs)
+
+    def clear(self):
+        self._ensure_loaded()
+        with self._lock:
+            self._dirs.clear()
+            self._pending.clear()
+            self._version += 1
+
+    def set_exclude(self, exclude):
+        """Forget everything if the excluded paths changed"""
+
+        self._ensure_loaded()
+        exclude = sorted(exclude)
+        if exclude != self._exclude:
+            self.clear()
+            self._exclude = exclude
+
+    def invalidate(self, path):
+        """Make the next scan look at the entries of the directory, given
+        by its real path"""
+
+        self._ensure_loaded()
+        with self._lock:
+            if self._dirs.pop(path, None) is not None:
+                self._version += 1
+            self._pending.pop(path, None)
+            self._invalidated.add(path)
+
+    def is_current(self, path):
+        """True if the directory, given by its real path, didn't change
+        since it was last scanned"""
+
+        self._ensure_loaded()
+        entry = self._dirs.get(path)
+        if entry is None:
+            return False
+        try:
+            return _get_stamp(path) == entry[0]
+        except OSError:
+            return False
+
+    def walk(self, top, force=False, stop=None):
+        """Yields (path, filenames) for all directories below and including
+        `top` which changed since they were last scanned, or all if
+        `force` is True. Stops once the `stop` event is set.
+
+        Like os.walk(), symlinks to directories aren't followed.
+        """
+
+        self._ensure_loaded()
+        dirs = self._dirs
+        now = time.time()
+        # sub directories aren't links, so only the top one needs resolving
+        stack = [(top, os.path.realpath(top))]
+        while stack:
+            if stop is not None and stop.is_set():
+                return
+
+            path, real = stack.pop()
+            try:
+                stamp = _get_stamp(path)
+            except OSError:
+                continue
+
+            entry = dirs.get(real)
+            if not force and entry is not None and entry[0] == stamp:
+                stack.extend((os.path.join(path, d), os.path.join(real, d))
+                             for d in entry[1])
+                continue
+
+            try:
+                names = os.listdir(path)
+            except OSError:
+                continue
+
+            subdirs = []
+            filenames = []
+            for name in names:
+                fullpath = os.path.join(path, name)
+                if os.path.isdir(fullpath):
+                    if not os.path.islink(fullpath):
+                        subdirs.append(name)
+                else:
+                    filenames.append(name)
+
+            if now - stamp[0] > RACY_SECONDS:
+                with self._lock:
+                    self._pending[real] = (stamp, tuple(subdirs))
+
+            yield path, filenames
+            stack.extend((os.path.join(path, d), os.path.join(real, d))
+                         for d in reversed(subdirs))
+
+    def commit(self, failed=()):
+        """Remember the directories seen by walks since the last commit,
+        except the ones in `failed` or invalidated in the meantime"""
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            invalidated, self._invalidated = self._invalidated, set()
+            for path in invalidated:
+                pending.pop(path, None)
+            for path in failed:
+                pending.pop(path, None)
+            self._dirs.update(pending)
+            self._version += 1
+
+    def discard(self):
+        """Forget the results of unfinished walks"""
+
+        with self._lock:
+            self._pending.clear()
+            self._invalidated.clear()
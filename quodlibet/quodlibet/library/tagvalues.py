@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+# Copyright 2016 Quod Libet contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as
+# published by the Free Software Foundation
+
+"""Reference counted tag names and tag values of the songs in a library.
+
+Like the query TagIndex, the names or the values of a tag get counted
+the first time someone asks for them and are kept up to date through the
+library signals from then on, so asking again doesn't have to look at
+every song.
+"""
+
+import gc
+
+from quodlibet.formats._audio import VOLATILE_TAGS
+
+
+class _ValueCounts(object):
+    """Counts the items for each value returned by get_values(item).
+
+    The values of each item get remembered, since they might have changed
+    already once we get told about a change.
+    """
+
+    def __init__(self, get_values):
+        self._get_values = get_values
+        self.counts = {}
+        self._items = {}
+
+    def add(self, items):
+        counts = self.counts
+        item_values = self._items
+        get_values = self._get_values
+        for item in items:
+            # item hashing is implemented in Python, so use ids
+            ident = id(item)
+            if ident in item_values:
+                self.remove([item])
+            values = get_values(item)
+            if not values:
+                continue
+            if len(values) > 1:
+                values = set(values)
+            values = item_values[ident] = tuple(values)
+            for value in values:
+                counts[value] = counts.get(value, 0) + 1
+
+    def remove(self, items):
+        counts = self.counts
+        item_values = self._items
+        for item in items:
+            for value in item_values.pop(id(item), ()):
+                count = counts[value] - 1
+                if count:
+                    counts[value] = count
+                else:
+                    del counts[value]
+
+
+class TagValueIndex(object):
+    """Counts which tags the songs of a library have and which values
+    they have for a tag.
+    """
+
+    def __init__(self, library):
+        self._library = library
+        self._names = None
+        self._values = {}
+        self._sigs = [
+            library.connect('added', self.__added),
+            library.connect('removed', self.__removed),
+            library.connect('changed', self.__changed),
+        ]
+
+    def destroy(self):
+        for sig in self._sigs:
+            self._library.disconnect(sig)
+        self._sigs = []
+        self.clear()
+
+    def clear(self):
+        """Forget everything, it will get counted again on demand"""
+
+        self._names = None
+        self._values.clear()
+
+    def __counters(self):
+        if self._names is not None:
+            yield self._names
+        for counts in self._values.itervalues():
+            yield counts
+
+    def __added(self, library, items):
+        for counts in self.__counters():
+            counts.add(items)
+
+    def __removed(self, library, items):
+        for counts in self.__counters():
+            counts.remove(items)
+
+    def __changed(self, library, items):
+        present = [i for i in items if i in library]
+        for counts in self.__counters():
+            counts.remove(items)
+            counts.add(present)
+
+    def _count(self, get_values):
+        counts = _ValueCounts(get_values)
+        # lots of new containers, don't let the gc scan them all
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            counts.add(self._library.itervalues())
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+        return counts
+
+    def names(self):
+        """Returns a list of all tag names (dict keys) used by the songs"""
+
+        if self._names is None:
+            self._names = self._count(lambda song: song.keys())
+        return self._names.counts.keys()
+
+    def values(self, tag):
+        """Returns a list of all values for the given tag"""
+
+        if tag in VOLATILE_TAGS:
+            values = set()
+            for song in self._library.itervalues():
+                values.update(song.list(tag))
+            return list(values)
+
+        try:
+            counts = self._values[tag]
+        except KeyError:
+            counts = self._values[tag] = self._count(
+                lambda song: song.list(tag))
+        return counts.counts.keys()
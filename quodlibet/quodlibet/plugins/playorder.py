@@ -51,7 +51,10 @@ class PlayOrderPlugin(quodlibet.qltk.playorder.Order):
 
     Finally, there is
         def reset(self, playlist): ...
-    which is called when the playlist changes and state should be reset.
+    which is called when the playlist changes and state should be reset,
+    and
+        def row_changed(self, playlist, iter): ...
+    which is called when the song at iter changed (e.g. its rating).
 
     """
 
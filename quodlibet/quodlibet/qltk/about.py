@@ -51,6 +51,7 @@ class AboutDialog(Gtk.AboutDialog):
         def chunks(l, n):
             return [l[i:i + n] for i in range(0, len(l), n)]
 
+        formats.init()
         fmts = ",\n".join(", ".join(c) for c in chunks(formats.names, 4))
         text = []
         text.append(_("Supported formats: %s") % fmts)
@@ -109,33 +109,25 @@ class LibraryTagCompletion(EntryWordCompletion):
         all_tags = klass.__tags
         model.clear()
 
-        tags = set()
-        songs = list(library)
-        for count, song in enumerate(songs):
-            for tag in song.keys():
-                if not (tag.startswith("~#") or tag in MACHINE_TAGS):
-                    tags.add(tag)
-
-            if count % 500 == 0 or count + 1 == len(songs):
-                tags -= all_tags
-                for tag in tags:
-                    model.append([tag])
-                all_tags.update(tags)
-                tags.clear()
-                yield True
+        tags = set(tag for tag in library.tag_names()
+                   if not (tag.startswith("~#") or tag in MACHINE_TAGS))
+        yield True
 
         tags.update(["~dirname", "~basename", "~people", "~format"])
         for tag in ["track", "disc", "playcount", "skipcount", "lastplayed",
                     "mtime", "added", "rating", "length"]:
             tags.add("#(" + tag)
         for tag in ["date", "bpm"]:
-            if tag in all_tags:
+            if tag in tags:
                 tags.add("#(" + tag)
 
-        tags -= all_tags
-        for tag in tags:
-            model.append([tag])
-        all_tags.update(tags)
+        for count, tag in enumerate(tags):
+            # song updates can add tags in between
+            if tag not in all_tags:
+                all_tags.add(tag)
+                model.append([tag])
+            if count % 500 == 0:
+                yield True
 
         print_d("Done updating tag model for whole library")
 
@@ -12,6 +12,7 @@ from gi.repository import Gtk, GObject
 from quodlibet import config
 from quodlibet import qltk
 from quodlibet.qltk.x import SymbolicIconImage, RadioMenuItem
+from quodlibet.util.collections import FenwickTree, IndexPool
 from quodlibet.plugins import PluginManager, PluginHandler
 
 
@@ -68,6 +69,10 @@ class Order(object):
     def reset(self, playlist):
         pass
 
+    # Called when the song at iter changed, e.g. its rating.
+    def row_changed(self, playlist, iter):
+        pass
+
 
 class OrderInOrder(Order):
     name = "inorder"
@@ -136,21 +141,68 @@ class OrderShuffle(OrderRemembered):
     is_shuffle = True
     priority = 1
 
+    def __init__(self, playlist):
+        super(OrderShuffle, self).__init__(playlist)
+        # index -> how often it is in _played
+        self._played_count = {}
+        # indices not played yet, built when needed
+        self._remaining = None
+
+    def __get_remaining(self, playlist):
+        remaining = self._remaining
+        if remaining is None or self._size != len(playlist):
+            self._size = len(playlist)
+            played = self._played_count
+            remaining = self._remaining = IndexPool(
+                i for i in xrange(self._size) if i not in played)
+        return remaining
+
+    def __played(self):
+        index = self._played[-1]
+        self._played_count[index] = self._played_count.get(index, 0) + 1
+        if self._remaining is not None:
+            self._remaining.discard(index)
+
+    def __unplayed(self, index):
+        count = self._played_count[index] - 1
+        if count:
+            self._played_count[index] = count
+        else:
+            del self._played_count[index]
+            if self._remaining is not None and index < self._size:
+                self._remaining.add(index)
+
     def next(self, playlist, iter):
         super(OrderShuffle, self).next(playlist, iter)
-        played = set(self._played)
-        songs = set(range(len(playlist)))
-        remaining = songs.difference(played)
+        if iter is not None:
+            self.__played()
+        remaining = self.__get_remaining(playlist)
 
         if remaining:
-            return playlist.get_iter((random.choice(list(remaining)),))
+            return playlist.get_iter((remaining.choice(),))
         elif playlist.repeat and not playlist.is_empty():
-            del(self._played[:])
-            return playlist.get_iter((random.choice(list(songs)),))
+            self.reset(playlist)
+            return playlist.get_iter((random.randrange(len(playlist)),))
         else:
-            del(self._played[:])
+            self.reset(playlist)
             return None
 
+    def previous(self, playlist, iter):
+        if self._played:
+            self.__unplayed(self._played[-1])
+        return super(OrderShuffle, self).previous(playlist, iter)
+
+    def set(self, playlist, iter):
+        iter = super(OrderShuffle, self).set(playlist, iter)
+        if iter is not None:
+            self.__played()
+        return iter
+
+    def reset(self, playlist):
+        super(OrderShuffle, self).reset(playlist)
+        self._played_count.clear()
+        self._remaining = None
+
 
 class OrderWeighted(OrderRemembered):
     name = "weighted"
@@ -159,18 +211,37 @@ class OrderWeighted(OrderRemembered):
     is_shuffle = True
     priority = 2
 
+    def __init__(self, playlist):
+        super(OrderWeighted, self).__init__(playlist)
+        # the ratings of all songs, built when needed
+        self._weights = None
+
+    def __get_weights(self, playlist):
+        weights = self._weights
+        if weights is None or len(weights) != len(playlist):
+            weights = self._weights = FenwickTree(
+                song("~#rating") for song in playlist.itervalues())
+        return weights
+
     def next(self, playlist, iter):
         super(OrderWeighted, self).next(playlist, iter)
-        songs = playlist.get()
-        max_score = sum([song('~#rating') for song in songs])
-        choice = random.random() * max_score
-        current = 0.0
-        for i, song in enumerate(songs):
-            current += song("~#rating")
-            if current >= choice:
-                return playlist.get_iter((i,))
-        else:
+        weights = self.__get_weights(playlist)
+        choice = random.random() * weights.total()
+        index = weights.find(choice)
+        if index is None:
             return playlist.get_iter_first()
+        return playlist.get_iter((index,))
+
+    def reset(self, playlist):
+        super(OrderWeighted, self).reset(playlist)
+        self._weights = None
+
+    def row_changed(self, playlist, iter):
+        weights = self._weights
+        if weights is not None:
+            index = playlist.get_path(iter).get_indices()[0]
+            if index < len(weights):
+                weights[index] = playlist.get_value(iter)("~#rating")
 
 
 class OrderOneSong(OrderInOrder):
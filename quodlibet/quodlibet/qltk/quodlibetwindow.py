@@ -929,6 +929,7 @@ class QuodLibetWindow(Window, PersistentWindowMixin):
         self.browser = Browser(library)
         self.browser.connect('songs-selected',
             self.__browser_cb, library, player)
+        self.browser.connect('songs-added', self.__browser_added_cb)
         self.browser.connect('songs-activated', self.__browser_activate)
         if restore:
             self.browser.restore()
@@ -1217,6 +1218,13 @@ class QuodLibetWindow(Window, PersistentWindowMixin):
                 self.__restore_cb()
                 self.__restore_cb = None
 
+    def __browser_added_cb(self, browser, songs):
+        if browser.background:
+            bg = background_filter()
+            if bg:
+                songs = filter(bg, songs)
+        self.songlist.add_songs(songs)
+
     def __hide_headers(self, activator=None):
         for column in self.songlist.get_columns():
             if self.browser.headers is None:
@@ -214,8 +214,14 @@ class LimitSearchBarBox(SearchBarBox):
     def __limit_changed(self, *args):
         self.changed()
 
+    @property
+    def limited(self):
+        """Whether limit() might drop songs"""
+
+        return self.__limit.get_visible()
+
     def limit(self, songs):
-        if self.__limit.get_visible():
+        if self.limited:
             return limit_songs(songs, self.__limit.value,
                                self.__limit.weighted)
         else:
@@ -169,6 +169,10 @@ def get_sort_tag(tag):
     return tag
 
 
+def _get_sort_key(song):
+    return song.sort_key
+
+
 def header_tag_split(header):
     """Split a pattern or a tied tag into separate tags"""
 
@@ -720,33 +724,51 @@ class SongList(AllTreeView, SongListDnDMixin, DragScroll,
             return []
         return model.get()
 
-    def _sort_songs(self, songs):
-        """Sort passed songs in place based on the column sort orders"""
+    def _get_sort_passes(self):
+        """Returns a list of (reverse, [sort_func]) tuples, one for each
+        stable sort pass needed to sort by the column sort orders.
+
+        Each column is a pass, least significant first. Consecutive
+        passes in the same direction get combined into one sort by a list
+        of keys, most significant first.
+        """
 
-        last_tag = None
-        last_order = None
-        first = True
+        passes = []
+        last = None
         for tag, reverse in self.get_sort_orders():
             tag = get_sort_tag(tag)
 
             # always sort using the default sort key first
-            if first:
-                first = False
-                songs.sort(key=lambda s: s.sort_key, reverse=reverse)
-                last_order = reverse
-                last_tag = ""
+            if last is None:
+                last = ("", reverse)
+                passes.append((reverse, [_get_sort_key]))
 
             # no need to sort twice in a row with the same key/order
-            if tag == last_tag and last_order == reverse:
+            if (tag, reverse) == last:
                 continue
-            last_order = reverse
-            last_tag = tag
+            last = (tag, reverse)
 
             if tag == "":
-                songs.sort(key=lambda s: s.sort_key, reverse=reverse)
+                sort_func = _get_sort_key
             else:
                 sort_func = AudioFile.sort_by_func(tag)
-                songs.sort(key=sort_func, reverse=reverse)
+
+            if passes[-1][0] == reverse:
+                passes[-1][1].insert(0, sort_func)
+            else:
+                passes.append((reverse, [sort_func]))
+
+        return passes
+
+    def _sort_songs(self, songs):
+        """Sort passed songs in place based on the column sort orders"""
+
+        for reverse, funcs in self._get_sort_passes():
+            if len(funcs) == 1:
+                songs.sort(key=funcs[0], reverse=reverse)
+            else:
+                songs.sort(key=lambda s: [f(s) for f in funcs],
+                           reverse=reverse)
 
     def add_songs(self, songs):
         """Add songs to the list in the right order and position"""
@@ -763,14 +785,46 @@ class SongList(AllTreeView, SongListDnDMixin, DragScroll,
             model.append_many(songs)
             return
 
-        # FIXME: Replace with something fast
-        old_songs = self.get_songs()
-        old_songs.extend(songs)
+        passes = list(reversed(self._get_sort_passes()))
 
-        self._sort_songs(old_songs)
+        def compare(a, b):
+            # like comparing the result positions of the sort passes
+            for reverse, funcs in passes:
+                for func in funcs:
+                    result = cmp(func(a), func(b))
+                    if result:
+                        return -result if reverse else result
+            return 0
 
-        for index, song in sorted(zip(map(old_songs.index, songs), songs)):
-            model.insert(index, row=[song])
+        songs = list(songs)
+        self._sort_songs(songs)
+        old_songs = self.get_songs()
+
+        # Binary search the position of each new song in the sorted list,
+        # after all equal ones like a stable sort of old + new would.
+        # The new songs are sorted as well, so each search can start at
+        # the position of the previous one.
+        positions = []
+        lo = 0
+        for song in songs:
+            hi = len(old_songs)
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if compare(song, old_songs[mid]) < 0:
+                    hi = mid
+                else:
+                    lo = mid + 1
+            positions.append(lo)
+
+        # insert runs of songs ending up next to each other at once,
+        # shifted by the number of songs inserted before
+        offset = 0
+        start = 0
+        for end in xrange(1, len(songs) + 1):
+            if end == len(songs) or positions[end] != positions[start]:
+                model.insert_many(positions[start] + offset, songs[start:end])
+                offset += end - start
+                start = end
 
     def set_songs(self, songs, sorted=False, scroll=True, scroll_select=False):
         """Fill the song list.
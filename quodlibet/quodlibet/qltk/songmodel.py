@@ -239,6 +239,10 @@ class PlaylistModel(TrackCurrentModel):
         for sig in ['row-deleted', 'row-inserted', 'rows-reordered']:
             s = self.connect(sig, lambda pl, *x: self.order.reset(pl))
             self.__sigs.append(s)
+        s = self.connect('row-changed',
+                         lambda pl, path, iter_: self.order.row_changed(
+                             pl, iter_))
+        self.__sigs.append(s)
 
     def next(self):
         """Switch to the next song"""
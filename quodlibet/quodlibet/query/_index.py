@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+# Copyright 2016 Quod Libet contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as
+# published by the Free Software Foundation
+
+"""An inverted index over tag values which query match nodes can use to
+narrow down the set of songs they have to check.
+
+Tag values get lower cased, decomposed (NFKD) and stripped of combining
+marks and are then split at whitespace into tokens. Regular expressions
+are reduced to the literal parts every match has to contain, normalized
+the same way; a song can only match if each part can be found in one of
+its tokens. The result is always a superset of the real matches, the
+normal search still has to run on it.
+"""
+
+import gc
+from bisect import bisect_right
+
+from quodlibet.util.path import fsdecode
+from . import _match as match
+from ._match import intersect_sets, union_sets
+from ._literals import normalize, required_literals
+
+
+def get_tag_value(item, name):
+    """The value Tag.search looks at for a non-internal tag name"""
+
+    value = item.get(name)
+    if value is None:
+        if name == "filename":
+            value = fsdecode(item.get("~filename", ""))
+        else:
+            value = item.get("~" + name, "")
+    return value
+
+
+class _TagTokens(object):
+    """Tokens of one tag, items are referenced by their id()"""
+
+    def __init__(self, name):
+        self.name = name
+        self.postings = {}
+        self.tokens = {}
+        self._vocabulary = None
+
+    def add(self, items):
+        postings = self.postings
+        tokens = self.tokens
+        name = self.name
+        for item in items:
+            ident = id(item)
+            value = item.get(name)
+            if value is None:
+                value = get_tag_value(item, name)
+            # item hashing is implemented in Python, so use ids
+            item_tokens = tokens[ident] = normalize(value).split()
+            for token in item_tokens:
+                try:
+                    postings[token].add(ident)
+                except KeyError:
+                    postings[token] = set([ident])
+        self._vocabulary = None
+
+    def remove(self, items):
+        postings = self.postings
+        tokens = self.tokens
+        for item in items:
+            ident = id(item)
+            for token in tokens.pop(ident, ()):
+                idents = postings.get(token)
+                if idents is None:
+                    continue
+                idents.discard(ident)
+                if not idents:
+                    del postings[token]
+        self._vocabulary = None
+
+    def _get_vocabulary(self):
+        if self._vocabulary is None:
+            words = self.postings.keys()
+            offsets = []
+            offset = 0
+            for word in words:
+                offsets.append(offset)
+                offset += len(word) + 1
+            offsets.append(offset)
+            self._vocabulary = (u"\n".join(words), offsets, words)
+        return self._vocabulary
+
+    def lookup(self, part, limit):
+        """Returns a set of item ids which have a token containing part,
+        or None if there are more than limit.
+        """
+
+        postings = self.postings
+        idents = set(postings.get(part, ()))
+
+        text, offsets, words = self._get_vocabulary()
+        find = text.find
+        pos = find(part)
+        while pos != -1:
+            index = bisect_right(offsets, pos) - 1
+            word = words[index]
+            if word != part:
+                idents.update(postings[word])
+                if len(idents) > limit:
+                    return
+            pos = find(part, offsets[index + 1])
+
+        return idents
+
+
+class TagIndex(object):
+    """Maps normalized tokens of tag values to the songs of a library
+    containing them.
+
+    A tag gets indexed the first time a query needs it and is kept up
+    to date through the library signals from then on. Lookups return
+    sets of song ids, use get_items() to get the songs.
+    """
+
+    MAX_RATIO = 0.5
+    """If a lookup results in more songs than this fraction of the
+    library it's cheaper to check all songs"""
+
+    CACHE_SIZE = 200
+
+    def __init__(self, library):
+        self._library = library
+        self._tags = {}
+        self._items = {}
+        self._cache = {}
+        self._sigs = [
+            library.connect('added', self.__added),
+            library.connect('removed', self.__removed),
+            library.connect('changed', self.__changed),
+        ]
+
+    def destroy(self):
+        for sig in self._sigs:
+            self._library.disconnect(sig)
+        self._sigs = []
+        self.clear()
+
+    def clear(self):
+        """Forget everything, tags will get indexed again on demand"""
+
+        self._tags.clear()
+        self._items.clear()
+        self._cache.clear()
+
+    def __added(self, library, items):
+        if self._tags:
+            self._cache.clear()
+            self._items.update((id(i), i) for i in items)
+            for tag in self._tags.itervalues():
+                tag.add(items)
+
+    def __removed(self, library, items):
+        if self._tags:
+            self._cache.clear()
+            for item in items:
+                self._items.pop(id(item), None)
+            for tag in self._tags.itervalues():
+                tag.remove(items)
+
+    def __changed(self, library, items):
+        if self._tags:
+            self._cache.clear()
+            present = []
+            for item in items:
+                if item in library:
+                    self._items[id(item)] = item
+                    present.append(item)
+                else:
+                    self._items.pop(id(item), None)
+            for tag in self._tags.itervalues():
+                tag.remove(items)
+                tag.add(present)
+
+    def _get_tag(self, name):
+        try:
+            return self._tags[name]
+        except KeyError:
+            if not self._tags:
+                self._items = dict(
+                    (id(i), i) for i in self._library.itervalues())
+            tag = self._tags[name] = _TagTokens(name)
+            # lots of new containers, don't let the gc scan them all
+            gc_was_enabled = gc.isenabled()
+            gc.disable()
+            try:
+                tag.add(self._items.itervalues())
+            finally:
+                if gc_was_enabled:
+                    gc.enable()
+            return tag
+
+    def get_items(self, idents):
+        """Returns a list of songs for the given ids"""
+
+        items = self._items
+        return [items[i] for i in idents]
+
+    def lookup(self, name, literal):
+        """Returns a set of song ids which have the normalized literal in
+        the value of tag 'name' or None if it's not worth it.
+        The returned set must not be modified.
+        """
+
+        cache_key = (name, literal)
+        try:
+            return self._cache[cache_key]
+        except KeyError:
+            pass
+
+        parts = literal.split()
+        if not parts:
+            return
+
+        tag = self._get_tag(name)
+        limit = len(self._library) * self.MAX_RATIO
+        result = None
+        # longer parts tend to be more selective
+        for part in sorted(parts, key=len, reverse=True):
+            songs = tag.lookup(part, limit)
+            if songs is None:
+                continue
+            if result is None:
+                result = songs
+            else:
+                result &= songs
+
+        if len(self._cache) > self.CACHE_SIZE:
+            self._cache.clear()
+        self._cache[cache_key] = result
+        return result
+
+    def search(self, name, res):
+        """Returns a set of song ids which might match the regex or match
+        node of regexes 'res' in the tag 'name'. None if all could.
+        The returned set must not be modified.
+        """
+
+        if isinstance(res, match.Inter):
+            sets = [self.search(name, r) for r in res.res]
+            return intersect_sets(sets)
+        elif isinstance(res, match.Union):
+            sets = [self.search(name, r) for r in res.res]
+            return union_sets(sets)
+        elif hasattr(res, "pattern") and hasattr(res, "flags"):
+            sets = [self.lookup(name, l) for l in required_literals(res)]
+            return intersect_sets(sets)
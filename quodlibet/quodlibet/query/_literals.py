@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+# Copyright 2016 Quod Libet contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as
+# published by the Free Software Foundation
+
+"""Helpers for finding out which literal text a regular expression
+has to find. Used for query optimizations.
+"""
+
+import re
+import sre_parse
+import sre_constants
+import unicodedata
+
+
+# characters re.IGNORECASE | re.UNICODE treats as equal to others,
+# which lower() and NFKD don't map to the same thing
+_FOLD = {
+    u"\u0131": u"i",  # dotless i
+    u"\u0345": u"\u03b9",  # combining ypogegrammeni, iota
+    u"\u03c2": u"\u03c3",  # final sigma
+}
+
+
+def _normalize_char(char):
+    char = _FOLD.get(char, char)
+    decomposed = unicodedata.normalize("NFKD", char)
+    return u"".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+_NORM_CACHE = {}
+
+
+def normalize(text):
+    """Returns a lower case version of text without diacritic marks.
+
+    Characters which re.IGNORECASE | re.UNICODE considers equal become
+    the same (like final and capital sigma), as do characters which only
+    differ in their diacritic marks (which is what the 'd' query flag
+    matches).
+    """
+
+    if not isinstance(text, unicode):
+        # byte strings get matched by code point
+        text = text.decode("latin-1")
+
+    text = text.lower()
+    try:
+        text.encode("ascii")
+    except UnicodeError:
+        pass
+    else:
+        return text
+
+    cache = _NORM_CACHE
+    parts = []
+    for char in text:
+        if char < u"\x80":
+            parts.append(char)
+            continue
+        try:
+            parts.append(cache[char])
+        except KeyError:
+            parts.append(cache.setdefault(char, _normalize_char(char)))
+    return u"".join(parts)
+
+
+def _char_of(op, av):
+    """Returns the normalized text a pattern element consumes or None
+    if it isn't fixed.
+    """
+
+    if op == sre_constants.LITERAL:
+        return normalize(unichr(av))
+    elif op == sre_constants.IN:
+        # the diacritic variant sets we create for the 'd' flag, or
+        # things like [Aa], where all entries are the same after
+        # normalization
+        chars = set()
+        for sub_op, sub_av in av:
+            if sub_op != sre_constants.LITERAL:
+                return
+            chars.add(normalize(unichr(sub_av)))
+        if len(chars) == 1:
+            return chars.pop()
+
+
+def _literal_runs(pattern, runs, current):
+    for op, av in pattern:
+        if op == sre_constants.AT:
+            # zero width, doesn't break the run
+            continue
+        elif op == sre_constants.SUBPATTERN:
+            _literal_runs(av[1], runs, current)
+            continue
+
+        char = _char_of(op, av)
+        if char is not None:
+            current.append(char)
+        else:
+            if current:
+                runs.append(u"".join(current))
+                del current[:]
+
+
+_LITERAL_CACHE = {}
+
+
+def required_literals(regex):
+    """Returns a list of normalized strings which are part of every
+    string the regex can find, or an empty list if nothing is known.
+    """
+
+    cache_key = (regex.pattern, regex.flags)
+    try:
+        return _LITERAL_CACHE[cache_key]
+    except KeyError:
+        pass
+
+    literals = []
+    if not regex.flags & re.LOCALE:
+        try:
+            parsed = sre_parse.parse(regex.pattern, regex.flags)
+        except (sre_constants.error, RuntimeError, OverflowError):
+            pass
+        else:
+            current = []
+            _literal_runs(parsed, literals, current)
+            if current:
+                literals.append(u"".join(current))
+
+    if len(_LITERAL_CACHE) > 500:
+        _LITERAL_CACHE.clear()
+    _LITERAL_CACHE[cache_key] = literals
+    return literals
+
+
+def literal_string(regex):
+    """If the regex searches for fixed text returns a
+    (text, whole_line, ignore_case) tuple, otherwise None.
+
+    If whole_line is True the text has to be equal to one line of the
+    searched value. If ignore_case is True the text is ASCII and lower
+    case and has to be compared with the lower case value, in case the
+    value is ASCII as well.
+    """
+
+    flags = regex.flags
+    if flags & re.LOCALE:
+        return
+
+    try:
+        parsed = list(sre_parse.parse(regex.pattern, flags))
+    except (sre_constants.error, RuntimeError, OverflowError):
+        return
+
+    whole_line = False
+    start = (sre_constants.AT, sre_constants.AT_BEGINNING)
+    end = (sre_constants.AT, sre_constants.AT_END)
+    if len(parsed) > 2 and parsed[0] == start and parsed[-1] == end:
+        if not flags & re.MULTILINE:
+            return
+        parsed = parsed[1:-1]
+        whole_line = True
+
+    chars = []
+    for op, av in parsed:
+        if op != sre_constants.LITERAL:
+            return
+        chars.append(unichr(av))
+    text = u"".join(chars)
+
+    if not text or u"\n" in text:
+        return
+
+    ignore_case = bool(flags & re.IGNORECASE)
+    if ignore_case:
+        # with re.UNICODE more than lower() folds, e.g. final sigma
+        try:
+            text.encode("ascii")
+        except UnicodeError:
+            return
+        text = text.lower()
+
+    return text, whole_line, ignore_case
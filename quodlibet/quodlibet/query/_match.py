@@ -11,6 +11,7 @@ import operator
 
 from quodlibet.util.path import fsdecode
 from quodlibet.util import date_key, validate_query_date, parse_date
+from ._literals import required_literals, literal_string
 
 
 class error(ValueError):
@@ -25,6 +26,46 @@ TIME_KEYS = ["added", "mtime", "lastplayed", "laststarted"]
 SIZE_KEYS = ["filesize"]
 FS_KEYS = ["~filename", "~basename", "~dirname"]
 
+# Rough relative costs of a single search, used by Node.optimize() to
+# decide in which order the children of Inter and Union get evaluated.
+COST_NUMERIC = 1.0
+COST_NUMERIC_SYNTH = 3.0
+COST_TAG = 2.0
+COST_FS = 3.0
+COST_INTERN = 6.0
+COST_EXPENSIVE = 100.0
+
+# numeric values which aren't stored but get computed from other tags
+SYNTH_NUMERIC_KEYS = ["track", "disc", "tracks", "discs", "date", "year",
+                      "originalyear"]
+# ~playlists scans all playlists, ~lyrics reads a file
+EXPENSIVE_KEYS = ["~playlists", "~lyrics"]
+
+
+def intersect_sets(sets):
+    """Returns the intersection of all sets, ignoring None entries.
+    None if all are None.
+    """
+
+    sets = [s for s in sets if s is not None]
+    if not sets:
+        return
+    sets.sort(key=len)
+    result = sets[0]
+    for other in sets[1:]:
+        result = result & other
+    return result
+
+
+def union_sets(sets):
+    """Returns the union of all sets or None if one of them is None"""
+
+    if not sets or any(s is None for s in sets):
+        return
+    if len(sets) == 1:
+        return sets[0]
+    return set().union(*sets)
+
 
 class Node(object):
 
@@ -32,7 +73,67 @@ class Node(object):
         raise NotImplementedError
 
     def filter(self, sequence):
-        return filter(self.search, sequence)
+        return filter(self.search, self.prefilter(sequence))
+
+    def prefilter(self, sequence):
+        """Returns the items of sequence which could match, or sequence
+        itself if it can't tell.
+        """
+
+        # libraries providing a tag index (see SongLibrary) let us skip
+        # songs which can't match
+        index = getattr(sequence, "tag_index", None)
+        if index is not None:
+            candidates = self.candidates(index)
+            if candidates is not None:
+                return index.get_items(candidates)
+        return sequence
+
+    def candidates(self, index):
+        """Returns a set of item ids from the TagIndex which contains all
+        matching ones, or None if all items could match.
+        The returned set must not be modified.
+        """
+
+        return None
+
+    def optimize(self):
+        """Returns an equivalent node which is cheaper to evaluate"""
+
+        return self
+
+    def _cost(self):
+        """The estimated relative cost of a search() call"""
+
+        return COST_TAG
+
+    def _probability(self):
+        """The estimated probability of search() returning True"""
+
+        return 0.5
+
+    def _describe(self):
+        return type(self).__name__
+
+    def _children(self):
+        return []
+
+    def _compile(self, compiler):
+        """Returns a list of code lines which set 'r' to the result of
+        searching song 's'. See QueryCompiler.
+        """
+
+        return ["r = %s(s)" % compiler.const(self.search)]
+
+    def _explain(self, depth=0):
+        """Returns a list of lines describing the node and its children"""
+
+        lines = ["%s%s [cost=%.2f, p=%.2f]" % (
+            "  " * depth, self._describe(), self._cost(),
+            self._probability())]
+        for child in self._children():
+            lines.extend(child._explain(depth + 1))
+        return lines
 
     def _unpack(self):
         return self
@@ -56,6 +157,15 @@ class True_(Node):
     def filter(self, list_):
         return list(list_)
 
+    def _cost(self):
+        return 0.0
+
+    def _probability(self):
+        return 1.0
+
+    def _compile(self, compiler):
+        return ["r = True"]
+
     def __repr__(self):
         return "<True>"
 
@@ -79,6 +189,43 @@ class Union(Node):
                 return True
         return False
 
+    def candidates(self, index):
+        return union_sets([r.candidates(index) for r in self.res])
+
+    def optimize(self):
+        res = []
+        for node in self.res:
+            node = node.optimize()
+            if isinstance(node, Union):
+                res.extend(node.res)
+            else:
+                res.append(node)
+        # cheap ones which are likely to match first
+        res.sort(key=lambda n: n._cost() / max(n._probability(), 0.001))
+        return Union(res)
+
+    def _cost(self):
+        cost = 0.0
+        reached = 1.0
+        for node in self.res:
+            cost += reached * node._cost()
+            reached *= 1.0 - node._probability()
+        return cost
+
+    def _probability(self):
+        missed = 1.0
+        for node in self.res:
+            missed *= 1.0 - node._probability()
+        return 1.0 - missed
+
+    def _children(self):
+        return self.res
+
+    def _compile(self, compiler):
+        return compiler.chain(
+            [r._compile(compiler) for r in self.res], "if not r:",
+            "r = False")
+
     def __repr__(self):
         return "<Union %r>" % self.res
 
@@ -113,6 +260,43 @@ class Inter(Node):
                 return False
         return True
 
+    def candidates(self, index):
+        return intersect_sets([r.candidates(index) for r in self.res])
+
+    def optimize(self):
+        res = []
+        for node in self.res:
+            node = node.optimize()
+            if isinstance(node, Inter):
+                res.extend(node.res)
+            else:
+                res.append(node)
+        # cheap ones which are likely to fail first
+        res.sort(
+            key=lambda n: n._cost() / max(1.0 - n._probability(), 0.001))
+        return Inter(res)
+
+    def _cost(self):
+        cost = 0.0
+        reached = 1.0
+        for node in self.res:
+            cost += reached * node._cost()
+            reached *= node._probability()
+        return cost
+
+    def _probability(self):
+        hit = 1.0
+        for node in self.res:
+            hit *= node._probability()
+        return hit
+
+    def _children(self):
+        return self.res
+
+    def _compile(self, compiler):
+        return compiler.chain(
+            [r._compile(compiler) for r in self.res], "if r:", "r = True")
+
     def __repr__(self):
         return "<Inter %r>" % self.res
 
@@ -143,6 +327,21 @@ class Neg(Node):
     def search(self, data):
         return not self.res.search(data)
 
+    def optimize(self):
+        return Neg(self.res.optimize())
+
+    def _cost(self):
+        return self.res._cost()
+
+    def _probability(self):
+        return 1.0 - self.res._probability()
+
+    def _children(self):
+        return [self.res]
+
+    def _compile(self, compiler):
+        return self.res._compile(compiler) + ["r = not r"]
+
     def __repr__(self):
         return "<Neg %r>" % self.res
 
@@ -180,6 +379,33 @@ class Numcmp(Node):
             return self.__op(round(num, 2), self.__value)
         return False
 
+    def _cost(self):
+        tag = self.__tag
+        if tag in SYNTH_NUMERIC_KEYS or tag.startswith("replaygain_"):
+            return COST_NUMERIC_SYNTH
+        return COST_NUMERIC
+
+    def _probability(self):
+        if self.__op is operator.eq:
+            return 0.1
+        elif self.__op is operator.ne:
+            return 0.9
+        return 0.5
+
+    def _describe(self):
+        return "Numcmp %s %s %.2f" % (
+            self.__ftag, self.__op.__name__, self.__value)
+
+    def _compile(self, compiler):
+        symbol = OPERATOR_SYMBOLS.get(self.__op)
+        if symbol is None:
+            return super(Numcmp, self)._compile(compiler)
+        return [
+            "n = s(%s, None)" % compiler.const(self.__ftag),
+            "r = n is not None and round(n, 2) %s %s" % (
+                symbol, compiler.const(self.__value)),
+        ]
+
     def __repr__(self):
         return "<Numcmp tag=%r, op=%r, value=%.2f>" % (
             self.__tag, self.__op.__name__, self.__value)
@@ -250,6 +476,59 @@ class Tag(Node):
 
         return False
 
+    def candidates(self, index):
+        if self.__intern or self.__fs:
+            return None
+        return union_sets(
+            [index.search(name, self.res) for name in self.__names])
+
+    def optimize(self):
+        names = self.__names + self.__intern + self.__fs
+        return Tag(names, _optimize_re(self.res))
+
+    def _cost(self):
+        cost = COST_TAG * len(self.__names) + COST_FS * len(self.__fs)
+        for name in self.__intern:
+            if name in EXPENSIVE_KEYS:
+                cost += COST_EXPENSIVE
+            else:
+                cost += COST_INTERN
+        return cost * _re_cost(self.res)
+
+    def _probability(self):
+        missed = 1.0 - _re_probability(self.res)
+        count = len(self.__names) + len(self.__intern) + len(self.__fs)
+        return 1.0 - missed ** count
+
+    def _describe(self):
+        names = self.__names + self.__intern + self.__fs
+        return "Tag %s %s" % (",".join(names), _describe_re(self.res))
+
+    def _compile(self, compiler):
+        test = compiler.regex(self.res, "v")
+        const = compiler.const
+        parts = []
+
+        for name in self.__names:
+            lines = ["v = g(%s)" % const(name), "if v is None:"]
+            # filename is the only real entry that's a path
+            if name == "filename":
+                lines.append(
+                    "  v = %s(g('~filename', ''))" % const(fsdecode))
+            else:
+                lines.append("  v = g(%s, '')" % const("~" + name))
+            lines.append("r = " + test)
+            parts.append(lines)
+
+        for name in self.__intern:
+            parts.append(["v = s(%s)" % const(name), "r = " + test])
+
+        for name in self.__fs:
+            parts.append(["v = %s(s(%s))" % (const(fsdecode), const(name)),
+                          "r = " + test])
+
+        return compiler.chain(parts, "if not r:", "r = False")
+
     def __repr__(self):
         names = self.__names + self.__intern
         return ("<Tag names=%r, res=%r>" % (names, self.res))
@@ -267,6 +546,188 @@ class Tag(Node):
         return Union([self, other])
 
 
+class Substring(object):
+    """Searches for fixed text like a compiled regex which only contains
+    a literal would, but faster.
+
+    Create through _optimize_re().
+    """
+
+    def __init__(self, regex, text, whole_line, ignore_case):
+        # keep these so it can be analyzed like the regex
+        self.pattern = regex.pattern
+        self.flags = regex.flags
+
+        self.text = text
+        self.whole_line = whole_line
+        self.__lower = ignore_case
+        self.__regex = regex
+
+    def search(self, value):
+        if not isinstance(value, unicode):
+            # like the regex, compare code points
+            value = value.decode("latin-1")
+        if self.__lower:
+            try:
+                value.encode("ascii")
+            except UnicodeError:
+                # the regex folds some non-ASCII characters to ASCII
+                # ones which lower() doesn't, like "\u017f" to "s"
+                return self.__regex.search(value) is not None
+            value = value.lower()
+        if self.whole_line:
+            return self.text in value.split(u"\n")
+        return self.text in value
+
+    def __repr__(self):
+        return "<Substring text=%r, whole_line=%r>" % (
+            self.text, self.whole_line)
+
+
+def _optimize_re(res):
+    """Optimizes the regex (or match node of regexes) used by Tag"""
+
+    if isinstance(res, (Inter, Union)):
+        return type(res)([_optimize_re(r) for r in res.res])
+    elif isinstance(res, Neg):
+        return Neg(_optimize_re(res.res))
+    elif not isinstance(res, Substring) and hasattr(res, "pattern"):
+        literal = literal_string(res)
+        if literal is not None:
+            return Substring(res, *literal)
+    return res
+
+
+def _re_cost(res):
+    if isinstance(res, (Inter, Union)):
+        return sum(map(_re_cost, res.res))
+    elif isinstance(res, Neg):
+        return _re_cost(res.res)
+    elif isinstance(res, Substring):
+        return 0.5
+    return 1.0
+
+
+def _re_probability(res):
+    if isinstance(res, Inter):
+        return reduce(operator.mul, map(_re_probability, res.res), 1.0)
+    elif isinstance(res, Union):
+        missed = [1.0 - _re_probability(r) for r in res.res]
+        return 1.0 - reduce(operator.mul, missed, 1.0)
+    elif isinstance(res, Neg):
+        return 1.0 - _re_probability(res.res)
+    elif hasattr(res, "pattern"):
+        # longer text is less likely to be found
+        length = sum(map(len, required_literals(res)))
+        if length:
+            return 1.0 / (1 + length)
+    return 0.5
+
+
+def _describe_re(res):
+    if isinstance(res, (Inter, Union)):
+        parts = ", ".join(map(_describe_re, res.res))
+        return "%s(%s)" % ("&" if isinstance(res, Inter) else "|", parts)
+    elif isinstance(res, Neg):
+        return "!" + _describe_re(res.res)
+    elif isinstance(res, Substring):
+        if res.whole_line:
+            return "line=%r" % res.text
+        return "substring=%r" % res.text
+    elif hasattr(res, "pattern"):
+        # diacritic variants make patterns unreadable
+        literals = required_literals(res)
+        if len(res.pattern) > 40 and literals:
+            return "regex containing %s" % ", ".join(map(repr, literals))
+        return "regex=%r" % res.pattern
+    return repr(res)
+
+
+OPERATOR_SYMBOLS = {
+    operator.lt: "<",
+    operator.le: "<=",
+    operator.gt: ">",
+    operator.ge: ">=",
+    operator.eq: "==",
+    operator.ne: "!=",
+}
+
+
+class QueryCompiler(object):
+    """Turns a match tree into a single function taking a song, with tag
+    lookups inlined and regex search methods, values etc. bound to
+    closure variables.
+
+    The nodes generate the code through Node._compile().
+    """
+
+    def __init__(self, root):
+        self.__root = root
+
+    def compile(self):
+        """Returns the search function or raises SyntaxError/
+        RuntimeError if the tree can't be compiled (e.g. it's nested too
+        deep).
+        """
+
+        self.__consts = {}
+        body = self.__root._compile(self)
+        consts = sorted(self.__consts.values())
+        args = [name for name, value in consts]
+
+        content = ["def make(%s):" % ", ".join(args)]
+        content.append("  def f(s):")
+        content.append("    g = s.get")
+        content.extend(self.indent(body, 2))
+        content.append("    return r")
+        content.append("  return f")
+        code = "\n".join(content)
+
+        scope = {}
+        exec compile(code, "<query>", "exec") in scope
+        return scope["make"](*[value for name, value in consts])
+
+    def const(self, value):
+        """Returns the name of a variable holding value"""
+
+        key = id(value)
+        if key not in self.__consts:
+            self.__consts[key] = ("k%d" % len(self.__consts), value)
+        return self.__consts[key][0]
+
+    def indent(self, lines, level=1):
+        return map(("  " * level).__add__, lines)
+
+    def chain(self, parts, condition, empty):
+        """Combines the code of multiple nodes; each following one only
+        runs if the condition holds for 'r' after the previous one.
+        """
+
+        if not parts:
+            return [empty]
+        lines = list(parts[0])
+        if len(parts) > 1:
+            lines.append(condition)
+            lines.extend(self.indent(self.chain(parts[1:], condition, empty)))
+        return lines
+
+    def regex(self, res, name):
+        """Returns an expression which is True if the regex or match node
+        of regexes matches the variable 'name'
+        """
+
+        if isinstance(res, (Inter, Union)):
+            if not res.res:
+                return "True" if isinstance(res, Inter) else "False"
+            join = " and " if isinstance(res, Inter) else " or "
+            return "(%s)" % join.join([self.regex(r, name) for r in res.res])
+        elif isinstance(res, Neg):
+            return "(not %s)" % self.regex(res.res, name)
+        elif isinstance(res, Substring):
+            return "%s(%s)" % (self.const(res.search), name)
+        return "(%s(%s) is not None)" % (self.const(res.search), name)
+
+
 def map_numeric_op(tag, op, value, time_=None):
     """Maps a human readable numeric comparison to something we can use.
 
@@ -35,6 +35,9 @@ class Query(Node):
     stars = None
     """list of default tags used"""
 
+    _terms = None
+    """lower case search terms of a TEXT query"""
+
     def __init__(self, string, star=None, dumb_match_diacritics=True):
         """Parses the query string and returns a match object.
 
@@ -66,14 +69,16 @@ class Query(Node):
 
         try:
             self.type = QueryType.VALID
-            self._match = QueryParser(QueryLexer(string)).StartStarQuery(star)
+            self._match = QueryParser(
+                QueryLexer(string)).StartStarQuery(star).optimize()
             return
         except error:
             pass
 
         # normal string, put it in a intersection to get a value list
         if not set("#=").intersection(string):
-            parts = ["/%s/" % re_escape(s) for s in string.split()]
+            terms = string.split()
+            parts = ["/%s/" % re_escape(s) for s in terms]
             if dumb_match_diacritics:
                 parts = [p + "d" for p in parts]
             string = "&(" + ",".join(parts) + ")"
@@ -82,25 +87,70 @@ class Query(Node):
             try:
                 self.type = QueryType.TEXT
                 self._match = QueryParser(
-                    QueryLexer(string)).StartStarQuery(star)
+                    QueryLexer(string)).StartStarQuery(star).optimize()
+                self._terms = [t.lower() for t in terms]
+                self._diacritics = dumb_match_diacritics
                 return
             except error:
                 pass
 
         self.type = QueryType.VALID
-        self._match = QueryParser(QueryLexer(string)).StartQuery()
+        self._match = QueryParser(QueryLexer(string)).StartQuery().optimize()
 
     def __repr__(self):
         return "<Query string=%r type=%r star=%r>" % (
             self.string, self.type, self.star)
 
+    def explain(self):
+        """Returns a description of the optimized match tree, including
+        the estimated cost and match probability of each node,
+        in the order the nodes get evaluated.
+        """
+
+        return "\n".join(self._match._explain())
+
     @cached_property
     def search(self):
-        return self._match.search
+        """A function taking a song, returning whether the query
+        matches it"""
+
+        try:
+            return match.QueryCompiler(self._match).compile()
+        except (SyntaxError, RuntimeError, MemoryError):
+            # nested too deep, use the slower tree
+            return self._match.search
+
+    def filter(self, sequence):
+        """Returns a list of all items in sequence matching the query"""
+
+        if isinstance(self._match, match.True_):
+            return list(sequence)
+        return super(Query, self).filter(sequence)
+
+    def narrows(self, other):
+        """Whether all songs matching this query are known to match the
+        other query as well, so only the songs matching the other one
+        need to be searched.
+
+        Only works for TEXT queries: it's the case if each term of the
+        other query is part of a term of this one ("foo" -> "foob",
+        "foo" -> "foo bar"). Returns False if it can't tell.
+        """
+
+        if other is None or self._terms is None or other._terms is None:
+            return False
+        if self._diacritics != other._diacritics:
+            return False
+        if set(self.star) != set(other.star):
+            return False
+        for other_term in other._terms:
+            if not any(other_term in term for term in self._terms):
+                return False
+        return True
 
     @cached_property
-    def filter(self):
-        return self._match.filter
+    def candidates(self):
+        return self._match.candidates
 
     @classmethod
     def is_valid(cls, string):
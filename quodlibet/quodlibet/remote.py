@@ -7,7 +7,7 @@
 
 import os
 
-from quodlibet.util import fifo
+from quodlibet.util import fifo, controlsocket
 from quodlibet import const
 try:
     from quodlibet.util import winpipe
@@ -92,20 +92,35 @@ class QuodLibetWinRemote(RemoteBase):
 
 
 class QuodLibetUnixRemote(RemoteBase):
+    """Listens on a FIFO and on a Unix domain socket.
+
+    The socket supports many commands per connection and streams large
+    responses, see quodlibet.util.controlsocket.
+    """
 
     _PATH = const.CONTROL
+    _SOCKET_PATH = const.CONTROL_SOCKET
 
     def __init__(self, app, cmd_registry):
         self._app = app
         self._cmd_registry = cmd_registry
         self._fifo = fifo.FIFO(self._PATH, self._callback)
+        self._socket = controlsocket.ControlSocket(
+            self._SOCKET_PATH, self._socket_callback)
 
     @classmethod
     def remote_exists(cls):
-        return fifo.fifo_exists(cls._PATH)
+        return (controlsocket.socket_exists(cls._SOCKET_PATH) or
+                fifo.fifo_exists(cls._PATH))
 
     @classmethod
     def send_message(cls, message):
+        if controlsocket.socket_exists(cls._SOCKET_PATH):
+            try:
+                return controlsocket.write_socket(cls._SOCKET_PATH, message)
+            except EnvironmentError as e:
+                print_d("Control socket failed (%s), using the FIFO" % e)
+
         try:
             return fifo.write_fifo(cls._PATH, message)
         except EnvironmentError as e:
@@ -117,9 +132,18 @@ class QuodLibetUnixRemote(RemoteBase):
         except fifo.FIFOError as e:
             raise RemoteError(e)
 
+        try:
+            self._socket.open()
+        except controlsocket.ControlSocketError as e:
+            print_w("Couldn't open the control socket: %s" % e)
+
     def stop(self):
+        self._socket.destroy()
         self._fifo.destroy()
 
+    def _socket_callback(self, command):
+        return self._cmd_registry.handle_line(self._app, command)
+
     def _callback(self, data):
         try:
             messages = list(fifo.split_message(data))
@@ -130,8 +154,10 @@ class QuodLibetUnixRemote(RemoteBase):
             response = self._cmd_registry.handle_line(self._app, command)
             if path is not None:
                 with open(path, "wb") as h:
-                    if response is not None:
+                    if isinstance(response, basestring):
                         h.write(response)
+                    elif response is not None:
+                        h.writelines(response)
 
 
 if os.name == "nt":
@@ -7,6 +7,8 @@
 # published by the Free Software Foundation
 
 import os
+import heapq
+import math
 import random
 import re
 import ctypes
@@ -843,26 +845,58 @@ def build_filter_query(key, values):
             return u"%s = |(%s)" % (key, text)
 
 
+def random_sample(items, count, weight=None):
+    """Returns a list of `count` randomly chosen items of the iterable
+    `items` in random order, or all of them if there are fewer.
+
+    If `weight` is given, it gets called with each item and should return
+    a number >= 0: the chance of an item to get chosen next is
+    proportional to its weight. Items with a weight of 0 only get chosen
+    if there aren't enough others.
+
+    Only `count` items are kept at a time, so `items` can be a generator.
+    """
+
+    # Efraimidis, Spirakis: Weighted random sampling with a reservoir.
+    # Each item gets the key u ** (1 / weight) for a random u in (0, 1]
+    # and the items with the largest keys get chosen.
+    heap = []
+    if count <= 0:
+        return heap
+
+    for index, item in enumerate(items):
+        # (0, 1] to keep log() happy
+        rand = 1.0 - random.random()
+        if weight is None:
+            key = (1, rand)
+        else:
+            value = weight(item)
+            if value > 0:
+                key = (1, math.log(rand) / value)
+            else:
+                key = (0, rand)
+
+        # the index keeps items from getting compared
+        entry = (key, index, item)
+        if len(heap) < count:
+            heapq.heappush(heap, entry)
+        elif entry > heap[0]:
+            heapq.heapreplace(heap, entry)
+
+    heap.sort(reverse=True)
+    return [e[-1] for e in heap]
+
+
 def limit_songs(songs, max, weight_by_ratings=False):
     """Choose at most `max` songs from `songs`,
     optionally giving weighting to ~#rating"""
 
     if not max or len(songs) < max:
         return songs
+    elif weight_by_ratings:
+        return random_sample(songs, max, lambda song: song("~#rating"))
     else:
-        if weight_by_ratings:
-            def choose(r1, r2):
-                if r1 or r2:
-                    return cmp(random.random(), r1 / (r1 + r2))
-                else:
-                    return random.randint(-1, 1)
-
-            def rating(song):
-                return song("~#rating")
-            songs.sort(cmp=choose, key=rating)
-        else:
-            random.shuffle(songs)
-        return songs[:max]
+        return random_sample(songs, max)
 
 
 def gi_require_versions(name, versions):
@@ -9,6 +9,7 @@
 
 from __future__ import absolute_import
 
+import itertools
 import os
 import random
 
@@ -16,7 +17,7 @@ from quodlibet import util
 from quodlibet import config
 from quodlibet.formats._audio import TAG_TO_SORT, INTERN_NUM_DEFAULT
 from quodlibet.formats._audio import PEOPLE as _PEOPLE
-from collections import Iterable
+from collections import Iterable, OrderedDict
 from quodlibet.util.path import escape_filename, unescape_filename
 from quodlibet.util.path import bytes2fsnative, is_fsnative, fsnative2bytes
 from .collections import HashedList
@@ -79,18 +80,18 @@ class Collection(object):
     songs = ()
 
     def __init__(self):
-        """Cache in _cache, LRU key order in _used, keys that return default
-        are in _default"""
-        self.__cache = {}
+        """Cache in _cache, oldest first, keys that return default
+        are in _default, numeric values of the songs in _columns"""
+        self.__cache = OrderedDict()
         self.__default = set()
-        self.__used = []
+        self.__columns = {}
 
     def finalize(self):
         """Finalize the collection.
         Call this after songs get added or removed"""
         self.__cache.clear()
         self.__default.clear()
-        self.__used = []
+        self.__columns.clear()
 
     def get(self, key, default=u"", connector=u" - "):
         if not self.songs:
@@ -127,10 +128,11 @@ class Collection(object):
         return [] if v == "" else v.split("\n")
 
     def __get_cached_value(self, key):
-        if key in self.__cache:
-            self.__used.remove(key)
-            self.__used.insert(0, key)
-            return self.__cache[key]
+        cache = self.__cache
+        if key in cache:
+            # move to the end, the most recently used
+            val = cache[key] = cache.pop(key)
+            return val
         elif key in self.__default:
             return None
         else:
@@ -138,13 +140,35 @@ class Collection(object):
             if val is None:
                 self.__default.add(key)
             else:
-                self.__used.insert(0, key)
-                self.__cache[key] = val
-            # Remove the oldest if the cache is full
-            if len(self.__used) > self._cache_size:
-                self.__cache.pop(self.__used.pop(-1))
+                self.__set_cached_value(key, val)
         return val
 
+    def __set_cached_value(self, key, val):
+        cache = self.__cache
+        cache.pop(key, None)
+        cache[key] = val
+        # Remove the oldest if the cache is full
+        if len(cache) > self._cache_size:
+            cache.popitem(last=False)
+
+    def __get_column(self, key):
+        """Returns a list of the numeric values of the songs for a '~#' key,
+        songs without a value are left out. Shared by all functions
+        aggregating the same key until the songs change."""
+
+        try:
+            return self.__columns[key]
+        except KeyError:
+            pass
+
+        if key in INTERN_NUM_DEFAULT:
+            # what AudioFile.__call__ returns for them, but cheaper
+            values = (song.get(key, 0) for song in self.songs)
+        else:
+            values = (song(key) for song in self.songs)
+        values = self.__columns[key] = [v for v in values if v != ""]
+        return values
+
     def __get_value(self, key):
         """This is similar to __call__ in the AudioFile class.
         All internal tags are changed to represent a collection of songs.
@@ -180,8 +204,7 @@ class Collection(object):
             if func:
                 # If none of the songs can return a numeric key,
                 # the album returns default
-                values = (song(key) for song in self.songs)
-                values = [v for v in values if v != ""]
+                values = self.__get_column(key)
                 return func(values) if values else None
             elif key in INTERN_NUM_DEFAULT:
                 return 0
@@ -220,10 +243,7 @@ class Collection(object):
                 if not values:
                     self.__default.add(other)
                 else:
-                    if other in self.__used:
-                        self.__used.remove(other)
-                    self.__used.append(other)
-                    self.__cache[other] = "\n".join(values)
+                    self.__set_cached_value(other, "\n".join(values))
                 return ret
             elif numkey == "length":
                 length = self.__get_value("~#" + key)
@@ -331,6 +351,37 @@ class Album(Collection):
         return "Album(%s)" % repr(self.key)
 
 
+class _PlaylistItems(HashedList):
+    """The song list of a playlist, keeps the song to playlist membership
+    index of `Playlist` up to date"""
+
+    def __init__(self, playlist):
+        super(_PlaylistItems, self).__init__()
+        self._playlist = playlist
+
+    def __setitem__(self, index, item):
+        old = self[index]
+        super(_PlaylistItems, self).__setitem__(index, item)
+        if isinstance(index, slice):
+            self.__update(list(old) + list(item))
+        else:
+            self.__update([old, item])
+
+    def __delitem__(self, index):
+        old = self[index]
+        super(_PlaylistItems, self).__delitem__(index)
+        self.__update(old if isinstance(index, slice) else [old])
+
+    def insert(self, index, item):
+        super(_PlaylistItems, self).insert(index, item)
+        self.__update([item])
+
+    def __update(self, items):
+        for item in items:
+            if not isinstance(item, basestring):
+                Playlist._update_membership(self._playlist, item)
+
+
 class Playlist(Collection, Iterable):
     """A Playlist is a `Collection` that has list-like features
     Songs can appear more than once.
@@ -339,6 +390,9 @@ class Playlist(Collection, Iterable):
     """
 
     __instances = []
+    # song -> list of playlists containing it
+    __members = {}
+    __serials = itertools.count()
 
     quote = staticmethod(escape_filename)
     unquote = staticmethod(unescape_filename)
@@ -385,11 +439,28 @@ class Playlist(Collection, Iterable):
     def playlists_featuring(cls, song):
         """Returns the list of playlists in which this song appears"""
 
-        playlists = []
-        for instance in cls.__instances:
-            if song in instance._list:
-                playlists.append(instance)
-        return playlists
+        playlists = cls.__members.get(song)
+        if not playlists:
+            return []
+        return sorted(playlists, key=lambda p: p._serial)
+
+    @classmethod
+    def _update_membership(cls, playlist, song):
+        """Add or remove the playlist from the membership index of song,
+        depending on whether the song is in it"""
+
+        members = cls.__members
+        playlists = members.get(song, [])
+        for i, other in enumerate(playlists):
+            if other is playlist:
+                if song not in playlist._list:
+                    del playlists[i]
+                    if not playlists:
+                        del members[song]
+                break
+        else:
+            if song in playlist._list:
+                members.setdefault(song, playlists).append(playlist)
 
     # List-like methods, for compatibilty with original Playlist class.
     def extend(self, songs):
@@ -428,6 +499,7 @@ class Playlist(Collection, Iterable):
     def __init__(self, dir, name, library=None):
         super(Playlist, self).__init__()
         self.__instances.append(self)
+        self._serial = next(self.__serials)
 
         if isinstance(name, unicode) and os.name != "nt":
             name = name.encode('utf-8')
@@ -435,7 +507,7 @@ class Playlist(Collection, Iterable):
         self.name = name
         self.dir = dir
         self.library = library
-        self._list = HashedList()
+        self._list = _PlaylistItems(self)
         try:
             with open(self.filename, "rb") as h:
                 for line in h:
@@ -511,6 +583,9 @@ class Playlist(Collection, Iterable):
         return changed
 
     def has_songs(self, songs):
+        """Returns a tuple: if some and if all of the songs are in the
+        playlist, each check is O(1)"""
+
         # TODO(rm): consider the "library.masked" business
         some, all = False, True
         for song in songs:
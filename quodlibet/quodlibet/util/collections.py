@@ -8,6 +8,7 @@
 
 from __future__ import absolute_import
 
+import random
 from collections import MutableSequence, defaultdict
 
 
@@ -199,3 +200,106 @@ class HashedList(MutableSequence):
 
     def __repr__(self):
         return repr(self._data)
+
+
+class FenwickTree(object):
+    """A list of non-negative numbers which supports changing values and
+    finding the index for a cumulative sum in O(log n).
+
+    Used for picking items randomly, weighted by their value.
+    """
+
+    def __init__(self, values=()):
+        values = list(values)
+        self._values = values
+        tree = [0] + values
+        size = len(tree)
+        for i in xrange(1, size):
+            parent = i + (i & -i)
+            if parent < size:
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def __len__(self):
+        return len(self._values)
+
+    def __getitem__(self, index):
+        return self._values[index]
+
+    def __setitem__(self, index, value):
+        delta = value - self._values[index]
+        self._values[index] = value
+        tree = self._tree
+        size = len(tree)
+        i = index + 1
+        while i < size:
+            tree[i] += delta
+            i += i & -i
+
+    def total(self):
+        """The sum of all values"""
+
+        total = 0
+        tree = self._tree
+        i = len(tree) - 1
+        while i > 0:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+    def find(self, value):
+        """Returns the first index for which the sum of all values up to
+        and including it is greater than `value`, or None if there is
+        none.
+        """
+
+        tree = self._tree
+        size = len(tree)
+        pos = 0
+        step = 1
+        while step * 2 < size:
+            step *= 2
+        while step:
+            next_ = pos + step
+            if next_ < size and tree[next_] <= value:
+                pos = next_
+                value -= tree[next_]
+            step //= 2
+        if pos < len(self._values):
+            return pos
+
+
+class IndexPool(object):
+    """A set of integers with O(1) add, discard and random choice"""
+
+    def __init__(self, indices=()):
+        self._list = list(indices)
+        self._pos = dict((v, i) for i, v in enumerate(self._list))
+
+    def __len__(self):
+        return len(self._list)
+
+    def __contains__(self, index):
+        return index in self._pos
+
+    def __iter__(self):
+        return iter(self._list)
+
+    def add(self, index):
+        if index not in self._pos:
+            self._pos[index] = len(self._list)
+            self._list.append(index)
+
+    def discard(self, index):
+        pos = self._pos.pop(index, None)
+        if pos is None:
+            return
+        last = self._list.pop()
+        if pos < len(self._list):
+            self._list[pos] = last
+            self._pos[last] = pos
+
+    def choice(self):
+        """Returns a random member. Raises IndexError if empty."""
+
+        return random.choice(self._list)
@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+# Copyright 2016 Quod Libet contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as
+# published by the Free Software Foundation
+
+"""A Unix domain socket for sending commands to a running instance.
+
+Clients send one command per line and can send many commands without
+waiting for the responses. Each command gets a response, in the order
+the commands were sent. A response is a sequence of frames, each one
+the length of the data in decimal followed by a newline and the data,
+ending with an empty frame:
+
+    client: "print-query artist=foo\\nnext\\n"
+    server: "14\\n/a/b/song.ogg\\n" "0\\n" "0\\n"
+
+Responses of commands returning an iterable get written while they
+are being produced, so large responses don't have to fit in memory and
+don't block the main loop for long. The next command of a connection
+only runs once the response of the previous one is complete.
+"""
+
+from __future__ import absolute_import
+
+import collections
+import errno
+import os
+import socket
+import stat
+
+from gi.repository import GLib
+
+from quodlibet import util
+from quodlibet.util.path import mkdir
+
+
+TIMEOUT = 30
+"""Seconds a client waits for data from the server"""
+
+FRAME_SIZE = 2 ** 16
+"""Maximum amount of response data the server puts in one frame"""
+
+MAX_FRAMES = 16
+"""Maximum number of frames sent to a client per main loop iteration"""
+
+
+def _iter_response(response):
+    if response is None:
+        return iter(())
+    elif isinstance(response, basestring):
+        return iter([response])
+    return iter(response)
+
+
+def socket_exists(path):
+    try:
+        return stat.S_ISSOCK(os.stat(path).st_mode)
+    except OSError:
+        return False
+
+
+def _connect(path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(TIMEOUT)
+        sock.connect(path)
+    except socket.error:
+        sock.close()
+        raise
+    return sock
+
+
+def iter_commands(path, commands):
+    """Sends all commands to the socket and yields the responses in order.
+
+    Raises EnvironmentError.
+    """
+
+    sock = _connect(path)
+    try:
+        sock.sendall("".join(c + "\n" for c in commands))
+        sock.shutdown(socket.SHUT_WR)
+        fileobj = sock.makefile("rb")
+        for command in commands:
+            chunks = []
+            while True:
+                header = fileobj.readline()
+                try:
+                    size = int(header)
+                except ValueError:
+                    raise EnvironmentError(
+                        "invalid response for %r" % command)
+                if not size:
+                    break
+                chunk = fileobj.read(size)
+                if len(chunk) != size:
+                    raise EnvironmentError(
+                        "incomplete response for %r" % command)
+                chunks.append(chunk)
+            yield "".join(chunks)
+    except socket.timeout:
+        raise EnvironmentError("timeout")
+    finally:
+        sock.close()
+
+
+def write_socket(path, data):
+    """Sends the command to the socket and returns the response
+    or raises EnvironmentError.
+    """
+
+    for response in iter_commands(path, [data]):
+        return response
+
+
+class ControlSocketError(Exception):
+    pass
+
+
+class _Connection(object):
+
+    def __init__(self, sock, callback, closed_callback):
+        from quodlibet import qltk
+
+        self._sock = sock
+        self._callback = callback
+        self._closed_callback = closed_callback
+        self._inbuf = ""
+        self._outbuf = ""
+        self._commands = collections.deque()
+        self._response = None
+        self._eof = False
+        self._out_id = None
+        self._in_id = qltk.io_add_watch(
+            sock.fileno(), GLib.PRIORITY_DEFAULT,
+            GLib.IO_IN | GLib.IO_ERR | GLib.IO_HUP, self._read)
+
+    def close(self):
+        for id_ in [self._in_id, self._out_id]:
+            if id_ is not None:
+                GLib.source_remove(id_)
+        self._in_id = self._out_id = None
+        self._sock.close()
+        self._closed_callback(self)
+
+    def _read(self, source, condition):
+        while True:
+            try:
+                data = self._sock.recv(4096)
+            except socket.error as e:
+                if e.errno in (errno.EWOULDBLOCK, errno.EAGAIN):
+                    break
+                elif e.errno == errno.EINTR:
+                    continue
+                data = ""
+            if not data:
+                self._eof = True
+                break
+            self._inbuf += data
+
+        lines = self._inbuf.split("\n")
+        self._inbuf = lines.pop()
+        self._commands.extend(l.rstrip("\r") for l in lines if l.strip())
+
+        if self._eof:
+            self._in_id = None
+        self._update()
+        return not self._eof
+
+    def _fill(self):
+        """Runs commands and collects response data until there is enough
+        to send"""
+
+        while len(self._outbuf) < FRAME_SIZE:
+            if self._response is None:
+                if not self._commands:
+                    break
+                command = self._commands.popleft()
+                try:
+                    response = self._callback(command)
+                except Exception:
+                    util.print_exc()
+                    response = None
+                self._response = _iter_response(response)
+
+            chunks = []
+            size = 0
+            try:
+                while size < FRAME_SIZE:
+                    chunk = next(self._response)
+                    if isinstance(chunk, unicode):
+                        chunk = chunk.encode("utf-8")
+                    chunks.append(chunk)
+                    size += len(chunk)
+            except StopIteration:
+                self._response = None
+            except Exception:
+                util.print_exc()
+                self._response = None
+
+            data = "".join(chunks)
+            if data:
+                self._outbuf += "%d\n%s" % (len(data), data)
+            if self._response is None:
+                self._outbuf += "0\n"
+
+    def _flush(self):
+        """Sends as much as possible without blocking, or until it's time
+        to give the main loop a chance. Returns True if there is more to
+        send."""
+
+        for i in xrange(MAX_FRAMES):
+            self._fill()
+            if not self._outbuf:
+                return False
+            try:
+                sent = self._sock.send(self._outbuf)
+            except socket.error as e:
+                if e.errno in (errno.EWOULDBLOCK, errno.EAGAIN, errno.EINTR):
+                    return True
+                # the other side is gone, nobody cares about the rest
+                self._outbuf = ""
+                self._response = None
+                self._commands.clear()
+                self._eof = True
+                return False
+            self._outbuf = self._outbuf[sent:]
+        return True
+
+    def _update(self):
+        if self._flush():
+            if self._out_id is None:
+                from quodlibet import qltk
+
+                self._out_id = qltk.io_add_watch(
+                    self._sock.fileno(), GLib.PRIORITY_DEFAULT,
+                    GLib.IO_OUT | GLib.IO_ERR | GLib.IO_HUP, self._writable)
+        else:
+            if self._out_id is not None:
+                GLib.source_remove(self._out_id)
+                self._out_id = None
+            if self._eof:
+                self.close()
+
+    def _writable(self, source, condition):
+        if self._flush():
+            return True
+        self._out_id = None
+        if self._eof:
+            self.close()
+        return False
+
+
+class ControlSocket(object):
+    """Listens on a Unix domain socket and passes each received line to
+    `callback`, which returns the response: None, a string or an
+    iterable of strings.
+    """
+
+    def __init__(self, path, callback):
+        self._path = path
+        self._callback = callback
+        self._sock = None
+        self._id = None
+        self._connections = set()
+
+    def open(self):
+        """Create the socket and listen to it.
+
+        Might raise ControlSocketError in case another process is already
+        using it.
+        """
+
+        from quodlibet import qltk
+
+        mkdir(os.path.dirname(self._path))
+        if socket_exists(self._path):
+            try:
+                _connect(self._path).close()
+            except socket.error:
+                pass
+            else:
+                raise ControlSocketError("socket already in use")
+
+        # nobody listening, left over from a crash
+        try:
+            os.unlink(self._path)
+        except OSError:
+            pass
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            old_umask = os.umask(0o077)
+            try:
+                sock.bind(self._path)
+            finally:
+                os.umask(old_umask)
+            sock.listen(16)
+            sock.setblocking(False)
+        except socket.error as e:
+            sock.close()
+            raise ControlSocketError(e)
+
+        self._sock = sock
+        self._id = qltk.io_add_watch(
+            sock.fileno(), GLib.PRIORITY_DEFAULT, GLib.IO_IN, self._accept)
+
+    def destroy(self):
+        for connection in list(self._connections):
+            connection.close()
+
+        if self._id is not None:
+            GLib.source_remove(self._id)
+            self._id = None
+
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+            try:
+                os.unlink(self._path)
+            except EnvironmentError:
+                pass
+
+    def _accept(self, source, condition):
+        while True:
+            try:
+                sock, address = self._sock.accept()
+            except socket.error as e:
+                if e.errno == errno.EINTR:
+                    continue
+                break
+            sock.setblocking(False)
+            self._connections.add(
+                _Connection(sock, self._callback, self._connections.discard))
+        return True
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# Copyright 2016 Quod Libet contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as
+# published by the Free Software Foundation
+
+"""Records how long importing modules takes, to find out what makes
+starting up slow.
+
+Imports which happen before install() don't show up, so it should be
+called as early as possible. Since this module is part of the quodlibet
+package, importing the package itself always happens before that; the
+report only states how long it took in total.
+"""
+
+import __builtin__
+import sys
+import time
+
+
+class ImportProfiler(object):
+    """Wraps __import__ and sums up the time spent in each import
+    statement which loaded at least one new module.
+    """
+
+    def __init__(self, start=None):
+        self.start = time.time() if start is None else start
+        self.installed = None
+        self._import = None
+        # time spent in nested imports, per active import
+        self._stack = []
+        # name -> [total seconds, seconds without nested imports]
+        self._times = {}
+
+    def install(self):
+        assert self._import is None
+        if self.installed is None:
+            self.installed = time.time()
+        self._import = __builtin__.__import__
+        __builtin__.__import__ = self.__import
+
+    def uninstall(self):
+        if self._import is not None:
+            __builtin__.__import__ = self._import
+            self._import = None
+
+    def __import(self, name, *args, **kwargs):
+        count = len(sys.modules)
+        self._stack.append(0.0)
+        start = time.time()
+        try:
+            return self._import(name, *args, **kwargs)
+        finally:
+            elapsed = time.time() - start
+            nested = self._stack.pop()
+            if self._stack:
+                self._stack[-1] += elapsed
+            if len(sys.modules) != count:
+                if args and args[0] and args[0].get("__name__"):
+                    name = "%s (%s)" % (name, args[0]["__name__"])
+                entry = self._times.setdefault(name, [0.0, 0.0])
+                entry[0] += elapsed
+                entry[1] += elapsed - nested
+
+    def get_report(self, limit=30):
+        """Returns a list of lines with the total time since start, the
+        time before install() which isn't broken down, the total time
+        spent importing, and the imports which took the longest without
+        the time of their nested imports
+        """
+
+        total = time.time() - self.start
+        untracked = (self.installed or self.start) - self.start
+        # self times don't overlap
+        imported = sum(e[1] for e in self._times.itervalues())
+
+        lines = []
+        lines.append("Startup took %.3f seconds, %.3f of them importing "
+                     "modules" % (total, imported))
+        lines.append("%.3f seconds passed before imports were tracked, "
+                     "which includes importing the quodlibet package; "
+                     "that time isn't broken down" % untracked)
+        lines.append("%10s %10s  %s" % ("self [ms]", "total [ms]", "import"))
+        entries = sorted(self._times.iteritems(),
+                         key=lambda i: i[1][1], reverse=True)
+        for name, (cumulative, own) in entries[:limit]:
+            lines.append(
+                "%10.1f %10.1f  %s" % (own * 1000, cumulative * 1000, name))
+        return lines
@@ -8,6 +8,7 @@
 
 import re
 import sys
+import time
 
 from quodlibet import app
 from quodlibet import config
@@ -31,6 +32,80 @@ def background_filter():
         pass
 
 
+class ChunkedFilter(object):
+    """Filters items in the main loop, a few milliseconds at a time, so
+    expensive queries over large libraries don't block the UI.
+
+    Starting a new run or calling cancel() stops the current one.
+    """
+
+    DURATION = 0.04
+    """Seconds spent filtering per main loop iteration"""
+
+    STEP = 100
+    """Number of items to check between looking at the clock"""
+
+    def __init__(self):
+        self._funcid = None
+
+    def run(self, func, items, callback, chunked=True):
+        """Calls callback(matches, done) with the items for which func
+        returns True.
+
+        The first part gets checked right away. If that covers all items,
+        or if chunked is False, callback gets called once with done=True
+        before run() returns. Otherwise it gets called with the new
+        matches of each part and done=True for the last part.
+        """
+
+        self.cancel()
+
+        # the source might change while we are busy
+        items = list(items)
+        if not chunked:
+            callback(filter(func, items), True)
+            return
+
+        parts = self._iter_parts(func, items)
+        matches, done = next(parts)
+        if not done:
+            # a new funcid for each run, since the callback can start
+            # a new one while the old routine is still registered
+            self._funcid = funcid = object()
+            copool.add(self._run, parts, callback, funcid=funcid)
+        callback(matches, done)
+
+    def cancel(self):
+        """Stop the current run, if any. The callback won't get called
+        anymore."""
+
+        if self._funcid is not None:
+            copool.remove(self._funcid)
+            self._funcid = None
+
+    def _run(self, parts, callback):
+        for matches, done in parts:
+            if done:
+                self._funcid = None
+            callback(matches, done)
+            yield
+
+    def _iter_parts(self, func, items):
+        index = 0
+        total = len(items)
+        done = False
+        while not done:
+            matches = []
+            end = time.time() + self.DURATION
+            while True:
+                matches.extend(filter(func, items[index:index + self.STEP]))
+                index += self.STEP
+                if index >= total or time.time() >= end:
+                    break
+            done = index >= total
+            yield matches, done
+
+
 def split_scan_dirs(s):
     """Split the value of the "scan" setting, accounting for drive letters on
     win32."""
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as
+# published by the Free Software Foundation
+
+"""Compares the compiled query search function with the match tree
+interpreter on a synthetic library.
+
+    ./tests/bench_query.py [song count]
+"""
+
+import os
+import sys
+import random
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from quodlibet import config
+from quodlibet.formats._audio import AudioFile
+from quodlibet.query import Query
+
+
+QUERIES = [
+    "beatles",
+    "beatles abbey road",
+    "artist=beatles",
+    "artist=\"The Beatles\"",
+    "&(genre=jazz, #(added < 1 week))",
+    "|(genre=/ja+zz/, ~people=piman, title=!foo)",
+    "&(#(playcount > 2), #(rating >= 0.5), album=/^a/)",
+    "&(!artist=beatles, |(date=2001, date=2002), tracknumber=1)",
+]
+
+WORDS = [u"beatles", u"abbey", u"road", u"jazz", u"rock", u"piman", u"foo",
+         u"the", u"live", u"love", u"\xe4rger", u"caf\xe9"]
+
+
+def get_songs(count):
+    rand = random.Random(42)
+    now = time.time()
+
+    def text(length):
+        return u" ".join(rand.choice(WORDS) for i in xrange(length))
+
+    songs = []
+    for i in xrange(count):
+        song = AudioFile({
+            "~filename": "/music/%d/%d.ogg" % (i // 10, i),
+            "artist": text(2),
+            "album": text(3),
+            "title": text(4),
+            "genre": rand.choice([u"Jazz", u"Rock", u"Pop"]),
+            "date": unicode(rand.randint(1990, 2010)),
+            "tracknumber": u"%d/10" % rand.randint(1, 10),
+            "~#added": now - rand.randint(0, 30 * 24 * 3600),
+            "~#playcount": rand.randint(0, 5),
+            "~#rating": rand.randint(0, 4) / 4.0,
+        })
+        if i % 5 == 0:
+            song["performer"] = text(1)
+        songs.append(song)
+    return songs
+
+
+def measure(func, songs):
+    start = time.time()
+    result = filter(func, songs)
+    return time.time() - start, len(result)
+
+
+def main(argv):
+    count = int(argv[1]) if len(argv) > 1 else 100000
+    config.init()
+    songs = get_songs(count)
+
+    print "%d songs" % count
+    print "%-60s %10s %10s %7s" % ("query", "tree", "compiled", "speedup")
+    total_tree = total_compiled = 0
+    for text in QUERIES:
+        query = Query(text)
+        tree, tree_count = measure(query._match.search, songs)
+        compiled, compiled_count = measure(query.search, songs)
+        assert tree_count == compiled_count
+        total_tree += tree
+        total_compiled += compiled
+        print "%-60s %9.3fs %9.3fs %6.2fx" % (
+            text, tree, compiled, tree / compiled)
+    print "%-60s %9.3fs %9.3fs %6.2fx" % (
+        "total", total_tree, total_compiled, total_tree / total_compiled)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
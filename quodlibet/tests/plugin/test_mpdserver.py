@@ -79,6 +79,7 @@ class TMPDCommands(PluginTestCase):
                 pass
 
         server = Server()
+        self.server = server
         s, c = socket.socketpair()
         self.s = s
         c.setblocking(False)
@@ -97,6 +98,7 @@ class TMPDCommands(PluginTestCase):
             return self.s.recv(99999)
 
     def tearDown(self):
+        self.server.service.destroy()
         destroy_fake_app()
         config.quit()
 
@@ -109,3 +111,62 @@ class TMPDCommands(PluginTestCase):
     def test_idle_close(self):
         for cmd in ["idle", "noidle", "close"]:
             self._cmd(cmd + b"\n")
+
+    def test_database(self):
+        songs = [AudioFile({"~filename": "/m/%d.ogg" % i,
+                            "artist": u"a%d" % (i % 2), "~#length": 10})
+                 for i in range(10)]
+        app.library.add(songs)
+
+        resp = self._cmd(b"find artist a1\n")
+        self.assertEqual(resp.count("file: "), 5)
+        self.assertTrue(resp.endswith("OK\n"))
+        self.assertFalse(self._cmd(b"find artist A1\n").count("file: "))
+        resp = self._cmd(b"search artist A window 2:4\n")
+        self.assertEqual(resp.splitlines()[0], "file: /m/2.ogg")
+        self.assertEqual(resp.count("file: "), 2)
+        self.assertEqual(
+            self._cmd(b"count artist a0\n"), "songs: 5\nplaytime: 50\nOK\n")
+        self.assertEqual(
+            self._cmd(b"list artist\n"), "Artist: a0\nArtist: a1\nOK\n")
+        self.assertEqual(self._cmd(b"listallinfo\n").count("file: "), 10)
+        self.assertTrue(self._cmd(b"find foo bar\n").startswith("ACK"))
+
+    def test_fill_buffer_stops_at_none(self):
+        pulled = []
+
+        def lines():
+            for i in range(3):
+                pulled.append(i)
+                yield None
+            yield u"done"
+
+        self.conn._pending.append(lines())
+        self.conn._fill_buffer()
+        self.assertEqual(pulled, [0])
+        self.conn._fill_buffer()
+        self.assertEqual(pulled, [0, 1])
+
+    def test_plchanges(self):
+        def get_status(key):
+            for line in self._cmd(b"status\n").splitlines():
+                if line.startswith(key + ": "):
+                    return int(line.split()[1])
+
+        songs = [AudioFile({"~filename": "/m/%d.ogg" % i}) for i in range(3)]
+        app.window.playlist.pl.set(songs)
+        version = get_status("playlist")
+        self.assertEqual(get_status("playlistlength"), 3)
+        self.assertEqual(self._cmd(b"plchanges 0\n").count("file: "), 3)
+        self.assertEqual(self._cmd(b"plchanges %d\n" % version), "OK\n")
+
+        app.window.playlist.pl.append(row=[AudioFile({"~filename": "/m/x"})])
+        self.assertTrue(get_status("playlist") > version)
+        resp = self._cmd(b"plchanges %d\n" % version)
+        self.assertEqual(resp.count("file: "), 1)
+        self.assertTrue("file: /m/x\n" in resp)
+        self.assertTrue("Pos: 3\n" in resp)
+        resp = self._cmd(b"plchangesposid %d\n" % version)
+        self.assertTrue(resp.startswith("cpos: 3\nId: "))
+        self.assertEqual(
+            self._cmd(b"playlistinfo 1:3\n").count("file: "), 2)
@@ -1,7 +1,14 @@
 # -*- coding: utf-8 -*-
+import cPickle as pickle
+import threading
+import time
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+from gi.repository import Gtk
+
 from tests import TestCase
 
-from quodlibet.browsers.audiofeeds import AudioFeeds
+from quodlibet.browsers.audiofeeds import AudioFeeds, Feed, update_feeds
 from quodlibet.library import SongLibrary
 import quodlibet.config
 
@@ -20,3 +27,134 @@ class TAudioFeeds(TestCase):
         self.bar.destroy()
         self.library.destroy()
         quodlibet.config.quit()
+
+
+RSS = """<?xml version="1.0" encoding="utf-8"?>
+<rss version="2.0">
+<channel>
+<title>Test Feed</title>
+%s
+</channel>
+</rss>
+"""
+
+ITEM = """<item>
+<title>Episode %d</title>
+<enclosure url="http://example.com/%d.ogg" type="audio/ogg" length="42"/>
+</item>
+"""
+
+
+class FeedHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append((self.path, dict(self.headers)))
+        episodes = server.feeds.get(self.path)
+        if episodes is None:
+            self.send_error(404)
+            return
+        etag = '"%s"' % "-".join(map(str, episodes))
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        data = RSS % "".join(ITEM % (i, i) for i in episodes)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/rss+xml")
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class TFeed(TestCase):
+
+    def setUp(self):
+        self.server = HTTPServer(("127.0.0.1", 0), FeedHandler)
+        self.server.requests = []
+        self.server.feeds = {}
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.setDaemon(True)
+        thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _uri(self, path):
+        return "http://127.0.0.1:%d%s" % (self.server.server_port, path)
+
+    def test_conditional(self):
+        self.server.feeds["/feed"] = [1]
+        feed = Feed(self._uri("/feed"))
+        self.assertTrue(feed.parse())
+        self.assertEqual(feed.name, "Test Feed")
+        self.assertEqual([s["title"] for s in feed], ["Episode 1"])
+
+        self.assertFalse(feed.parse())
+        self.assertEqual(len(feed), 1)
+        headers = self.server.requests[-1][1]
+        self.assertEqual(headers.get("if-none-match"), '"1"')
+
+    def test_merge(self):
+        self.server.feeds["/feed"] = [1, 2]
+        feed = Feed(self._uri("/feed"))
+        self.assertTrue(feed.parse())
+        old = feed[1]
+        self.server.feeds["/feed"] = [2, 3]
+        self.assertTrue(feed.parse())
+        self.assertEqual([s["title"] for s in feed],
+                         ["Episode 3", "Episode 2"])
+        self.assertTrue(feed[1] is old)
+
+    def test_backoff(self):
+        feed = Feed(self._uri("/missing"))
+        self.assertTrue(feed.needs_update())
+        self.assertFalse(feed.parse())
+        self.assertFalse(feed.needs_update())
+
+        feed.update(None)
+        feed._Feed__lasttry -= Feed.CHECK_INTERVAL * 3
+        self.assertFalse(feed.needs_update())
+        feed._Feed__lasttry -= Feed.CHECK_INTERVAL
+        self.assertTrue(feed.needs_update())
+
+        self.server.feeds["/missing"] = [1]
+        self.assertTrue(feed.parse())
+        self.assertFalse(feed.needs_update())
+
+    def test_pickle_check_state(self):
+        self.server.feeds["/feed"] = [1]
+        feed = Feed(self._uri("/feed"))
+        self.assertTrue(feed.parse())
+        feed.update(None)
+
+        feed = pickle.loads(pickle.dumps(feed, pickle.HIGHEST_PROTOCOL))
+        self.assertFalse(feed.needs_update())
+        self.assertFalse(feed.parse())
+        headers = self.server.requests[-1][1]
+        self.assertEqual(headers.get("if-none-match"), '"1"')
+
+    def test_update_feeds(self):
+        paths = ["/%d" % i for i in xrange(10)]
+        for path in paths[:5]:
+            self.server.feeds[path] = [1]
+        feeds = [Feed(self._uri(p)) for p in paths]
+
+        result = []
+        update_feeds(feeds, result.append, max_fetches=3)
+        timeout = time.time() + 10
+        while not result and time.time() < timeout:
+            Gtk.main_iteration_do(False)
+        self.assertEqual(len(result), 1)
+        self.assertEqual(sorted(f.uri for f in result[0]),
+                         sorted(f.uri for f in feeds[:5]))
+        self.assertEqual(len(self.server.requests), 10)
+
+    def test_update_feeds_empty(self):
+        result = []
+        update_feeds([], result.append)
+        self.assertEqual(result, [[]])
@@ -1,9 +1,19 @@
 # -*- coding: utf-8 -*-
-from tests import TestCase
+import bz2
+import os
+import shutil
+import urllib
+from StringIO import StringIO
+
+from gi.repository import Gio, Gtk
+
+from tests import TestCase, mkstemp, mkdtemp
 
 from quodlibet.library import SongLibrary
 from quodlibet.formats._audio import AudioFile
-from quodlibet.browsers.iradio import InternetRadio, IRFile, QuestionBar
+from quodlibet.browsers import iradio
+from quodlibet.browsers.iradio import InternetRadio, IRFile, QuestionBar, \
+    parse_taglist, iter_bz2_lines, download_taglist
 import quodlibet.config
 
 quodlibet.config.RATINGS = quodlibet.config.HardCodedRatingsPrefs()
@@ -30,6 +40,115 @@ class TInternetRadio(TestCase):
         quodlibet.config.quit()
 
 
+class TInternetRadioStations(TestCase):
+
+    def setUp(self):
+        quodlibet.config.init()
+        self.dir = mkdtemp()
+        self._files = iradio.STATIONS_ALL, iradio.STATIONS_FAV
+        iradio.STATIONS_ALL = os.path.join(self.dir, "stations_all")
+        iradio.STATIONS_FAV = os.path.join(self.dir, "stations")
+
+        stations = SongLibrary()
+        for uri, genre, website in [("http://a", u"Rock", u"a.example"),
+                                    ("http://b", u"Jazz", u"b.example"),
+                                    ("http://c", u"Rock", u"c.example")]:
+            station = IRFile(uri)
+            station["genre"] = genre
+            station["website"] = website
+            stations.add([station])
+        stations.save(iradio.STATIONS_ALL)
+        stations.destroy()
+
+        self.bar = InternetRadio(SongLibrary())
+
+    def tearDown(self):
+        self.bar.destroy()
+        iradio.STATIONS_ALL, iradio.STATIONS_FAV = self._files
+        shutil.rmtree(self.dir)
+        quodlibet.config.quit()
+
+    def _filter(self, text):
+        selected = []
+
+        def songs_selected(bar, songs, is_sorted):
+            selected[:] = songs
+
+        sig = self.bar.connect("songs-selected", songs_selected)
+        self.bar.filter_text(text)
+        self.bar.disconnect(sig)
+        return sorted(s.key for s in selected)
+
+    def test_filter_loaded(self):
+        self.assertEqual(self._filter(u"rock"), ["http://a", "http://c"])
+        self.assertEqual(self._filter(u"b.example"), ["http://b"])
+        self.assertEqual(self._filter(u"genre=jazz"), ["http://b"])
+        self.assertEqual(self._filter(u""),
+                         ["http://a", "http://b", "http://c"])
+
+
+class Tparse_taglist(TestCase):
+
+    DATA = ("uri=http://a\ntitle=A\ngenre=x\n~listenerpeak=42\n"
+            "uri=http://b\norganization=B")
+
+    def test_main(self):
+        a, b = parse_taglist(self.DATA)
+        self.assertEqual(a.key, "http://a")
+        self.assertEqual(a("genre"), u"x")
+        self.assertEqual(a("~#listenerpeak"), 42)
+        self.assertEqual(b("title"), u"B")
+        self.assertEqual(parse_taglist(""), [])
+
+    def test_bz2_lines(self):
+        fileobj = StringIO(bz2.compress(self.DATA))
+        read = []
+        lines = list(iter_bz2_lines(fileobj, 7, read.append))
+        self.assertEqual(lines, self.DATA.split("\n"))
+        self.assertEqual(read[-1], len(fileobj.getvalue()))
+        self.assertEqual(len(read), (read[-1] + 6) // 7)
+
+    def test_bz2_lines_invalid(self):
+        fileobj = StringIO("foobar")
+        self.assertRaises(IOError, list, iter_bz2_lines(fileobj))
+
+
+class Tdownload_taglist(TestCase):
+
+    def setUp(self):
+        fd, self.filename = mkstemp()
+        os.write(fd, bz2.compress(Tparse_taglist.DATA))
+        os.close(fd)
+        self._url = iradio.STATION_LIST_URL
+        iradio.STATION_LIST_URL = "file:" + urllib.pathname2url(self.filename)
+
+    def tearDown(self):
+        iradio.STATION_LIST_URL = self._url
+        os.unlink(self.filename)
+
+    def _download(self, cancellable):
+        stations = []
+        done = []
+        finished = []
+        download_taglist(stations.extend, done.append, cancellable,
+                         finished_callback=lambda: finished.append(True))
+        while not finished:
+            Gtk.main_iteration_do(True)
+        while Gtk.events_pending():
+            Gtk.main_iteration_do(True)
+        return stations, done
+
+    def test_main(self):
+        stations, done = self._download(Gio.Cancellable())
+        self.assertEqual([s.key for s in stations], ["http://a", "http://b"])
+        self.assertEqual(done, [True])
+
+    def test_cancelled(self):
+        cancellable = Gio.Cancellable()
+        cancellable.cancel()
+        self.assertEqual(self._download(cancellable), ([], []))
+
+
 class TIRFile(TestCase):
     def setUp(self):
         self.s = IRFile("http://foo.bar")
@@ -491,6 +491,27 @@ class TPaneModel(TestCase):
         self.assertNotEqual(length, len(m))
         self.assertEqual(len(m), 0)
 
+    def test_remove_songs_touch_affected(self):
+        conf = PaneConfig("artist")
+        m = PaneModel(conf)
+        m.add_songs(SONGS)
+        changed = []
+        m.connect("row-changed", lambda m, path, iter_: changed.append(
+            m.get_value(iter_)))
+
+        song = SONGS[0]
+        entries = [e for e in m.itervalues() if song in e.songs]
+        m.remove_songs([song], False)
+        self.assertEqual(changed, entries)
+
+        del changed[:]
+        length = len(m)
+        m.remove_songs([], True)
+        self.assertEqual(changed, [])
+        self.assertEqual(
+            len(m), length - len([e for e in entries if not e.songs]))
+        self._verify_model(m)
+
     def test_remove_steps(self):
         conf = PaneConfig("artist")
         m = PaneModel(conf)
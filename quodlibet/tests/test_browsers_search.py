@@ -122,3 +122,27 @@ class TEmptyBar(TestCase):
 
 class TSearchBar(TEmptyBar):
     Bar = SearchBar
+
+    def test_songs_added(self):
+        self.bar._search.DURATION = 0
+        self.bar._search.STEP = 2
+        self.bar.disconnect_by_func(self._expected)
+        events = []
+        songs = []
+
+        def selected(bar, selected, sort):
+            events.append(("selected", len(selected)))
+            songs.extend(selected)
+
+        def added(bar, added):
+            events.append(("added", len(added)))
+            songs.extend(added)
+
+        self.bar.connect("songs-selected", selected)
+        self.bar.connect("songs-added", added)
+        self.bar.filter_text("")
+        self.expected = None
+        self._do()
+        self.assertEqual(
+            events, [("selected", 2), ("added", 2), ("added", 1)])
+        self.assertEqual(sorted(songs), sorted(SONGS))
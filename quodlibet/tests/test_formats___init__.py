@@ -8,6 +8,7 @@
 import sys
 import os
 import pickle
+import threading
 
 from tests import TestCase, DATA_DIR
 from helper import capture_output, temp_filename
@@ -20,6 +21,7 @@ from quodlibet import config
 class TFormats(TestCase):
     def setUp(self):
         config.init()
+        formats.init()
 
     def tearDown(self):
         config.quit()
@@ -43,6 +45,13 @@ class TFormats(TestCase):
     def test_infos(self):
         self.failUnless(formats._infos[".mp3"] is formats.mp3.MP3File)
 
+    def test_module_extensions(self):
+        for name, exts in formats.MODULE_EXTENSIONS.items():
+            module = getattr(formats, name)
+            self.assertTrue(set(module.extensions) <= set(exts), msg=name)
+            for ext in module.extensions:
+                self.assertTrue(formats.filter("foo" + ext))
+
     def test_migration(self):
         self.failUnless(formats.mp3 is sys.modules["quodlibet.formats.mp3"])
         self.failUnless(formats.mp3 is sys.modules["quodlibet/formats/mp3"])
@@ -51,6 +60,29 @@ class TFormats(TestCase):
         self.failUnless(formats.xiph is sys.modules["formats.flac"])
         self.failUnless(formats.xiph is sys.modules["formats.oggvorbis"])
 
+    def test_load_module_threads(self):
+        # forget the wav module, then load it from many threads at once
+        module = formats._loaded.pop("wav")
+        formats._infos.pop(".wav")
+        formats.types[:] = [t for t in formats.types if t not in module.types]
+        for type_ in module.types:
+            formats.names.remove(type_.format)
+
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(formats._get_info(".wav")))
+            for i in xrange(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [module.info] * 8)
+        for type_ in module.types:
+            self.assertEqual(formats.types.count(type_), 1)
+            self.assertEqual(formats.names.count(type_.format), 1)
+
     def test_filter(self):
         self.assertTrue(formats.filter("foo.mp3"))
         self.assertFalse(formats.filter("foo.doc"))
@@ -98,6 +130,9 @@ class TPickle(TestCase):
         b'\x01(cquodlibet.formats.remote\nRemoteFile\nqKh\x03}qLtqMRqNh\x01(cq'
         b'uodlibet.formats.mod\nModFile\nqOh\x03}qPtqQRqRe.')
 
+    def setUp(self):
+        formats.init()
+
     def test_pickle(self):
         types = formats.types
         instances = []
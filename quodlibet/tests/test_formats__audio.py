@@ -515,6 +515,20 @@ class TAudioFile(TestCase):
             f(bar_1_2)
             f(bar_2_1)
 
+    def test_sort_func_cache(self):
+        song = AudioFile({"artist": u"B", "title": u"Foo 2"})
+        func = AudioFile.sort_by_func("~artist~title")
+        value = func(song)
+        self.failUnless(func(song) is value)
+        song["title"] = u"Foo 10"
+        self.failIfEqual(func(song), value)
+        value = func(song)
+        del song["artist"]
+        self.failIfEqual(func(song), value)
+        self.failUnlessEqual(
+            func(song), AudioFile.sort_by_func(lambda s: s("~artist~title"))(
+                song))
+
     def test_uri(self):
         # On windows where we have unicode paths (windows encoding is utf-16)
         # we need to encode to utf-8 first, then escape.
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as
+# published by the Free Software Foundation
+
+import os
+import pickle
+
+from tests import TestCase
+from helper import temp_filename
+
+from quodlibet.formats._audio import AudioFile
+from quodlibet.query import Query
+from quodlibet.library.columnar import dump_columns, load_columns, \
+    is_columnar, materialize
+from quodlibet.library.libraries import LibraryJournal, dump_items
+
+
+def get_songs(count=10):
+    songs = []
+    for i in range(count):
+        song = AudioFile({
+            "~filename": "/dir/%d.ogg" % i,
+            "~mountpoint": "/",
+            "title": u"Title \xe4 %d" % i,
+            "artist": u"Artist %d" % (i % 3),
+            "~#rating": 0.25 * (i % 5),
+            "~#playcount": i,
+            "~#added": 2 ** 40 + i,
+        })
+        if i % 2:
+            song["album"] = u"Album"
+        songs.append(song)
+    return songs
+
+
+class TColumnar(TestCase):
+
+    def test_roundtrip(self):
+        songs = get_songs()
+        with temp_filename() as filename:
+            dump_columns(filename, songs)
+            self.assertTrue(is_columnar(filename))
+            loaded = load_columns(filename)
+
+        self.assertEqual(len(loaded), len(songs))
+        for song, other in zip(songs, loaded):
+            self.assertTrue(type(other) is AudioFile)
+            self.assertEqual(dict(song), dict(other))
+            for key, value in song.iteritems():
+                self.assertTrue(type(other[key]) is type(value))
+
+    def test_values_shared(self):
+        with temp_filename() as filename:
+            dump_columns(filename, get_songs())
+            loaded = load_columns(filename)
+        self.assertTrue(loaded[0]["artist"] is loaded[3]["artist"])
+
+    def test_empty(self):
+        with temp_filename() as filename:
+            dump_columns(filename, [])
+            self.assertEqual(load_columns(filename), [])
+
+    def test_not_columnar(self):
+        with temp_filename() as filename:
+            dump_items(filename, get_songs())
+            self.assertFalse(is_columnar(filename))
+            self.assertEqual(load_columns(filename, default=42), 42)
+            os.remove(filename + ".not-valid")
+
+    def test_lazy(self):
+        songs = get_songs()
+        with temp_filename() as filename:
+            dump_columns(filename, songs)
+            loaded = load_columns(filename, lazy=True)
+
+        first = loaded[0]
+        self.assertFalse(type(first) is AudioFile)
+        self.assertTrue(isinstance(first, AudioFile))
+        self.assertEqual(first.key, "/dir/0.ogg")
+        self.assertEqual(first.mountpoint, "/")
+        self.assertFalse(type(first) is AudioFile)
+
+        self.assertEqual(first("title"), u"Title \xe4 0")
+        self.assertTrue(type(first) is AudioFile)
+        self.assertEqual(dict(first), dict(songs[0]))
+
+        self.assertEqual(len(loaded[1]), len(songs[1]))
+        self.assertTrue(type(loaded[1]) is AudioFile)
+
+        for step in materialize(loaded):
+            pass
+        for song, other in zip(songs, loaded):
+            self.assertTrue(type(other) is AudioFile)
+            self.assertEqual(dict(song), dict(other))
+
+    def test_lazy_bound_method(self):
+        with temp_filename() as filename:
+            dump_columns(filename, get_songs())
+            loaded = load_columns(filename, lazy=True)
+
+        song = loaded[0]
+        get = song.get
+        self.assertEqual(get("artist"), u"Artist 0")
+        self.assertTrue(type(song) is AudioFile)
+        self.assertEqual(get("title"), u"Title \xe4 0")
+        self.assertEqual(loaded[1].get("album"), u"Album")
+
+    def test_lazy_query(self):
+        songs = get_songs()
+        with temp_filename() as filename:
+            dump_columns(filename, songs)
+            for text in [u"artist=1", u"&(album=album, artist=1)",
+                         u"artist,title=2", u"#(playcount > 2)"]:
+                loaded = load_columns(filename, lazy=True)
+                search = Query(text).search
+                self.assertEqual(
+                    [s.key for s in loaded if search(s)],
+                    [s.key for s in songs if search(s)])
+
+    def test_lazy_pickle(self):
+        with temp_filename() as filename:
+            dump_columns(filename, get_songs())
+            loaded = load_columns(filename, lazy=True)
+        song = pickle.loads(pickle.dumps(loaded[2], 1))
+        self.assertEqual(song("title"), u"Title \xe4 2")
+        self.assertTrue(type(song) is AudioFile)
+
+    def test_journal(self):
+        songs = get_songs()
+        with temp_filename() as filename:
+            journal = LibraryJournal(filename, columnar=True)
+            journal.dump_snapshot(songs)
+            self.assertTrue(is_columnar(filename))
+            songs[0]["title"] = u"changed"
+            journal.append([songs[0]], [songs[1].key])
+            journal.compact()
+            self.assertTrue(is_columnar(filename))
+            loaded = sorted(journal.load(lazy=True), key=lambda s: s.key)
+
+        self.assertEqual(len(loaded), len(songs) - 1)
+        self.assertEqual(loaded[0]("title"), u"changed")
@@ -7,10 +7,11 @@ from quodlibet import config
 from quodlibet.util import connect_obj
 from quodlibet.formats._audio import AudioFile
 
-from tests import TestCase, DATA_DIR, mkstemp
+from tests import TestCase, DATA_DIR, mkstemp, mkdtemp
 from helper import capture_output
 
 from quodlibet.library.libraries import *
+from quodlibet.library.manifest import ScanManifest
 
 
 class Fake(int):
@@ -270,6 +271,191 @@ class TPicklingMixin(TestCase):
             os.unlink(filename)
 
 
+class TLibraryJournal(TestCase):
+
+    def setUp(self):
+        fd, self.filename = mkstemp()
+        os.close(fd)
+        os.unlink(self.filename)
+        self.library = SongLibrary()
+        self.library.load(self.filename)
+
+    def tearDown(self):
+        self.library.destroy()
+        for suffix in ["", ".journal", ".journal.old"]:
+            if os.path.exists(self.filename + suffix):
+                os.unlink(self.filename + suffix)
+
+    def _reload(self):
+        library = SongLibrary()
+        library.load(self.filename)
+        contents = sorted(library.items())
+        library.destroy()
+        return contents
+
+    def test_first_save_full(self):
+        self.library.add(FSrange(10))
+        self.library.save()
+        self.failUnless(os.path.exists(self.filename))
+        self.failIf(os.path.exists(self.filename + ".journal"))
+        self.failUnlessEqual(self._reload(), sorted(self.library.items()))
+
+    def test_append(self):
+        self.library.add(FSrange(10))
+        self.library.save()
+        size = os.path.getsize(self.filename)
+
+        self.library.remove(FSrange(2))
+        self.library.add(FSrange(10, 12))
+        self.library.changed(FSrange(5, 7))
+        self.library.rename(self.library[8], 20)
+        self.failUnless(self.library.dirty)
+        self.library.save()
+        self.failIf(self.library.dirty)
+
+        self.failUnlessEqual(os.path.getsize(self.filename), size)
+        self.failUnless(os.path.exists(self.filename + ".journal"))
+        self.failUnlessEqual(self._reload(), sorted(self.library.items()))
+
+    def test_compact(self):
+        self.library.add(FSrange(10))
+        self.library.save()
+        self.library.remove(FSrange(3))
+        self.library.save()
+        self.library.add(FSrange(20, 25))
+        self.library.save()
+
+        journal = LibraryJournal(self.filename)
+        journal.compact()
+        self.failIf(os.path.exists(self.filename + ".journal"))
+        self.failIf(os.path.exists(self.filename + ".journal.old"))
+        self.failUnlessEqual(
+            sorted(i.key for i in load_items(self.filename)),
+            sorted(self.library.keys()))
+
+    def test_compact_interrupted(self):
+        self.library.add(FSrange(10))
+        self.library.save()
+        self.library.remove(FSrange(3))
+        self.library.save()
+        os.rename(self.filename + ".journal",
+                  self.filename + ".journal.old")
+        self.library.remove(FSrange(3, 5))
+        self.library.save()
+        self.failUnlessEqual(self._reload(), sorted(self.library.items()))
+
+        LibraryJournal(self.filename).compact()
+        self.failUnlessEqual(self._reload(), sorted(self.library.items()))
+
+    def test_truncated_record(self):
+        self.library.add(FSrange(10))
+        self.library.save()
+        self.library.remove(FSrange(3))
+        self.library.save()
+        expected = sorted(self.library.items())
+        with open(self.filename + ".journal", "ab") as h:
+            h.write("(lp1\n")
+        self.failUnlessEqual(self._reload(), expected)
+
+    def test_save_after_truncated_record(self):
+        self.library.add(FSrange(10))
+        self.library.save()
+        self.library.remove(FSrange(3))
+        self.library.save()
+        self.library.destroy()
+        with open(self.filename + ".journal", "ab") as h:
+            h.write("garbage\n")
+
+        self.library = SongLibrary()
+        self.library.load(self.filename)
+        self.library.remove(FSrange(3, 5))
+        self.library.add(FSrange(20, 22))
+        self.library.save()
+        self.failUnlessEqual(self._reload(), sorted(self.library.items()))
+        self.failUnlessEqual(
+            sorted(self.library.keys()), range(5, 10) + [20, 21])
+
+    def test_last_save(self):
+        self.failUnlessEqual(self.library.last_save, 0)
+        self.library.add(FSrange(10))
+        self.library.save()
+        first = self.library.last_save
+        self.failUnless(first > 0)
+
+        self.library.last_save = 0
+        self.library.remove(FSrange(3))
+        self.library.save()
+        self.failUnless(os.path.exists(self.filename + ".journal"))
+        self.failUnless(self.library.last_save >= first)
+
+    def _save_async(self, count=1):
+        results = []
+        for i in xrange(count):
+            self.library.save_async(
+                lambda library, success: results.append(success))
+        while len(results) < count:
+            Gtk.main_iteration()
+        return results
+
+    def test_save_async(self):
+        self.library.add(FSrange(10))
+        self.failUnlessEqual(self._save_async(), [True])
+        self.failIf(self.library.dirty)
+        self.failIf(os.path.exists(self.filename + ".journal"))
+        self.failUnlessEqual(self._reload(), sorted(self.library.items()))
+
+        self.library.remove(FSrange(3))
+        self.library.changed(FSrange(5, 7))
+        self.failUnlessEqual(self._save_async(), [True])
+        self.failUnless(os.path.exists(self.filename + ".journal"))
+        self.failUnlessEqual(self._reload(), sorted(self.library.items()))
+
+    def test_save_async_coalesce(self):
+        self.library.add(FSrange(10))
+        self.library.save()
+        self.library.remove(FSrange(3))
+        self.failUnlessEqual(self._save_async(3), [True] * 3)
+        self.failUnlessEqual(self._reload(), sorted(self.library.items()))
+
+    def test_save_async_changed_while_saving(self):
+        self.library.add(FSrange(10))
+        self.library.save()
+        self.library.remove(FSrange(3))
+        results = []
+        self.library.save_async(lambda *args: results.append(args))
+        self.library.remove(FSrange(3, 5))
+        while not results:
+            Gtk.main_iteration()
+        self.failUnless(self.library.dirty)
+        self.library.save()
+        self.failUnlessEqual(self._reload(), sorted(self.library.items()))
+
+    def test_save_async_copies(self):
+        song = AudioFile({"~filename": "/dir/a.ogg", "title": u"foo"})
+        song.some_attribute = 42
+        copy = copy_item(song)
+        self.failIf(copy is song)
+        self.failUnless(type(copy) is AudioFile)
+        self.failUnlessEqual(dict(copy), dict(song))
+        self.failUnlessEqual(copy.some_attribute, 42)
+        song["title"] = u"bar"
+        self.failUnlessEqual(copy["title"], u"foo")
+
+    def test_save_other_filename(self):
+        self.library.add(FSrange(10))
+        self.library.save()
+        self.library.remove(FSrange(3))
+
+        fd, filename = mkstemp()
+        os.close(fd)
+        try:
+            self.library.save(filename)
+            self.failIf(os.path.exists(filename + ".journal"))
+            self.failUnlessEqual(len(load_items(filename)), 7)
+        finally:
+            os.unlink(filename)
+
+
 class TSongLibrary(TLibrary):
     Fake = FakeSong
     Frange = staticmethod(FSrange)
@@ -473,6 +659,165 @@ class TSongFileLibrary(TSongLibrary):
         finally:
             config.quit()
 
+    def test_scan(self):
+        config.init()
+        dirname = mkdtemp()
+        try:
+            os.mkdir(os.path.join(dirname, "sub"))
+            names = ["a.flac", "b.flac", os.path.join("sub", "c.flac")]
+            for name in names:
+                shutil.copy(os.path.join(DATA_DIR, "empty.flac"),
+                            os.path.join(dirname, name))
+            with open(os.path.join(dirname, "cover.jpg"), "wb"):
+                pass
+            if hasattr(os, "symlink"):
+                os.symlink(os.path.join(dirname, "a.flac"),
+                           os.path.join(dirname, "sub", "link.flac"))
+
+            self.library.scan_threads = 2
+            for step in self.library.scan([dirname]):
+                pass
+            expected = [os.path.realpath(os.path.join(dirname, n))
+                        for n in names]
+            self.failUnlessEqual(sorted(self.library.keys()), sorted(expected))
+            self.failUnlessEqual(len(self.added), 3)
+
+            for step in self.library.scan([dirname]):
+                pass
+            self.failUnlessEqual(len(self.added), 3)
+        finally:
+            shutil.rmtree(dirname)
+            config.quit()
+
+    def test_scan_manifest(self):
+        config.init()
+        dirname = mkdtemp()
+        try:
+            for name in ["a.flac", "b.flac"]:
+                shutil.copy(os.path.join(DATA_DIR, "empty.flac"),
+                            os.path.join(dirname, name))
+            stat = os.stat(dirname)
+            os.utime(dirname, (stat.st_atime, stat.st_mtime - 10))
+            for step in self.library.scan([dirname]):
+                pass
+            self.failUnlessEqual(len(self.library), 2)
+            realdir = os.path.realpath(dirname)
+            self.failUnless(self.library.scan_manifest.is_current(realdir))
+
+            # removed songs get found again
+            self.library.remove([self.library.values()[0]])
+            self.failIf(self.library.scan_manifest.is_current(realdir))
+            for step in self.library.scan([realdir]):
+                pass
+            self.failUnlessEqual(len(self.library), 2)
+
+            # nothing changed, so nothing gets loaded
+            self.library.add_filename = None
+            for step in self.library.scan([realdir]):
+                pass
+        finally:
+            shutil.rmtree(dirname)
+            config.quit()
+
+    def test_scan_manifest_saved_with_library(self):
+        config.init()
+        dirname = mkdtemp()
+        try:
+            music = os.path.join(dirname, "music")
+            os.mkdir(music)
+            shutil.copy(os.path.join(DATA_DIR, "empty.flac"),
+                        os.path.join(music, "a.flac"))
+            stat = os.stat(music)
+            os.utime(music, (stat.st_atime, stat.st_mtime - 10))
+
+            filename = os.path.join(dirname, "library")
+            self.library.load(filename)
+            for step in self.library.scan([music]):
+                pass
+            self.failUnlessEqual(len(self.library), 1)
+            self.failIf(os.path.exists(filename + ".dirs"))
+
+            self.library.save()
+            manifest = ScanManifest(filename + ".dirs")
+            self.failUnless(manifest.is_current(os.path.realpath(music)))
+        finally:
+            shutil.rmtree(dirname)
+            config.quit()
+
+    def test_scan_manifest_saved_after_noop_scan(self):
+        config.init()
+        dirname = mkdtemp()
+        try:
+            music = os.path.join(dirname, "music")
+            os.mkdir(music)
+            shutil.copy(os.path.join(DATA_DIR, "empty.flac"),
+                        os.path.join(music, "a.flac"))
+            stat = os.stat(music)
+            os.utime(music, (stat.st_atime, stat.st_mtime - 10))
+
+            filename = os.path.join(dirname, "library")
+            self.library.load(filename)
+            for step in self.library.scan([music]):
+                pass
+            self.library.save()
+            os.remove(filename + ".dirs")
+
+            # nothing new gets added, but the manifest still needs saving
+            for step in self.library.scan([music], force=True):
+                pass
+            self.failUnlessEqual(len(self.library), 1)
+            self.failUnless(self.library.dirty)
+            self.library.save()
+            manifest = ScanManifest(filename + ".dirs")
+            self.failUnless(manifest.is_current(os.path.realpath(music)))
+        finally:
+            shutil.rmtree(dirname)
+            config.quit()
+
+    def test_scan_manifest_failed_symlinked_top(self):
+        if not hasattr(os, "symlink"):
+            return
+
+        config.init()
+        dirname = mkdtemp()
+        try:
+            music = os.path.join(dirname, "music")
+            os.mkdir(music)
+            shutil.copy(os.path.join(DATA_DIR, "empty.flac"),
+                        os.path.join(music, "a.flac"))
+            with open(os.path.join(music, "broken.flac"), "wb"):
+                pass
+            stat = os.stat(music)
+            os.utime(music, (stat.st_atime, stat.st_mtime - 10))
+            link = os.path.join(dirname, "link")
+            os.symlink(music, link)
+
+            for step in self.library.scan([link]):
+                pass
+            self.failUnlessEqual(len(self.library), 1)
+            # the broken file gets tried again on the next scan
+            manifest = self.library.scan_manifest
+            self.failIf(manifest.is_current(os.path.realpath(music)))
+        finally:
+            shutil.rmtree(dirname)
+            config.quit()
+
+    def test_scan_stop(self):
+        config.init()
+        dirname = mkdtemp()
+        try:
+            for i in xrange(10):
+                shutil.copy(os.path.join(DATA_DIR, "empty.flac"),
+                            os.path.join(dirname, "%d.flac" % i))
+            self.library.scan_threads = 1
+            scan = self.library.scan([dirname])
+            scan.next()
+            scan.close()
+            self.failUnless(len(self.library) < 10)
+        finally:
+            shutil.rmtree(dirname)
+            config.quit()
+
     def test_add_filename_normalize_path(self):
         if not os.name == "nt":
             return
@@ -631,6 +976,26 @@ class TAlbumLibrarySignals(TestCase):
         self.failUnlessEqual(self.received,
             ["added", "a_added", "changed", "a_changed"])
 
+    def test_change_album_key(self):
+        songs = [AlbumSong(1, "a1"), AlbumSong(2, "a1"), AlbumSong(4, "a2")]
+        self.lib.add(songs)
+        for song in songs[:2]:
+            song["album"] = song["labelid"] = "a2"
+        self.lib.changed(songs)
+        self.failUnlessEqual(self.received,
+            ["added", "a_added", "changed", "a_removed", "a_changed"])
+        self.failUnlessEqual(len(self.albums), 1)
+        album = self.albums.values()[0]
+        self.failUnlessEqual(album.songs, set(songs))
+
+        songs[0]["album"] = songs[0]["labelid"] = "a3"
+        self.lib.changed([songs[0]])
+        self.failUnlessEqual(self.received[-2:], ["a_changed", "a_added"])
+        self.failUnlessEqual(album.songs, set(songs[1:]))
+        self.lib.remove([songs[0]])
+        self.failUnlessEqual(self.received[-1], "a_removed")
+        self.failUnlessEqual(len(self.albums), 1)
+
     def tearDown(self):
         for s in self._asigs:
             self.albums.disconnect(s)
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as
+# published by the Free Software Foundation
+
+import os
+import shutil
+
+from tests import TestCase, mkdtemp
+from helper import capture_output
+
+from quodlibet.library import manifest
+from quodlibet.library.manifest import ScanManifest
+
+
+class TScanManifest(TestCase):
+
+    def setUp(self):
+        self.dir = os.path.realpath(mkdtemp())
+        os.makedirs(os.path.join(self.dir, "a", "b"))
+        os.makedirs(os.path.join(self.dir, "c"))
+        for name in ["1.ogg", os.path.join("a", "2.ogg"),
+                     os.path.join("a", "b", "3.ogg")]:
+            open(os.path.join(self.dir, name), "wb").close()
+        self.filename = os.path.join(self.dir, "manifest")
+        self._racy = manifest.RACY_SECONDS
+        # everything in here was just created
+        manifest.RACY_SECONDS = -1
+
+    def tearDown(self):
+        manifest.RACY_SECONDS = self._racy
+        shutil.rmtree(self.dir)
+
+    def _walk(self, m, **kwargs):
+        result = {}
+        for path, filenames in m.walk(self.dir, **kwargs):
+            result[os.path.relpath(path, self.dir)] = sorted(filenames)
+        return result
+
+    def _touch(self, *names):
+        # make sure the directory modification time changes
+        path = os.path.join(self.dir, *names)
+        stat = os.stat(path)
+        os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+
+    def test_walk(self):
+        m = ScanManifest()
+        self.assertEqual(self._walk(m), {
+            ".": ["1.ogg"], "a": ["2.ogg"],
+            os.path.join("a", "b"): ["3.ogg"], "c": []})
+
+    def test_skip_unchanged(self):
+        m = ScanManifest()
+        self._walk(m)
+        m.commit()
+        self.assertEqual(len(m), 4)
+        self.assertEqual(self._walk(m), {})
+        self.assertTrue(m.is_current(os.path.join(self.dir, "a")))
+
+        self._touch("a", "b")
+        self.assertEqual(self._walk(m), {os.path.join("a", "b"): ["3.ogg"]})
+        self.assertFalse(m.is_current(os.path.join(self.dir, "a", "b")))
+        self.assertEqual(len(self._walk(m, force=True)), 4)
+
+    def test_not_committed(self):
+        m = ScanManifest()
+        self._walk(m)
+        m.discard()
+        m.commit()
+        self.assertEqual(len(self._walk(m)), 4)
+
+    def test_failed_and_invalidated(self):
+        m = ScanManifest()
+        self._walk(m)
+        m.invalidate(os.path.join(self.dir, "c"))
+        m.commit(failed=[os.path.join(self.dir, "a")])
+        self.assertEqual(sorted(self._walk(m)), ["a", "c"])
+        m.commit()
+        m.invalidate(os.path.join(self.dir, "c"))
+        self.assertEqual(sorted(self._walk(m)), ["c"])
+
+    def test_symlinked_top(self):
+        link = os.path.join(self.dir, "c", "link")
+        os.symlink(os.path.join(self.dir, "a"), link)
+        m = ScanManifest()
+        self.assertEqual(sorted(p for p, f in m.walk(link)),
+                         [link, os.path.join(link, "b")])
+        m.commit()
+        self.assertEqual(list(m.walk(link)), [])
+        self.assertTrue(m.is_current(os.path.join(self.dir, "a", "b")))
+
+        m.invalidate(os.path.join(self.dir, "a", "b"))
+        self.assertEqual([p for p, f in m.walk(link)],
+                         [os.path.join(link, "b")])
+
+    def test_racy(self):
+        manifest.RACY_SECONDS = 60
+        m = ScanManifest()
+        self._walk(m)
+        m.commit()
+        self.assertEqual(len(m), 0)
+
+    def test_exclude(self):
+        m = ScanManifest()
+        m.set_exclude([])
+        self._walk(m)
+        m.commit()
+        self.assertEqual(self._walk(m), {})
+        m.set_exclude(["/foo"])
+        self.assertEqual(len(self._walk(m)), 4)
+
+    def test_save_load(self):
+        m = ScanManifest(self.filename)
+        self._walk(m)
+        m.commit()
+        self.assertTrue(m.dirty)
+        m.save()
+        self.assertFalse(m.dirty)
+        self._touch()
+
+        m = ScanManifest(self.filename)
+        self.assertEqual(len(m), 4)
+        self.assertEqual(sorted(self._walk(m)), ["."])
+
+    def test_load_broken(self):
+        with open(self.filename, "wb") as h:
+            h.write("nope")
+        m = ScanManifest(self.filename)
+        with capture_output():
+            self.assertEqual(len(m), 0)
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as
+# published by the Free Software Foundation
+
+from tests import TestCase
+
+from quodlibet.formats._audio import AudioFile
+from quodlibet.library.libraries import SongLibrary
+
+
+def get_songs():
+    return [
+        AudioFile({"~filename": "/a.ogg", "artist": u"A\nB", "genre": u"x"}),
+        AudioFile({"~filename": "/b.ogg", "artist": u"B"}),
+        AudioFile({"~filename": "/c.ogg", "artist": u"C\nC"}),
+    ]
+
+
+class TTagValueIndex(TestCase):
+
+    def setUp(self):
+        self.library = SongLibrary()
+        self.songs = get_songs()
+        self.library.add(self.songs)
+        self.index = self.library.tag_value_index
+
+    def tearDown(self):
+        self.library.destroy()
+
+    def test_values(self):
+        self.assertEqual(
+            sorted(self.library.tag_values("artist")), [u"A", u"B", u"C"])
+        self.assertEqual(self.library.tag_values("foo"), [])
+        self.assertEqual(self.index._values["artist"].counts,
+                         {u"A": 1, u"B": 2, u"C": 1})
+
+    def test_names(self):
+        self.assertEqual(sorted(self.library.tag_names()),
+                         ["artist", "genre", "~filename"])
+
+    def test_signals(self):
+        self.library.tag_values("artist")
+        self.library.tag_names()
+
+        song = self.songs[0]
+        song["artist"] = u"D"
+        del song["genre"]
+        self.library.changed([song])
+        self.assertEqual(
+            sorted(self.library.tag_values("artist")), [u"B", u"C", u"D"])
+        self.assertEqual(sorted(self.library.tag_names()),
+                         ["artist", "~filename"])
+
+        self.library.remove(self.songs[1:])
+        self.assertEqual(self.library.tag_values("artist"), [u"D"])
+
+        song = AudioFile({"~filename": "/d.ogg", "album": u"E"})
+        self.library.add([song])
+        self.assertEqual(sorted(self.library.tag_names()),
+                         ["album", "artist", "~filename"])
+        self.assertEqual(self.library.tag_values("album"), [u"E"])
+
+    def test_load_init(self):
+        self.library.tag_values("artist")
+        song = AudioFile({"~filename": "/x.ogg", "artist": u"X"})
+        self.library._load_init([song])
+        self.assertEqual(sorted(self.library.tag_values("artist")),
+                         [u"A", u"B", u"C", u"X"])
+
+    def test_volatile(self):
+        self.assertEqual(self.library.tag_values("~playlists"), [])
+        self.assertFalse(self.index._values)
@@ -82,6 +82,7 @@ tags = ['album', 'arranger', 'artist', 'author', 'comment', 'composer',
 'tracknumber', 'version', 'xyzzy_undefined_tag', 'musicbrainz_trackid',
 'releasecountry']
 
+formats.init()
 for ext in formats._infos.keys():
     if os.path.exists(TestMetaData.base + ext):
 
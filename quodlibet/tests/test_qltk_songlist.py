@@ -165,6 +165,26 @@ class TSongList(TestCase):
 
         self.assertEqual(self.songlist.get_songs(), [song] * 4)
 
+    def test_add_songs_sorted_position(self):
+        def song(i, artist, title):
+            return AudioFile({"~filename": fsnative(u"/%d" % i),
+                              "artist": artist, "title": title})
+
+        data = [(u"b", u"x"), (u"a", u"y"), (u"b", u"y"), (u"c", u"x"),
+                (u"a", u"x"), (u"c", u"z"), (u"b", u"z"), (u"a", u"z")]
+        songs = [song(i, *d) for i, d in enumerate(data)]
+
+        self.songlist.set_column_headers(["artist", "title"])
+        self.songlist.set_sort_orders([("title", False), ("artist", True)])
+        self.songlist.set_songs(songs[::2])
+        self.songlist.add_songs(songs[1::2])
+
+        expected = list(songs)
+        self.songlist._sort_songs(expected)
+        self.assertEqual(self.songlist.get_songs(), expected)
+        self.assertEqual(
+            [s("artist") for s in expected][:3], [u"c", u"c", u"b"])
+
     def test_header_menu(self):
         from quodlibet import browsers
         from quodlibet.library import SongLibrary, SongLibrarian
@@ -140,6 +140,39 @@ class TPlaylistModel(TestCase):
         self.assert_(songs.count(r2) > songs.count(r1))
         self.assert_(songs.count(r3) > songs.count(r2))
 
+    def test_shuffle_previous(self):
+        self.pl.order = ORDERS[1](self.pl)
+        self.pl.next()
+        first = self.pl.current
+        self.pl.next()
+        second = self.pl.current
+        self.pl.next()
+        self.pl.previous()
+        self.assertEqual(self.pl.current, second)
+        # the third one is available again
+        numbers = [self.pl.current for i in range(8)
+                   if self.pl.next() or True]
+        self.assertEqual(sorted(numbers + [first, second]), range(10))
+        self.pl.next()
+        self.assertEqual(self.pl.current, None)
+
+    def test_weighted_rating_changed(self):
+        self.pl.order = ORDERS[2](self.pl)
+        songs = [AudioFile({'~#rating': r}) for r in [0, 1.0, 0]]
+        self.pl.set(songs)
+        Gtk.main_iteration_do(False)
+        picked = set(self.pl.current for i in range(20)
+                     if self.pl.next() or True)
+        self.assertEqual(picked, set([songs[1]]))
+
+        songs[1]['~#rating'] = 0
+        songs[2]['~#rating'] = 1.0
+        for row in self.pl:
+            self.pl.row_changed(row.path, row.iter)
+        picked = set(self.pl.current for i in range(20)
+                     if self.pl.next() or True)
+        self.assertEqual(picked, set([songs[2]]))
+
     def test_shuffle_repeat(self):
         self.pl.order = ORDERS[1](self.pl)
         self.pl.repeat = True
@@ -312,6 +312,26 @@ class TQuery(TestCase):
         self.assertEqual(
             q.filter(iter([self.s1, self.s2])), [self.s1, self.s2])
 
+    def test_narrows(self):
+        self.assertTrue(Query("foob").narrows(Query("foo")))
+        self.assertTrue(Query("bar Foo").narrows(Query("foo")))
+        self.assertTrue(Query("xfoox bar").narrows(Query("FOO bar")))
+        self.assertFalse(Query("bar").narrows(Query("foo bar")))
+        self.assertFalse(Query("foo").narrows(Query("foob")))
+        self.assertFalse(Query("foo").narrows(None))
+        self.assertFalse(Query("artist=foo").narrows(Query("foo")))
+        self.assertFalse(Query("foo").narrows(Query("artist=foo")))
+        self.assertFalse(
+            Query("foo", star=["artist"]).narrows(Query("foo")))
+        self.assertFalse(Query("foo", dumb_match_diacritics=False).narrows(
+            Query("foo")))
+
+        songs = [self.s1, self.s2, self.s3, self.s4]
+        for old, new in [("o", "oy"), ("e", "he r"), ("i", "ic pi")]:
+            self.assertTrue(Query(new).narrows(Query(old)))
+            self.assertEqual(Query(new).filter(Query(old).filter(songs)),
+                             Query(new).filter(songs))
+
     def test_match_all(self):
         self.failUnless(Query.match_all(""))
         self.failUnless(Query.match_all("    "))
@@ -347,6 +367,73 @@ class TQuery(TestCase):
         self.assertTrue(Query(u'Ångstrom').search(self.s4))
         self.assertFalse(Query(u'Ängström').search(self.s4))
 
+    def test_optimize_order(self):
+        query = Query("&(~playlists=foo, genre=/ja+zz/, #(added < 1 week))")
+        tags = [type(n) for n in query._match.res]
+        self.assertEqual(tags, [match.Numcmp, match.Tag, match.Tag])
+        self.assertTrue("~playlists" in query.explain().splitlines()[-1])
+
+        query = Query("|(~lyrics=foo, title=bar)")
+        self.assertTrue("title" in query.explain().splitlines()[1])
+
+    def test_optimize_substring(self):
+        song = self.AF({"title": u"Foo\nBär Baz", "artist": "piman"})
+        for text, result in [("title=baz", True), ("title=BAZ", True),
+                             ("title=/bär/c", False), ("title=\"Bär Baz\"c",
+                             True), ("title=\"foo\"", True),
+                             ("title=\"baz\"", False), ("title=qux", False),
+                             ("artist=PIMAN", True), ("artist=\"piman\"c",
+                             True), (u"title=&(foo, !baz)", False)]:
+            query = Query(text)
+            self.assertEqual(bool(query.search(song)), result, msg=text)
+            self.assertTrue("regex" not in query.explain(), msg=text)
+
+        self.assertTrue("regex" in Query("title=/fo+/").explain())
+        self.assertTrue("regex" in Query("title=/bär/").explain())
+
+    def test_optimize_substring_folding(self):
+        for text, value in [(u"title=ΣΊΣΥΦΟΣ", u"σίσυφος"),
+                            (u"title=/ΣΊΣΥΦΟΣ/", u"σίσυφος"),
+                            (u"title=/\u03bc-ziq/", u"\xb5-Ziq"),
+                            (u"title=/star/", u"\u017ftar"),
+                            (u"title=\"STAR\"", u"\u017ftar"),
+                            (u"title=/bär/", u"BÄR"),
+                            (u"title=/i/", u"\u0131")]:
+            song = self.AF({"title": value})
+            self.assertTrue(Query(text).search(song), msg=text)
+
+    def test_explain(self):
+        lines = Query("&(a=b, #(playcount > 2))").explain().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[0].startswith("Inter"))
+        self.assertTrue(lines[1].startswith("  "))
+        self.assertEqual(Query("").explain(), "True_ [cost=0.00, p=1.00]")
+
+    def test_compiled_matches_tree(self):
+        songs = [self.s1, self.s2, self.s3, self.s4, self.s5,
+                 self.AF({"~#playcount": 3, "~#skipcount": 1})]
+        for text in ["piman", "foo bar", "artist=piman", "!artist=mu",
+                     "|(artist=mu, album=/Test+s/)", "#(playcount > 2)",
+                     "&(#(playcount = 3), #(skipcount < 4))", "title=/^O/",
+                     "~people=mu", "~filename=/dir./", "filename=fo\xc3\xbc",
+                     "artist=&(piman, !mu)", "artist=|(!piman, mu)",
+                     "version=\"cake mix\"", "title=\"oh&blahhh\"c",
+                     "&(!artist=foo, !#(track > 10))", "a,b,t=ir",
+                     "#(track = 12)", u"\xc5ngstr\xf6m", "|()", "&()"]:
+            query = Query(text)
+            for song in songs:
+                self.assertEqual(bool(query.search(song)),
+                                 bool(query._match.search(song)),
+                                 msg="%s %r" % (text, song))
+
+    def test_compile_too_deep(self):
+        text = "&(x=1, |(y=2, " * 60 + "a=b" + "))" * 60
+        query = Query(text)
+        self.assertRaises(SyntaxError,
+                          match.QueryCompiler(query._match).compile)
+        self.assertTrue(query.search(self.AF({"x": "1", "artist": "b"})))
+        self.assertFalse(query.search(self.AF({"artist": "b"})))
+
     def test_match_diacriticals_invalid_or_unsupported(self):
         # these fall back to test dumb searches:
         # invalid regex
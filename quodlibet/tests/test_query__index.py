@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+from tests import TestCase
+
+from quodlibet.formats._audio import AudioFile
+from quodlibet.library.libraries import SongLibrary
+from quodlibet.query import Query
+
+
+QUERIES = [
+    u"beatles", u"Beatles Abbey", u"beat", u"abbey road", u"Björk",
+    u"bjork", u"BJÖRK", u"ö", u"it", u"artist=beatles",
+    u"artist=\"The Beatles\"", u"album=/^abbey/", u"title=/ro+d/",
+    u"|(björk, beatles)", u"&(beatles, !abbey)", u"!beatles",
+    u"#(tracknumber < 3)", u"&(#(tracknumber < 3), artist=beatles)",
+    u"~people=beatles", u"filename=/b\\.ogg/", u"genre=rock",
+    u"artist=|(beat, björk)", u"artist=&(the, beat)", u"/^the be/",
+    u"&(album=ab, title=come)", u"title=\"Jóga\"", u"~dirname=music",
+    u"something that does not exist",
+]
+
+
+def get_songs():
+    songs = []
+    data = [
+        (u"The Beatles", u"Abbey Road", u"Come Together", u"1"),
+        (u"The Beatles", u"Abbey Road", u"Something", u"2"),
+        (u"The Beatles", u"Let It Be", u"Dig It", u"5"),
+        (u"Björk", u"Homogenic", u"Jóga", u"2"),
+        (u"Bjork", u"Debut", u"Human Behaviour", u"1"),
+        (u"Beat Happening", u"Jamboree", u"Indian Summer", u"4"),
+    ]
+    for i, (artist, album, title, track) in enumerate(data):
+        song = AudioFile({
+            "~filename": "/music/%s.ogg" % "abcdef"[i],
+            "artist": artist,
+            "album": album,
+            "title": title,
+            "tracknumber": track,
+        })
+        if i % 2:
+            song["genre"] = u"Rock\nPop"
+        songs.append(song)
+    return songs
+
+
+class TTagIndex(TestCase):
+
+    def setUp(self):
+        self.library = SongLibrary()
+        self.library.add(get_songs())
+
+    def tearDown(self):
+        self.library.destroy()
+
+    def _check(self, text):
+        query = Query(text)
+        expected = filter(query.search, self.library.values())
+        result = query.filter(self.library)
+        self.assertEqual(
+            sorted(result, key=lambda s: s.key),
+            sorted(expected, key=lambda s: s.key), msg=text)
+
+    def test_matches_linear_search(self):
+        for text in QUERIES:
+            self._check(text)
+
+    def test_prunes(self):
+        candidates = Query(u"beatles abbey").candidates(
+            self.library.tag_index)
+        self.assertEqual(len(candidates), 2)
+        candidates = Query(u"björk").candidates(self.library.tag_index)
+        self.assertEqual(len(candidates), 2)
+        self.assertTrue(
+            Query(u"!beatles").candidates(self.library.tag_index) is None)
+        self.assertTrue(Query(u"#(tracknumber < 3)").candidates(
+            self.library.tag_index) is None)
+
+    def test_signals(self):
+        self._check(u"beatles")
+        songs = self.library.query(u"beatles")
+        self.assertEqual(len(songs), 3)
+
+        song = songs[0]
+        song["artist"] = u"The Rolling Stones"
+        self.library.changed([song])
+        self.assertEqual(len(self.library.query(u"beatles")), 2)
+        self.assertEqual(self.library.query(u"rolling"), [song])
+
+        self.library.remove([song])
+        self.assertEqual(self.library.query(u"rolling"), [])
+        self.library.add([song])
+        self.assertEqual(self.library.query(u"rolling"), [song])
+
+        for text in QUERIES:
+            self._check(text)
+
+    def test_case_folding(self):
+        songs = [AudioFile({"~filename": "/%d.ogg" % i, "title": t})
+                 for i, t in enumerate([
+                     u"σίσυφος", u"ΣΊΣΥΦΟΣ", u"\xb5-Ziq", u"\u03bc-ziq",
+                     u"\u017ftar", u"STAR", u"\u0131stanbul", u"Istanbul",
+                     u"\u1e9bun", u"\u03d0\u03b9\u03b2"])]
+        self.library.add(songs)
+        for text in [u"ΣΊΣΥΦΟΣ", u"title=ΣΊΣΥΦΟΣ", u"title=/ΣΊΣΥΦΟΣ/",
+                     u"σίσυφος", u"title=/σίσυφοσ/", u"artist=/\u03bc-ziq/",
+                     u"title=/\u03bc-ziq/", u"\xb5-ziq", u"title=/star/",
+                     u"title=\"STAR\"", u"\u017ftar", u"istanbul",
+                     u"title=/ISTANBUL/", u"\u1e61un", u"title=/\u03b2/"]:
+            query = Query(text)
+            found = filter(query.search, self.library.values())
+            candidates = query.prefilter(self.library)
+            self.assertTrue(set(found) <= set(candidates), msg=text)
+            self._check(text)
+
+        query = Query(u"title=/ΣΊΣΥΦΟΣ/")
+        self.assertEqual(len(query.filter(self.library)), 2)
+
+    def test_load_init(self):
+        self._check(u"beatles")
+        song = AudioFile({"~filename": "/x.ogg", "artist": u"The Beatles"})
+        self.library._load_init([song])
+        self.assertTrue(song in self.library.query(u"beatles"))
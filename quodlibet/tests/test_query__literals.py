@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+from tests import TestCase
+
+import re
+
+from quodlibet.query import Query
+from quodlibet.query._literals import normalize, required_literals, \
+    literal_string
+
+
+class TLiterals(TestCase):
+
+    def test_normalize(self):
+        self.assertEqual(normalize(u"ÄÖÜ Björk"), u"aou bjork")
+        self.assertEqual(normalize(u"abc"), u"abc")
+        self.assertEqual(normalize("abc"), u"abc")
+        self.assertEqual(normalize(u"\u03c2\u03a3 \u017f \u0131I \xb5"),
+                         u"\u03c3\u03c3 s ii \u03bc")
+
+    def test_required_literals(self):
+        def lits(pattern, flags=re.I | re.U):
+            return required_literals(re.compile(pattern, flags))
+
+        self.assertEqual(lits(u"foo"), [u"foo"])
+        self.assertEqual(lits(u"^Foo Bar$"), [u"foo bar"])
+        self.assertEqual(lits(u"fo+bar"), [u"f", u"bar"])
+        self.assertEqual(lits(u"(foo)bar"), [u"foobar"])
+        self.assertEqual(lits(u"a|b"), [])
+        self.assertEqual(lits(u"[Öo]x"), [u"ox"])
+        self.assertEqual(lits(u"[ab]x"), [u"x"])
+        self.assertEqual(lits(u"foo", re.L), [])
+
+    def test_diacritic_query(self):
+        regex = Query(u"bjork")._match.res
+        self.assertEqual(required_literals(regex), [u"bjork"])
+
+    def test_literal_string(self):
+        def lit(pattern, flags=re.I | re.U | re.M):
+            return literal_string(re.compile(pattern, flags))
+
+        self.assertEqual(lit(u"Foo"), (u"foo", False, True))
+        self.assertEqual(lit(u"Foo", re.U), (u"Foo", False, False))
+        self.assertEqual(lit(u"^Foo Bar$"), (u"foo bar", True, True))
+        self.assertEqual(lit(u"^Foo$", re.I | re.U), None)
+        self.assertEqual(lit(u"^Foo"), None)
+        self.assertEqual(lit(u"Fo+"), None)
+        self.assertEqual(lit(u"[Öo]x"), None)
+        self.assertEqual(lit(u"a\nb"), None)
+        self.assertEqual(lit(u""), None)
+        self.assertEqual(lit(u"\xf6", re.I), None)
+        self.assertEqual(lit(u"\xf6"), None)
+        self.assertEqual(lit(u"\u03a3"), None)
+        self.assertEqual(lit(u"\xf6", re.U), (u"\xf6", False, False))
+        self.assertEqual(lit(u"foo", re.L), None)
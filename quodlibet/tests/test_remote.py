@@ -32,3 +32,11 @@ class TUnixRemote(TestCase):
             self.assertEqual(mock.lines, [b"foo"])
             with open(fn, "rb") as h:
                 self.assertEqual(h.read(), b"resp")
+
+    def test_response_iterable(self):
+        with temp_filename() as fn:
+            mock = Mock(resp=iter([b"a\n", b"b\n"]))
+            remote = QuodLibetUnixRemote(None, mock)
+            remote._callback(b"\x00foo\x00%s\x00" % fn)
+            with open(fn, "rb") as h:
+                self.assertEqual(h.read(), b"a\nb\n")
@@ -17,6 +17,7 @@ from quodlibet import util
 from quodlibet import config
 from quodlibet.util import format_time_long as f_t_l
 from quodlibet.util.compat import text_type
+from quodlibet.formats._audio import AudioFile
 
 
 is_win = os.name == "nt"
@@ -1053,6 +1054,48 @@ class Tlist_unique(TestCase):
         self.assertEqual(util.list_unique([1, 1, 1, 2]), [1, 2])
 
 
+class Trandom_sample(TestCase):
+
+    def setUp(self):
+        config.init()
+
+    def tearDown(self):
+        config.quit()
+
+    def test_main(self):
+        self.assertEqual(util.random_sample([], 3), [])
+        self.assertEqual(util.random_sample([1, 2], 0), [])
+        self.assertEqual(sorted(util.random_sample(iter([1, 2]), 3)), [1, 2])
+        sample = util.random_sample(xrange(100), 10)
+        self.assertEqual(len(sample), 10)
+        self.assertEqual(len(set(sample)), 10)
+        self.assertTrue(set(sample) <= set(xrange(100)))
+
+    def test_weighted(self):
+        weights = {1: 0, 2: 1, 3: 0}
+        for i in xrange(20):
+            self.assertEqual(
+                util.random_sample([1, 2, 3], 1, weights.get), [2])
+            self.assertEqual(
+                sorted(util.random_sample([1, 2, 3], 3, weights.get)),
+                [1, 2, 3])
+
+        weights = {1: 1, 2: 9}
+        chosen = [util.random_sample([1, 2], 1, weights.get)[0]
+                  for i in xrange(1000)]
+        self.assertTrue(800 < chosen.count(2) < 980)
+
+    def test_limit_songs(self):
+        songs = [AudioFile({"~#rating": r}) for r in [0.0, 0.5, 1.0]]
+        self.assertEqual(util.limit_songs(songs, 0), songs)
+        self.assertEqual(util.limit_songs(songs, 4), songs)
+        self.assertEqual(len(util.limit_songs(songs, 2)), 2)
+        self.assertEqual(
+            len(util.limit_songs(songs, 2, weight_by_ratings=True)), 2)
+        self.assertNotIn(
+            songs[0], util.limit_songs(songs, 2, weight_by_ratings=True))
+
+
 class Tset_win32_unicode_argv(TestCase):
 
     def test_main(self):
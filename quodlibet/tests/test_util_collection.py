@@ -121,6 +121,33 @@ class TAlbum(TestCase):
         s.failUnlessEqual(album.get("~#rating"), 0.3)
         s.failUnlessEqual(album.get("~#originalyear"), 2002)
 
+    def test_value_cache(s):
+        songs = [Fakesong({"a": "1", "b": "1", "~#length": 3}),
+                 Fakesong({"a": "2", "b": "2", "~#length": 5})]
+        album = Album(songs[0])
+        album.songs = set(songs)
+        album._cache_size = 2
+
+        s.failUnlessEqual(album.get("a"), "1\n2")
+        s.failUnlessEqual(album.get("b"), "1\n2")
+        s.failUnlessEqual(album.get("a"), "1\n2")
+        s.failUnlessEqual(album.get("~#length:max"), 5)
+
+        # b got evicted, a was used more recently
+        songs[1]["a"] = songs[1]["b"] = "1"
+        s.failUnlessEqual(album.get("a"), "1\n2")
+        s.failUnlessEqual(album.get("b"), "1")
+
+        # the values of the songs get shared by all functions
+        songs[1]["~#length"] = 7
+        s.failUnlessEqual(album.get("~#length:min"), 3)
+        s.failUnlessEqual(album.get("~#length"), 8)
+
+        album.finalize()
+        s.failUnlessEqual(album.get("a"), "1")
+        s.failUnlessEqual(album.get("~#length:max"), 7)
+        s.failUnlessEqual(album.get("~#length"), 10)
+
     def test_numeric_comma(self):
         songs = [Fakesong({
             "~#added": long(1),
@@ -483,6 +510,29 @@ class TPlaylist(TestCase):
         pl.delete()
         pl2.delete()
 
+    def test_playlists_featuring_updates(s):
+        song, other = NUMERIC_SONGS[:2]
+        pl = Playlist(s.temp, "playlist")
+        pl2 = Playlist(s.temp, "playlist2")
+        pl.extend([song, song, other])
+        pl2.append(song)
+        s.failUnlessEqual(Playlist.playlists_featuring(song), [pl, pl2])
+
+        pl.remove_songs([song], leave_dupes=True)
+        s.failUnlessEqual(Playlist.playlists_featuring(song), [pl, pl2])
+        pl.remove_songs([song])
+        s.failUnlessEqual(Playlist.playlists_featuring(song), [pl2])
+
+        pl2[0] = other
+        s.failUnlessEqual(Playlist.playlists_featuring(song), [])
+        s.failUnlessEqual(Playlist.playlists_featuring(other), [pl, pl2])
+
+        pl.delete()
+        s.failUnlessEqual(Playlist.playlists_featuring(other), [pl2])
+        pl2.clear()
+        s.failUnlessEqual(Playlist.playlists_featuring(other), [])
+        pl2.delete()
+
     def test_playlists_tag(self):
         # Arguably belongs in _audio
         songs = NUMERIC_SONGS
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 from tests import TestCase
-from quodlibet.util.collections import HashedList, DictProxy
+from quodlibet.util.collections import HashedList, DictProxy, FenwickTree, \
+    IndexPool
 
 
 class TDictMixin(TestCase):
@@ -153,3 +154,58 @@ class THashedList(TestCase):
         self.failIf(l.has_duplicates())
         l.append(5)
         self.failUnless(l.has_duplicates())
+
+
+class TFenwickTree(TestCase):
+
+    def test_find(self):
+        tree = FenwickTree([1, 0, 2, 3])
+        self.assertEqual(tree.total(), 6)
+        self.assertEqual(
+            [tree.find(v) for v in [0, 0.5, 1, 2.9, 3, 5.9, 6, 7]],
+            [0, 0, 2, 2, 3, 3, None, None])
+
+    def test_set(self):
+        tree = FenwickTree([1, 0, 2, 3])
+        tree[0] = 0
+        tree[1] = 4
+        self.assertEqual(list(tree[i] for i in range(len(tree))),
+                         [0, 4, 2, 3])
+        self.assertEqual(tree.total(), 9)
+        self.assertEqual(tree.find(0), 1)
+        self.assertEqual(tree.find(4), 2)
+
+    def test_matches_linear(self):
+        values = [(i * 7) % 5 for i in range(37)]
+        tree = FenwickTree(values)
+        for value in [x / 2.0 for x in range(sum(values) * 2)]:
+            current = 0
+            for i, v in enumerate(values):
+                current += v
+                if current > value:
+                    break
+            self.assertEqual(tree.find(value), i)
+
+    def test_empty(self):
+        tree = FenwickTree()
+        self.assertEqual(tree.total(), 0)
+        self.assertEqual(tree.find(0), None)
+
+
+class TIndexPool(TestCase):
+
+    def test_main(self):
+        pool = IndexPool(range(5))
+        self.assertEqual(len(pool), 5)
+        pool.discard(0)
+        pool.discard(3)
+        pool.discard(3)
+        self.assertEqual(sorted(pool), [1, 2, 4])
+        self.assertFalse(3 in pool)
+        pool.add(3)
+        pool.add(3)
+        self.assertEqual(sorted(pool), [1, 2, 3, 4])
+        self.assertTrue(pool.choice() in pool)
+        for i in range(5):
+            pool.discard(i)
+        self.assertRaises(IndexError, pool.choice)
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as
+# published by the Free Software Foundation
+
+import os
+import shutil
+import threading
+
+from gi.repository import Gtk
+
+from tests import TestCase, mkdtemp
+
+from quodlibet.util import controlsocket
+from quodlibet.util.controlsocket import ControlSocket, ControlSocketError, \
+    iter_commands, write_socket, socket_exists
+
+
+class TControlSocket(TestCase):
+
+    def setUp(self):
+        self.dir = mkdtemp()
+        self.path = os.path.join(self.dir, "control")
+        self.lines = []
+        self.server = ControlSocket(self.path, self._callback)
+        self.server.open()
+
+    def tearDown(self):
+        self.server.destroy()
+        shutil.rmtree(self.dir)
+
+    def _callback(self, line):
+        self.lines.append(line)
+        if line == "none":
+            return
+        elif line == "many":
+            return ("%d\n" % i for i in xrange(100000))
+        return u"%s!" % line.decode("utf-8")
+
+    def _run(self, func, *args):
+        result = []
+        thread = threading.Thread(
+            target=lambda: result.append(func(*args)))
+        thread.start()
+        while thread.is_alive():
+            Gtk.main_iteration_do(False)
+        thread.join()
+        return result[0]
+
+    def test_exists(self):
+        self.assertTrue(socket_exists(self.path))
+        self.assertRaises(ControlSocketError,
+                          ControlSocket(self.path, self._callback).open)
+        self.server.destroy()
+        self.assertFalse(socket_exists(self.path))
+
+    def test_single(self):
+        self.assertEqual(self._run(write_socket, self.path, "foo"), "foo!")
+        self.assertEqual(self._run(write_socket, self.path, "none"), "")
+        self.assertEqual(self.lines, ["foo", "none"])
+
+    def test_pipelined(self):
+        commands = ["a", "none", "many", "b"]
+        responses = self._run(
+            lambda: list(iter_commands(self.path, commands)))
+        self.assertEqual(len(responses), 4)
+        self.assertEqual(responses[:2], ["a!", ""])
+        self.assertEqual(
+            responses[2], "".join("%d\n" % i for i in xrange(100000)))
+        self.assertEqual(responses[3], "b!")
+        self.assertEqual(self.lines, commands)
+
+    def test_concurrent(self):
+        def send(i):
+            return list(iter_commands(self.path, ["%d" % i] * 10))
+
+        results = []
+        threads = [threading.Thread(target=lambda i=i: results.append(
+            (i, send(i)))) for i in range(5)]
+        for thread in threads:
+            thread.start()
+        while any(t.is_alive() for t in threads):
+            Gtk.main_iteration_do(False)
+        self.assertEqual(sorted(results),
+                         [(i, ["%d!" % i] * 10) for i in range(5)])
+
+    def test_stale(self):
+        self.server.destroy()
+        with open(self.path, "wb"):
+            pass
+        self.assertFalse(socket_exists(self.path))
+        self.server = ControlSocket(self.path, self._callback)
+        self.server.open()
+        self.assertEqual(self._run(write_socket, self.path, "x"), "x!")
+
+    def test_timeout(self):
+        timeout = controlsocket.TIMEOUT
+        controlsocket.TIMEOUT = 0.01
+        try:
+            self.assertRaises(EnvironmentError, write_socket, self.path, "x")
+        finally:
+            controlsocket.TIMEOUT = timeout
@@ -6,8 +6,12 @@
 # published by the Free Software Foundation
 
 import sys
+
+from gi.repository import Gtk
+
 from quodlibet import config
-from quodlibet.util.library import split_scan_dirs, set_scan_dirs
+from quodlibet.util.library import split_scan_dirs, set_scan_dirs, \
+    ChunkedFilter
 from quodlibet.util.path import fsnative
 
 from tests import TestCase
@@ -67,3 +71,51 @@ class Tset_scan_dirs(TestCase):
         set_scan_dirs([STANDARD_PATH, GVFS_PATH])
         expected = GVFS_PATH if ON_WINDOWS else GVFS_PATH_ESCAPED
         self.assertEqual(self.scan_dirs, "%s:%s" % (STANDARD_PATH, expected))
+
+
+class TChunkedFilter(TestCase):
+
+    def setUp(self):
+        self.filter = ChunkedFilter()
+        self.filter.DURATION = 0
+        self.filter.STEP = 3
+        self.results = []
+
+    def tearDown(self):
+        self.filter.cancel()
+
+    def _callback(self, matches, done):
+        self.results.append((matches, done))
+
+    def _run_loop(self):
+        while Gtk.events_pending():
+            Gtk.main_iteration()
+
+    def test_chunked(self):
+        self.filter.run(lambda i: i % 2, range(10), self._callback)
+        self.assertEqual(self.results, [([1], False)])
+        self._run_loop()
+        self.assertEqual(self.results, [
+            ([1], False), ([3, 5], False), ([7], False), ([9], True)])
+
+    def test_not_chunked(self):
+        self.filter.run(lambda i: i % 2, range(10), self._callback, False)
+        self.assertEqual(self.results, [([1, 3, 5, 7, 9], True)])
+
+    def test_empty(self):
+        self.filter.run(lambda i: True, [], self._callback)
+        self.assertEqual(self.results, [([], True)])
+
+    def test_cancel(self):
+        self.filter.run(lambda i: True, range(10), self._callback)
+        self.filter.cancel()
+        self._run_loop()
+        self.assertEqual(self.results, [([0, 1, 2], False)])
+
+    def test_restart(self):
+        self.filter.run(lambda i: True, range(10), self._callback)
+        self.filter.run(lambda i: i == 8, range(10), self._callback)
+        self._run_loop()
+        self.assertEqual(self.results, [
+            ([0, 1, 2], False), ([], False), ([], False), ([8], False),
+            ([], True)])
@@ -27,6 +27,7 @@ class TTagsFromPattern(TestCase):
 
     def test_songtypes(self):
         from quodlibet import formats
+        formats.init()
         pat = TagsFromPattern('<tracknumber>. <title>')
         tracktitle = {'tracknumber': '01', 'title': 'Title'}
         for ext, kind in formats._infos.iteritems():